@@ -0,0 +1,13 @@
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'OlympiadAPI.settings')
+
+app = Celery('OlympiadAPI')
+
+# Все настройки Celery берутся из settings.py с префиксом CELERY_
+app.config_from_object('django.conf:settings', namespace='CELERY')
+
+# Задачи ищутся в модулях tasks.py установленных приложений
+app.autodiscover_tasks()
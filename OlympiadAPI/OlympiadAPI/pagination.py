@@ -0,0 +1,108 @@
+"""
+Пагинация списков API.
+
+По умолчанию списки отдаются курсорной пагинацией по индексированному
+столбцу (id или время записи): запрос каждой страницы — это WHERE по индексу
+и LIMIT, без OFFSET и без COUNT(*). Административные интерфейсы могут
+запросить постраничный режим параметром ?page=N; в нём общее число записей
+кэшируется, чтобы COUNT(*) не выполнялся на каждой странице.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+def count_cache_key(queryset):
+    """
+    Ключ кэша для числа записей запроса: модель и хэш SQL с параметрами.
+    Для заведомо пустого запроса (например, queryset.none()) SQL не
+    строится, и возвращается None.
+    """
+    try:
+        sql, params = queryset.query.sql_with_params()
+    except EmptyResultSet:
+        return None
+    digest = hashlib.md5(f'{sql}\x1f{params!r}'.encode('utf-8', 'replace')).hexdigest()
+    return f'pagination:count:{queryset.model._meta.label_lower}:{digest}'
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Paginator, который берёт число записей из кэша и пересчитывает его
+    не чаще одного раза в PAGINATION_COUNT_TIMEOUT секунд.
+    """
+
+    @cached_property
+    def count(self):
+        if not hasattr(self.object_list, 'query'):
+            return super().count
+        key = count_cache_key(self.object_list)
+        if key is None:
+            return 0
+        count = cache.get(key)
+        if count is None:
+            count = self.object_list.count()
+            cache.set(key, count, getattr(settings, 'PAGINATION_COUNT_TIMEOUT', 60))
+        return count
+
+
+class CachedCountPageNumberPagination(PageNumberPagination):
+    """
+    Постраничный режим для административных интерфейсов.
+    """
+    django_paginator_class = CachedCountPaginator
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
+class HybridPagination(CursorPagination):
+    """
+    Курсорная пагинация по умолчанию и постраничная по запросу (?page=N).
+
+    Поле курсора задаётся атрибутом представления cursor_ordering (по
+    умолчанию '-id'). Если запрос уже упорядочен представлением (например,
+    по релевантности поиска), порядок сохраняется и используется
+    постраничный режим: курсор по id его бы сбросил.
+    """
+    ordering = '-id'
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    page_number_class = CachedCountPageNumberPagination
+
+    def __init__(self):
+        self.page_number = None
+
+    def use_page_number(self, queryset, request):
+        return (
+            self.page_number_class.page_query_param in request.query_params
+            or bool(queryset.query.order_by)
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_page_number(queryset, request):
+            if not queryset.ordered:
+                queryset = queryset.order_by(*self.get_ordering(request, queryset, view))
+            self.page_number = self.page_number_class()
+            self.page_number.page_size = self.page_size
+            return self.page_number.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_ordering(self, request, queryset, view):
+        ordering = getattr(view, 'cursor_ordering', None) or self.ordering
+        return (ordering,) if isinstance(ordering, str) else tuple(ordering)
+
+    def get_paginated_response(self, data):
+        if self.page_number:
+            return self.page_number.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_schema_operation_parameters(self, view):
+        return (
+            super().get_schema_operation_parameters(view)
+            + self.page_number_class().get_schema_operation_parameters(view)
+        )
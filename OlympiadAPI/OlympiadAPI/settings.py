@@ -103,8 +103,14 @@ MIDDLEWARE = [
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'main.middleware.AuditLogMiddleware',
 ]
 
+# Настройки подсистем задаются словарями и дополняют значения по умолчанию
+# из их модулей (main.conf.app_settings); здесь указаны только отличающиеся.
+# AUDIT_LOG — журнал аудита (main.audit), AGREEMENT_PDF — печать согласий
+# (docs.agreements), EXPORT_JOBS — фоновые выгрузки (docs.exports).
+
 # REST Framework настройки
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
@@ -115,8 +121,16 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_PAGINATION_CLASS': 'OlympiadAPI.pagination.HybridPagination',
+    'PAGE_SIZE': 50,
 }
 
+# Время кэширования общего числа записей в постраничном режиме, секунды
+PAGINATION_COUNT_TIMEOUT = 60
+
+# Время жизни сводок главной страницы в кэше, секунды (сбрасываются и явно при записи)
+HOMEPAGE_CACHE_TIMEOUT = 15 * 60
+
 # Настройки JWT
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
@@ -136,6 +150,15 @@ DATABASES = {
     }
 }
 
+# Кэш. Несколько процессов должны использовать общий бэкенд (например, Redis):
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache, CACHE_LOCATION=redis://localhost:6379/1
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='olympiad-api'),
+    }
+}
+
 # Настройки статики и медиа с использованием S3
 # AWS_ACCESS_KEY_ID = config('AWS_ACCESS_KEY_ID')
 # AWS_SECRET_ACCESS_KEY = config('AWS_SECRET_ACCESS_KEY')
@@ -179,6 +202,27 @@ LOGGING = {
     },
 }
 
+# Загрузка протоколов олимпиад с cpkimr.ru
+CPKIMR_FETCH = {
+    'BASE_URL': config('CPKIMR_BASE_URL', default='https://cpkimr.ru'),
+}
+
+# Архивы согласий по классам (docs.bundles)
+AGREEMENT_BUNDLE = {
+    'MAX_WORKERS': 4,  # Процессов, печатающих PDF классов
+}
+
+# Пакетная загрузка учеников (users.roster)
+ROSTER_IMPORT = {
+    'HASH_WORKERS': 4,  # Процессов, хэширующих пароли
+}
+
+# Разбор PDF-протоколов (docs.extract)
+# Внутри процессов Celery страницы разбирает пул billiard (main.pools)
+PDF_EXTRACT = {
+    'MAX_WORKERS': 4,  # Процессов, разбирающих страницы одного файла
+}
+
 # Настройки Celery
 CELERY_BROKER_URL = 'redis://localhost:6379/0'
 CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
@@ -187,4 +231,13 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'docs.tasks.import_cpkimr_results_task',
         'schedule': crontab(hour=1, minute=0),
     },
+    'drain_notification_outbox': {
+        'task': 'result.tasks.drain_notification_outbox',
+        'schedule': crontab(),
+    },
 }
+
+# Telegram-бот и очередь уведомлений
+TELEGRAM_BOT_TOKEN = config('TELEGRAM_BOT_TOKEN', default='')
+TELEGRAM_API_URL = config('TELEGRAM_API_URL', default='https://api.telegram.org')
+# Параметры очереди уведомлений — NOTIFICATION_OUTBOX (result.notifications)
@@ -16,7 +16,7 @@ urlpatterns = [
 
     # Подключение приложений
     path('main/', include('main.urls', namespace='main')),
-    # path('docs/', include('docs.urls', namespace='docs')),
+    path('docs/', include('docs.urls', namespace='docs')),
     path('files/', include('files.urls', namespace='files')),
     path('register/', include('register.urls', namespace='register')),
     path('result/', include('result.urls', namespace='result')),
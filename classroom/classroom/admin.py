@@ -1,7 +1,8 @@
 # your_app/admin.py
 
 from django.contrib import admin
-from classroom.models import Classroom
+from django.db.models import Count, Q
+from classroom.models import AcademicYearRollover, Classroom
 from users.models import User
 
 class UserInline(admin.TabularInline):
@@ -54,7 +55,9 @@ class ClassroomAdmin(admin.ModelAdmin):
         Оптимизация запроса для предзагрузки связанных данных.
         """
         qs = super().get_queryset(request)
-        return qs.select_related('teacher', 'school').prefetch_related('child')
+        return qs.select_related('teacher', 'school').prefetch_related('child').annotate(
+            active_students=Count('students', filter=Q(students__is_child=True, students__is_expelled=False)),
+        )
 
     # Дополнительные действия в админке (например, продвижение классов)
     actions = ['promote_selected_classrooms']
@@ -67,3 +70,13 @@ class ClassroomAdmin(admin.ModelAdmin):
             classroom.promote()
         self.message_user(request, f"Выбранные классы успешно продвинуты.")
     promote_selected_classrooms.short_description = "Продвинуть выбранные классы на следующий уровень"
+
+
+@admin.register(AcademicYearRollover)
+class AcademicYearRolloverAdmin(admin.ModelAdmin):
+    """
+    Журнал переходов школ на новый учебный год.
+    """
+    list_display = ['school', 'year', 'promoted', 'graduated', 'students_graduated', 'performed_by', 'created_at']
+    list_filter = ['year', 'school']
+    readonly_fields = ['created_at']
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:31
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('classroom', '0002_initial'),
+        ('school', '__first__'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AcademicYearRollover',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.IntegerField(verbose_name='Год окончания учебного года')),
+                ('promoted', models.PositiveIntegerField(default=0, verbose_name='Переведено классов')),
+                ('graduated', models.PositiveIntegerField(default=0, verbose_name='Выпущено классов')),
+                ('students_graduated', models.PositiveIntegerField(default=0, verbose_name='Выпущено учеников')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Выполнен')),
+                ('performed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Выполнил')),
+                ('school', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollovers', to='school.school', verbose_name='Школа')),
+            ],
+            options={
+                'verbose_name': 'Переход на новый учебный год',
+                'verbose_name_plural': 'Переходы на новый учебный год',
+                'constraints': [models.UniqueConstraint(fields=('school', 'year'), name='unique_school_rollover_year')],
+            },
+        ),
+    ]
@@ -32,13 +32,51 @@ class Classroom(models.Model):
         else:
             self.is_graduated = True
             self.graduation_year = datetime.now().year
+            self.students.update(is_graduated=True)
         self.save()
 
     def active_students_count(self):
         """Метод для подсчета числа учеников, которые не исключены"""
-        return self.students.filter(is_expelled=False).count()
+        # Классы из services.with_roster уже посчитаны в запросе
+        if hasattr(self, 'active_students'):
+            return self.active_students
+        return self.students.filter(is_child=True, is_expelled=False).count()
 
     @property
     def students(self):
         """Возвращает QuerySet учеников, принадлежащих этому классу"""
         return User.objects.filter(classroom=self, is_child=True)
+
+
+class AcademicYearRollover(models.Model):
+    """Перевод всех классов школы на следующий учебный год (один раз за год)"""
+
+    school = models.ForeignKey(
+        'school.School', on_delete=models.CASCADE, verbose_name='Школа', related_name='rollovers'
+    )
+    year = models.IntegerField('Год окончания учебного года')
+    promoted = models.PositiveIntegerField('Переведено классов', default=0)
+    graduated = models.PositiveIntegerField('Выпущено классов', default=0)
+    students_graduated = models.PositiveIntegerField('Выпущено учеников', default=0)
+    performed_by = models.ForeignKey(
+        'users.User', blank=True, null=True, on_delete=models.SET_NULL, verbose_name='Выполнил'
+    )
+    created_at = models.DateTimeField('Выполнен', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Переход на новый учебный год'
+        verbose_name_plural = 'Переходы на новый учебный год'
+        constraints = [
+            models.UniqueConstraint(fields=['school', 'year'], name='unique_school_rollover_year'),
+        ]
+
+    def __str__(self):
+        return f'{self.school} - {self.year}: переведено {self.promoted}, выпущено {self.graduated}'
+
+    def summary(self):
+        return {
+            'year': self.year,
+            'promoted': self.promoted,
+            'graduated': self.graduated,
+            'students_graduated': self.students_graduated,
+        }
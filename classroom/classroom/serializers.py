@@ -46,6 +46,52 @@ class ClassroomSerializer(serializers.ModelSerializer):
         read_only = ['id', 'school']
 
 
+class RosterTeacherSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = User
+        fields = ['id', 'last_name', 'first_name', 'surname']
+
+
+class RosterStudentSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = User
+        fields = ['id', 'username', 'last_name', 'first_name', 'surname', 'birth_date', 'gender', 'is_expelled']
+
+
+class ClassroomRosterSerializer(serializers.ModelSerializer):
+    """
+    Класс с учениками для списка классов. Ожидает классы из
+    services.with_roster: ученики и числа уже загружены.
+    """
+    teacher = RosterTeacherSerializer(read_only=True)
+    students = RosterStudentSerializer(source='roster', many=True, read_only=True)
+    active_students = serializers.IntegerField(read_only=True)
+    expelled_students = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Classroom
+        fields = [
+            'id', 'number', 'letter', 'is_graduated', 'graduation_year', 'teacher',
+            'active_students', 'expelled_students', 'students',
+        ]
+
+
+class CompactClassroomRosterSerializer(serializers.ModelSerializer):
+    """
+    Компактный список классов: вместо учеников и учителя только их id.
+    """
+    student_ids = serializers.SerializerMethodField()
+    active_students = serializers.IntegerField(read_only=True)
+    expelled_students = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Classroom
+        fields = ['id', 'number', 'letter', 'teacher_id', 'active_students', 'expelled_students', 'student_ids']
+
+    def get_student_ids(self, obj):
+        return [student.pk for student in obj.roster]
+
+
 class PromoteAllClassroomsSerializer(serializers.Serializer):
     confirm = serializers.BooleanField()
 
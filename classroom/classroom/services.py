@@ -0,0 +1,99 @@
+"""
+Переход школы на новый учебный год.
+
+Все классы школы переводятся несколькими UPDATE в одной транзакции: сначала
+ученики выпускных классов (11-х и классов без номера) отмечаются
+выпускниками, затем выпускные классы закрываются, затем номер остальных
+классов увеличивается на единицу. Порядок важен: 10-й класс после перевода
+становится 11-м и в этом же году выпускаться не должен.
+
+Переход выполняется один раз за учебный год: запись AcademicYearRollover
+с уникальной парой (школа, год) создаётся в той же транзакции, и повторный
+или параллельный запрос получает итоги уже выполненного перехода. Год
+определяется на сервере по местной дате и клиентом не передаётся.
+
+Списки классов с учениками (with_roster) читаются постоянным числом запросов
+независимо от числа классов: учитель присоединяется select_related, ученики
+подгружаются одним запросом Prefetch, а число активных и исключённых
+учеников считается агрегатами Count(filter=...) в запросе классов.
+"""
+from django.db import transaction
+from django.db.models import Count, F, Prefetch, Q
+from django.utils import timezone
+
+from main import homepage, versions
+from users.models import User
+from .models import AcademicYearRollover, Classroom
+
+GRADUATION_NUMBER = 11
+
+# Поля ученика в списке класса
+ROSTER_STUDENT_FIELDS = (
+    'id', 'classroom_id', 'username', 'last_name', 'first_name', 'surname', 'birth_date', 'gender', 'is_expelled',
+)
+
+
+def graduating(classrooms):
+    """
+    Классы, которые при переходе выпускаются (как в Classroom.promote).
+    """
+    return classrooms.filter(Q(number__gte=GRADUATION_NUMBER) | Q(number__isnull=True))
+
+
+def graduation_year():
+    """
+    Год выпуска для перехода, выполняемого сегодня: год окончания завершившегося
+    учебного года, то есть текущий год по местной дате (TIME_ZONE).
+    """
+    return timezone.localdate().year
+
+
+def rollover_school(school, user=None):
+    """
+    Переводит классы школы на следующий учебный год (см. graduation_year).
+    Возвращает (AcademicYearRollover, выполнен ли переход этим вызовом).
+    """
+    year = graduation_year()
+    with transaction.atomic():
+        rollover, created = AcademicYearRollover.objects.get_or_create(
+            school=school, year=year, defaults={'performed_by': user}
+        )
+        if not created:
+            return rollover, False
+
+        active = Classroom.objects.filter(school=school, is_graduated=False)
+        classroom_ids = list(active.values_list('id', flat=True))
+
+        rollover.students_graduated = User.objects.filter(
+            is_child=True, is_graduated=False, classroom__in=graduating(active)
+        ).update(is_graduated=True)
+        rollover.graduated = graduating(active).update(is_graduated=True, graduation_year=year)
+        rollover.promoted = active.filter(number__lt=GRADUATION_NUMBER).update(
+            number=F('number') + 1
+        )
+        rollover.save(update_fields=['promoted', 'graduated', 'students_graduated'])
+
+        # UPDATE обходит сигналы: сводки классов и версия данных школы сбрасываются явно
+        homepage.invalidate_classrooms(classroom_ids)
+        versions.invalidate_schools([school.pk])
+    return rollover, True
+
+
+def with_roster(classrooms, compact=False):
+    """
+    Классы с учениками (атрибут roster) и числом активных и исключённых
+    учеников (active_students, expelled_students). В компактном режиме у
+    учеников читается только id, а учитель не присоединяется.
+    """
+    students = User.objects.filter(is_child=True).order_by('last_name', 'first_name', 'id')
+    if compact:
+        students = students.only('id', 'classroom_id').order_by('id')
+    else:
+        students = students.only(*ROSTER_STUDENT_FIELDS)
+        classrooms = classrooms.select_related('teacher')
+    return classrooms.annotate(
+        active_students=Count('students', filter=Q(students__is_child=True, students__is_expelled=False)),
+        expelled_students=Count('students', filter=Q(students__is_child=True, students__is_expelled=True)),
+    ).prefetch_related(
+        Prefetch('students', queryset=students, to_attr='roster'),
+    ).order_by('number', 'letter', 'id')
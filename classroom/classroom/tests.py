@@ -1,8 +1,13 @@
-from django.test import TestCase, Client
+from datetime import date
+from unittest import mock
+
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 from users.models import User
 from school.models import School
-from classroom.models import Classroom
+from classroom.models import AcademicYearRollover, Classroom
+from classroom.services import rollover_school
+from rest_framework.test import APIClient
 from django.contrib import messages
 
 class ClassroomViewsTest(TestCase):
@@ -100,3 +105,140 @@ class ClassroomViewsTest(TestCase):
         self.assertEqual(response.status_code, 302)
         self.classroom.refresh_from_db()
         self.assertEqual(self.classroom.number, 2)
+
+
+@override_settings(AUDIT_LOG={'ASYNC': False})
+class AcademicYearRolloverTest(TestCase):
+    """Тесты перехода школы на новый учебный год."""
+
+    def setUp(self):
+        self.school = School.objects.create(name='Школа 1')
+        self.other_school = School.objects.create(name='Школа 2')
+        self.admin = User.objects.create_user(username='admin', password='pass', is_admin=True, school=self.school)
+        self.classrooms = {
+            number: Classroom.objects.create(number=number, letter='А', school=self.school)
+            for number in (1, 10, 11)
+        }
+        self.students = {
+            number: User.objects.create_user(
+                username=f'child{number}', password='pass', is_child=True, school=self.school, classroom=classroom
+            )
+            for number, classroom in self.classrooms.items()
+        }
+        self.old_graduates = Classroom.objects.create(
+            number=11, letter='Б', school=self.school, is_graduated=True, graduation_year=2020
+        )
+        self.other = Classroom.objects.create(number=11, letter='А', school=self.other_school)
+        # Переход выполняется летом 2026 года по местной дате
+        localdate = mock.patch('classroom.services.timezone.localdate', return_value=date(2026, 6, 20))
+        localdate.start()
+        self.addCleanup(localdate.stop)
+
+    def test_rollover_is_set_based_and_idempotent(self):
+        # Запись о переходе, id классов, три UPDATE, итоги и точки сохранения транзакции
+        with self.assertNumQueries(11):
+            rollover, performed = rollover_school(self.school, user=self.admin)
+        self.assertTrue(performed)
+        self.assertEqual(rollover.summary(), {'year': 2026, 'promoted': 2, 'graduated': 1, 'students_graduated': 1})
+
+        for classroom in (*self.classrooms.values(), self.old_graduates, self.other):
+            classroom.refresh_from_db()
+        # 10-й класс стал 11-м, но в этом году не выпускается
+        self.assertEqual([self.classrooms[1].number, self.classrooms[10].number], [2, 11])
+        self.assertFalse(self.classrooms[10].is_graduated)
+        self.assertEqual((self.classrooms[11].is_graduated, self.classrooms[11].graduation_year), (True, 2026))
+        self.assertEqual(self.old_graduates.graduation_year, 2020)
+        self.assertFalse(self.other.is_graduated)
+        graduates = set(User.objects.filter(is_graduated=True).values_list('username', flat=True))
+        self.assertEqual(graduates, {'child11'})
+
+        again, performed = rollover_school(self.school)
+        self.assertFalse(performed)
+        self.assertEqual(again.pk, rollover.pk)
+        self.classrooms[1].refresh_from_db()
+        self.assertEqual(self.classrooms[1].number, 2)
+
+    def test_failure_rolls_back_whole_school(self):
+        with mock.patch('classroom.services.versions.invalidate_schools', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                rollover_school(self.school)
+        self.assertFalse(AcademicYearRollover.objects.exists())
+        self.assertEqual(
+            sorted(Classroom.objects.filter(school=self.school).values_list('number', 'is_graduated')),
+            [(1, False), (10, False), (11, False), (11, True)],
+        )
+        self.assertFalse(User.objects.filter(is_graduated=True).exists())
+
+    def test_promote_all_view_returns_summary(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        self.admin.is_staff = True
+        self.admin.save()
+        response = client.post('/classroom/classrooms/promote_all/', {'confirm': True}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(),
+            {'message': 'Все классы успешно продвинуты', 'performed': True, 'year': 2026,
+             'promoted': 2, 'graduated': 1, 'students_graduated': 1},
+        )
+        # Год из запроса не учитывается: повторного перевода нет
+        response = client.post('/classroom/classrooms/promote_all/', {'confirm': True, 'year': 2027}, format='json')
+        self.assertFalse(response.json()['performed'])
+        self.assertEqual(response.json()['year'], 2026)
+        self.assertEqual(
+            sorted(Classroom.objects.filter(school=self.school, is_graduated=False).values_list('number', flat=True)),
+            [2, 11],
+        )
+
+
+@override_settings(AUDIT_LOG={'ASYNC': False})
+class ClassroomRosterTest(TestCase):
+    """Тесты списка классов с учениками."""
+
+    def setUp(self):
+        self.school = School.objects.create(name='Школа 1')
+        self.admin = User.objects.create_user(username='admin', password='pass', is_admin=True, school=self.school)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.add_classrooms(2)
+
+    def add_classrooms(self, count):
+        start = Classroom.objects.count()
+        for index in range(start, start + count):
+            teacher = User.objects.create_user(
+                username=f'teacher{index}', password='pass', is_teacher=True, school=self.school
+            )
+            classroom = Classroom.objects.create(number=index % 11 + 1, letter='А', teacher=teacher, school=self.school)
+            for number in range(3):
+                User.objects.create_user(
+                    username=f'child{index}_{number}', password='pass', is_child=True, school=self.school,
+                    classroom=classroom, last_name=f'Ученик {number}', is_expelled=number == 2,
+                )
+
+    def test_query_count_does_not_depend_on_classrooms(self):
+        # Классы с учителями и числами учеников, ученики одним запросом
+        with self.assertNumQueries(2):
+            response = self.client.get('/classroom/classrooms/')
+        self.assertEqual(len(response.json()), 2)
+
+        self.add_classrooms(38)
+        with self.assertNumQueries(2):
+            response = self.client.get('/classroom/classrooms/')
+        self.assertEqual(response.status_code, 200)
+        classrooms = response.json()
+        self.assertEqual(len(classrooms), 40)
+        first = classrooms[0]
+        self.assertEqual((first['active_students'], first['expelled_students']), (2, 1))
+        self.assertEqual([student['last_name'] for student in first['students']], ['Ученик 0', 'Ученик 1', 'Ученик 2'])
+        self.assertEqual(first['teacher']['id'], Classroom.objects.get(pk=first['id']).teacher_id)
+
+    def test_compact_mode_returns_ids(self):
+        classroom = Classroom.objects.order_by('number', 'letter', 'id').first()
+        with self.assertNumQueries(2):
+            response = self.client.get('/classroom/classrooms/', {'compact': '1'})
+        first = response.json()[0]
+        self.assertEqual(set(first), {
+            'id', 'number', 'letter', 'teacher_id', 'active_students', 'expelled_students', 'student_ids',
+        })
+        self.assertEqual(first['student_ids'], sorted(classroom.students.values_list('id', flat=True)))
+        self.assertEqual(classroom.active_students_count(), first['active_students'])
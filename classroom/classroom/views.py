@@ -1,14 +1,16 @@
 from django.http import JsonResponse
-from requests import Response
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 from django.shortcuts import get_object_or_404
 from users.models import User
 from classroom.models import Classroom
+from .services import rollover_school, with_roster
 from .serializers import (
     UserSerializer,
     ClassroomSerializer,
+    ClassroomRosterSerializer,
+    CompactClassroomRosterSerializer,
     PromoteAllClassroomsSerializer,
     ChangePasswordSerializer,
     ExpelStudentSerializer,
@@ -87,15 +89,31 @@ class ClassroomViewSet(viewsets.ViewSet):
     def preform_create(self, serializer):
         serializer.save(school=self.request.user.school)
 
+    def list(self, request):
+        """
+        Классы школы с учениками и числом активных и исключённых учеников.
+        Параметр compact=1 возвращает вместо учеников только их id.
+        Число запросов не зависит от числа классов.
+        """
+        compact = request.query_params.get('compact', '0') == '1'
+        classrooms = with_roster(self.get_queryset(), compact=compact)
+        serializer_class = CompactClassroomRosterSerializer if compact else ClassroomRosterSerializer
+        return JsonResponse(serializer_class(classrooms, many=True).data, safe=False, status=status.HTTP_200_OK)
+
     @action(detail=False, methods=["post"], permission_classes=[IsAdminUser])
     def promote_all(self, request):
-        """Продвижение всех классов на следующий уровень."""
+        """
+        Перевод всех классов школы на следующий учебный год. Выполняется
+        одной транзакцией и один раз за год, который определяется на сервере;
+        повторный запрос возвращает итоги уже выполненного перехода.
+        """
         serializer = PromoteAllClassroomsSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         confirm = serializer.validated_data.get('confirm', False)
         if confirm:
-            classrooms = Classroom.objects.filter(is_graduated=False, school=request.user.school)
-            for classroom in classrooms:
-                classroom.promote()
-            return JsonResponse({"message": "Все классы успешно продвинуты"}, status=status.HTTP_200_OK)
+            rollover, performed = rollover_school(request.user.school, user=request.user)
+            message = "Все классы успешно продвинуты" if performed else "Классы уже переведены в этом учебном году"
+            return JsonResponse(
+                {"message": message, "performed": performed, **rollover.summary()}, status=status.HTTP_200_OK
+            )
         return JsonResponse({"error": "Подтверждение не получено"}, status=status.HTTP_400_BAD_REQUEST)
@@ -1,3 +1,46 @@
 from django.contrib import admin
 
-# Register your models here.
+from docs.models import ExportJob, FetchedDocument, ImportCheckpoint, ImportRun, ParsedProtocol
+
+
+@admin.register(FetchedDocument)
+class FetchedDocumentAdmin(admin.ModelAdmin):
+    """Скачанные протоколы cpkimr.ru в админке"""
+    list_display = ('url', 'subject', 'stage_slug', 'size', 'fetched_at', 'checked_at')
+    list_filter = ('stage_slug', 'subject')
+    search_fields = ('url', 'sha256')
+    readonly_fields = ('etag', 'last_modified', 'sha256', 'imported_sha256', 'fetched_at', 'checked_at')
+
+
+@admin.register(ParsedProtocol)
+class ParsedProtocolAdmin(admin.ModelAdmin):
+    """Разобранные протоколы в админке"""
+    list_display = ('sha256', 'parser_version', 'pages', 'created_at')
+    search_fields = ('sha256',)
+    exclude = ('tables',)
+
+
+class ImportCheckpointInline(admin.TabularInline):
+    """Контрольные точки запуска импорта"""
+    model = ImportCheckpoint
+    extra = 0
+    can_delete = False
+    fields = ('url', 'subject', 'stage_slug', 'status', 'rows_imported', 'errors', 'attempts', 'error_message')
+    readonly_fields = fields
+
+
+@admin.register(ImportRun)
+class ImportRunAdmin(admin.ModelAdmin):
+    """Запуски импорта протоколов в админке"""
+    list_display = ('id', 'status', 'force', 'started_at', 'finished_at')
+    list_filter = ('status',)
+    readonly_fields = ('status', 'stage_slugs', 'force', 'stats', 'started_at', 'finished_at')
+    inlines = [ImportCheckpointInline]
+
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    """Фоновые выгрузки в админке"""
+    list_display = ('id', 'kind', 'school', 'status', 'progress_done', 'progress_total', 'cached', 'created_at')
+    list_filter = ('kind', 'status', 'cached')
+    readonly_fields = ('artifact_key', 'path', 'created_at', 'finished_at')
@@ -0,0 +1,319 @@
+"""
+Печать согласий на участие в олимпиадах: по два заявления на странице A4.
+
+Всё, что не зависит от ученика, готовится один раз на процесс:
+
+* шрифт регистрируется в reportlab при первом использовании;
+* шаблон согласия очищается от неподдерживаемой разметки и делится на
+  абзацы один раз, а скомпилированные абзацы хранятся в LRU-кэше по
+  (id шаблона, время изменения), поэтому правка шаблона сразу меняет вывод;
+* склонение ФИО в винительный падеж запоминается по (ФИО, пол);
+* подобранный размер шрифта абзаца запоминается в разобранном шаблоне по
+  (номер абзаца, длина текста с точностью до FIT_BUCKET_CHARS символов).
+
+На ученика остаётся только подстановка контекста в готовые абзацы.
+"""
+import os
+import re
+import threading
+from collections import OrderedDict, defaultdict
+from datetime import datetime
+from functools import lru_cache
+from io import BytesIO
+
+from django.conf import settings
+from django.template import Context, Template, TemplateSyntaxError
+from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.platypus import Frame, FrameBreak, PageTemplate, Paragraph, SimpleDocTemplate
+
+from main.conf import app_settings
+from users.models import User
+
+MIN_FONT_SIZE = 8
+MAX_FONT_SIZE = 12
+# Межстрочный интервал больше размера шрифта на столько пунктов
+LEADING_EXTRA = 2
+# Шаг длины текста, с которым запоминается подобранный размер шрифта
+FIT_BUCKET_CHARS = 64
+
+ALIGNMENTS = (
+    ('align="center"', TA_CENTER),
+    ('align="right"', TA_RIGHT),
+)
+
+PDF_DEFAULTS = {
+    'FONT_NAME': 'TimesNewRomanPSMT',
+    'FONT_PATH': os.path.join(settings.BASE_DIR, 'static', 'fonts', 'timesnewromanpsmt.ttf'),
+    'TEMPLATE_CACHE_SIZE': 16,  # Разобранных шаблонов в памяти процесса
+}
+
+
+def pdf_settings():
+    return app_settings('AGREEMENT_PDF', PDF_DEFAULTS)
+
+
+def clean_html_content(html_content):
+    # Удаляем ненужные атрибуты
+    html_content = re.sub(r'\s*(dir|role)="[^"]*"', '', html_content)
+
+    # Преобразуем специфические теги в поддерживаемые
+    html_content = re.sub(r'<span[^>]*>', '', html_content)  # Убираем теги <span>
+    html_content = re.sub(r'</span>', '', html_content)  # Убираем закрывающие теги </span>
+    html_content = re.sub(r'<br[^>]*>', '<br/>', html_content)  # Преобразуем <br> в <br/>
+
+    # Удаляем теги <p> и извлекаем выравнивание
+    html_content = re.sub(r'<p\s*style="text-align:\s*([^"]+)\s*;">', r'<p align="\1">', html_content)
+    html_content = re.sub(r'<p>', '<p align="left">', html_content)
+
+    return html_content
+
+
+_fonts = {}
+_fonts_lock = threading.Lock()
+
+
+def register_font(name, path):
+    """
+    Регистрирует TTF-шрифт в reportlab один раз на процесс.
+    """
+    if _fonts.get(name) == path:
+        return name
+    with _fonts_lock:
+        if _fonts.get(name) != path:
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"Файл шрифта не найден по пути: {path}")
+            pdfmetrics.registerFont(TTFont(name, path))
+            _fonts[name] = path
+    return name
+
+
+class AgreementTemplate:
+    """
+    Шаблон согласия, разобранный на абзацы.
+
+    Разметка очищается до рендеринга, а текст делится по </p> так же, как
+    раньше делился результат рендеринга. Если тег шаблона охватывает
+    несколько абзацев и абзацы по отдельности не компилируются, шаблон
+    рендерится целиком и делится на абзацы после подстановки.
+    """
+
+    def __init__(self, content):
+        # {(номер абзаца, выравнивание, группа длины, ширина, высота): размер шрифта}
+        self.fitted = {}
+        pieces = re.split(r'(</p>)', clean_html_content(content))
+        try:
+            self.paragraphs = [(self.alignment(piece), Template(piece)) for piece in pieces]
+            self.template = None
+        except TemplateSyntaxError:
+            self.paragraphs = None
+            self.template = Template(content)
+
+    @staticmethod
+    def alignment(text):
+        for marker, alignment in ALIGNMENTS:
+            if marker in text:
+                return alignment
+        return TA_LEFT
+
+    def render(self, context):
+        """
+        Абзацы для контекста ученика: список (выравнивание, текст).
+        """
+        context = Context(context)
+        if self.paragraphs is None:
+            pieces = re.split(r'(</p>)', clean_html_content(self.template.render(context)))
+            return [(self.alignment(piece), piece.replace('</p>', '')) for piece in pieces]
+        return [(alignment, template.render(context).replace('</p>', '')) for alignment, template in self.paragraphs]
+
+
+_templates = OrderedDict()
+_templates_lock = threading.Lock()
+
+
+def compile_template(pdf_template):
+    """
+    Разобранный шаблон из LRU-кэша процесса по (id, updated_at).
+    """
+    key = (pdf_template.pk, pdf_template.updated_at)
+    with _templates_lock:
+        compiled = _templates.get(key)
+        if compiled is not None:
+            _templates.move_to_end(key)
+            return compiled
+
+    compiled = AgreementTemplate(pdf_template.content)
+    with _templates_lock:
+        _templates[key] = compiled
+        while len(_templates) > pdf_settings()['TEMPLATE_CACHE_SIZE']:
+            _templates.popitem(last=False)
+    return compiled
+
+
+@lru_cache(maxsize=1)
+def _petrovich():
+    # Правила склонения загружаются один раз на процесс
+    from petrovich.main import Petrovich
+    return Petrovich()
+
+
+@lru_cache(maxsize=4096)
+def to_accusative(name, gender):
+    """
+    ФИО в винительном падеже. Имена не из трёх частей возвращаются как есть.
+    """
+    parts = name.split()
+    if len(parts) != 3:
+        return name
+    from petrovich.enums import Case, Gender
+
+    last_name, first_name, middle_name = parts
+    gender_case = Gender.MALE if gender == User.MALE else Gender.FEMALE
+    petrovich = _petrovich()
+    return (
+        f"{petrovich.lastname(last_name, Case.ACCUSATIVE, gender_case)} "
+        f"{petrovich.firstname(first_name, Case.ACCUSATIVE, gender_case)} "
+        f"{petrovich.middlename(middle_name, Case.ACCUSATIVE, gender_case)}"
+    )
+
+
+class TemplateNotSelected(Exception):
+    """
+    В настройках согласий не выбран шаблон.
+    """
+
+
+def selected_template():
+    """
+    Шаблон, выбранный в настройках согласий.
+    """
+    from files.models import AgreementSettings
+
+    agreement_settings = AgreementSettings.objects.select_related('selected_template').first()
+    if not agreement_settings or not agreement_settings.selected_template:
+        raise TemplateNotSelected("Не выбран шаблон для согласий. Обратитесь к администратору.")
+    return agreement_settings.selected_template
+
+
+class AgreementRenderer:
+    """
+    Печать согласий учеников класса по шаблону.
+    """
+
+    def __init__(self, pdf_template):
+        options = pdf_settings()
+        self.font_name = register_font(options['FONT_NAME'], options['FONT_PATH'])
+        self.template = compile_template(pdf_template)
+        self.base_style = ParagraphStyle(
+            'BaseStyle',
+            fontName=self.font_name,
+            fontSize=MAX_FONT_SIZE,
+            leading=MAX_FONT_SIZE + LEADING_EXTRA,  # Уменьшенный межстрочный интервал
+            spaceAfter=5,  # Отступ после абзаца
+        )
+        self._styles = {}
+
+    @classmethod
+    def from_settings(cls):
+        """
+        Печать по шаблону, выбранному в настройках согласий.
+        """
+        return cls(selected_template())
+
+    def style(self, font_size, alignment):
+        """
+        Стиль абзаца для размера шрифта и выравнивания. Стили создаются один
+        раз и не изменяются: абзацы разных учеников их разделяют.
+        """
+        key = (font_size, alignment)
+        if key not in self._styles:
+            self._styles[key] = self.base_style.clone(
+                f'AgreementStyle{font_size}_{alignment}',
+                fontSize=font_size, leading=font_size + LEADING_EXTRA, alignment=alignment,
+            )
+        return self._styles[key]
+
+    def fits(self, text, font_size, max_height, width, alignment):
+        _, height = Paragraph(text, self.style(font_size, alignment)).wrap(width, max_height)
+        return height <= max_height
+
+    def fit_font_size(self, text, max_height, width, alignment, index=None):
+        """
+        Наибольший размер шрифта от MIN_FONT_SIZE до MAX_FONT_SIZE, при котором
+        абзац помещается в рамку; если не помещается никакой — MIN_FONT_SIZE.
+
+        Размер для того же абзаца шаблона с текстом похожей длины берётся из
+        кэша и только проверяется (одна-две разбивки на строки); при промахе
+        размер ищется двоичным поиском. Результат зависит только от текста.
+        """
+        key = (index, alignment, len(text) // FIT_BUCKET_CHARS, width, max_height)
+        hint = self.template.fitted.get(key)
+        if hint is not None and (hint == MIN_FONT_SIZE or self.fits(text, hint, max_height, width, alignment)) \
+                and (hint == MAX_FONT_SIZE or not self.fits(text, hint + 1, max_height, width, alignment)):
+            return hint
+
+        low, high = MIN_FONT_SIZE, MAX_FONT_SIZE
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.fits(text, middle, max_height, width, alignment):
+                low = middle
+            else:
+                high = middle - 1
+        self.template.fitted[key] = low
+        return low
+
+    def create_paragraph(self, text, max_height, width, alignment, index=None):
+        """
+        Абзац с уменьшением шрифта, если текст не помещается в рамку.
+        """
+        font_size = self.fit_font_size(text, max_height, width, alignment, index)
+        return Paragraph(text, self.style(font_size, alignment))
+
+    def context(self, student, subjects, date):
+        gender = student.gender
+        full_name = f"{student.last_name} {student.first_name} {student.surname or ''}".strip()
+        return {
+            'son_or_daughter': 'моего сына' if gender == User.MALE else 'мою дочь',
+            'full_name': to_accusative(full_name, gender),
+            'classroom': f"{student.classroom.number}{student.classroom.letter}" if student.classroom else '',
+            'olympiad_name': "Пример олимпиады",
+            'subjects': ', '.join(dict.fromkeys(subjects)),  # Убираем дублирующиеся предметы
+            'date': date,
+        }
+
+    def render(self, students_data):
+        """
+        PDF с двумя заявлениями на странице. students_data — пары (ученик, предметы).
+        """
+        buffer = BytesIO()
+        doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=30, leftMargin=30, topMargin=30, bottomMargin=30)
+
+        # Две рамки на странице для двух заявлений
+        width, height = A4
+        half_height = height / 2 - 40
+        frames = [
+            Frame(30, height / 2 + 10, width - 60, half_height, id='top_frame', showBoundary=0),
+            Frame(30, 20, width - 60, half_height, id='bottom_frame', showBoundary=0)
+        ]
+        doc.addPageTemplates([PageTemplate(id='TwoStatements', frames=frames)])
+
+        # Группировка олимпиад по ученикам
+        students_subjects = defaultdict(list)
+        for student, subjects in students_data:
+            students_subjects[student].extend(subjects)
+
+        date = datetime.now().strftime("%d.%m.%Y")
+        students_list = list(students_subjects.items())
+        story = []
+        for i in range(0, len(students_list), 2):
+            for student, subjects in students_list[i:i + 2]:
+                paragraphs = self.template.render(self.context(student, subjects, date))
+                for index, (alignment, text) in enumerate(paragraphs):
+                    story.append(self.create_paragraph(text, half_height, doc.width, alignment, index))
+            story.append(FrameBreak())  # Переход к следующей рамке
+
+        doc.build(story)
+        return buffer.getvalue()
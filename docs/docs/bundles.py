@@ -0,0 +1,253 @@
+"""
+Архив согласий всех классов школы (или классов учителя).
+
+PDF каждого класса печатается отдельной задачей в пуле процессов, а архив
+пишется потоком: каждый файл попадает в ZIP, как только готов, и отдаётся
+клиенту (или дописывается в файл на диске), не дожидаясь остальных. Архив
+целиком в памяти не собирается.
+
+Готовые PDF классов складываются в дисковый кэш по ключу из состава класса
+(ученики, их данные и предметы), версии шаблона и даты печати: повторная
+выгрузка печатает заново только изменившиеся классы. PDF каждого класса
+лежат в своём каталоге, и после записи нового PDF класса в нём остаются
+только KEEP_PDFS последних: вытесненные составом или датой файлы удаляются.
+"""
+import hashlib
+import logging
+import os
+import tempfile
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import as_completed
+from datetime import datetime
+
+from django.conf import settings
+
+from classroom.models import Classroom
+from main.conf import app_settings
+from main.pools import process_pool
+from register.models import RegisterAdmin
+
+from .agreements import AgreementRenderer, pdf_settings, selected_template
+
+logger = logging.getLogger(__name__)
+
+BUNDLE_DEFAULTS = {
+    'MAX_WORKERS': min(4, os.cpu_count() or 1),  # Процессов, печатающих PDF классов
+    'CACHE_DIR': os.path.join(settings.BASE_DIR, 'cache', 'agreements'),  # Готовые PDF классов
+    'KEEP_PDFS': 2,  # Последних PDF каждого класса в кэше
+}
+
+
+def bundle_settings():
+    return app_settings('AGREEMENT_BUNDLE', BUNDLE_DEFAULTS)
+
+
+def _render_classroom(pdf_template, students_data):
+    """
+    PDF согласий одного класса. Выполняется в процессе пула и не обращается
+    к базе: ученики передаются вместе с классом (select_related).
+    """
+    return AgreementRenderer(pdf_template).render(students_data)
+
+
+class _ZipStream:
+    """
+    Приёмник для ZipFile без seek/tell: записанное забирается после каждого
+    файла архива. ZipFile в этом случае пишет размеры после данных файла.
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+class AgreementBundle:
+    """
+    Архив согласий по классам. progress — необязательная функция, которой
+    после каждого готового класса передаётся словарь с ключами total, done
+    и cached.
+    """
+
+    def __init__(self, classrooms, pdf_template=None, max_workers=None, cache_dir=None, progress=None):
+        options = bundle_settings()
+        self.classrooms = classrooms
+        # Шаблон выбирается сразу, чтобы ошибка настроек не возникла посреди ответа
+        self.pdf_template = pdf_template or selected_template()
+        self.max_workers = max_workers or options['MAX_WORKERS']
+        self.cache_dir = cache_dir or options['CACHE_DIR']
+        self.keep_pdfs = options['KEEP_PDFS']
+        self.on_progress = progress
+        self.progress = {'total': 0, 'done': 0, 'cached': 0}
+
+    @classmethod
+    def for_school(cls, school, **kwargs):
+        return cls(Classroom.objects.filter(school=school, is_graduated=False), **kwargs)
+
+    @classmethod
+    def for_teacher(cls, teacher, **kwargs):
+        return cls(Classroom.objects.filter(teacher=teacher, is_graduated=False), **kwargs)
+
+    def rosters(self):
+        """
+        Словарь {класс: [(ученик, [предметы])]} одним запросом по утверждённым заявкам.
+        """
+        registrations = (
+            RegisterAdmin.objects
+            .filter(child_admin__classroom__in=self.classrooms, is_deleted=False)
+            .select_related('child_admin__classroom', 'olympiad_admin__subject')
+            .order_by(
+                'child_admin__classroom__number', 'child_admin__classroom__letter',
+                'child_admin__last_name', 'child_admin__first_name', 'child_admin_id', 'id',
+            )
+        )
+        rosters = OrderedDict()
+        for registration in registrations:
+            student = registration.child_admin
+            students = rosters.setdefault(student.classroom, OrderedDict())
+            students.setdefault(student.pk, (student, []))[1].append(registration.olympiad_admin.subject.name)
+        return OrderedDict((classroom, list(students.values())) for classroom, students in rosters.items())
+
+    def cache_key(self, students_data, date):
+        """
+        Ключ PDF класса: версия шаблона, шрифт, дата печати и состав класса.
+        """
+        digest = hashlib.sha256()
+        parts = [self.pdf_template.pk, self.pdf_template.updated_at.isoformat(), pdf_settings()['FONT_NAME'], date]
+        for student, subjects in students_data:
+            classroom = student.classroom
+            parts.extend((
+                student.pk, student.last_name, student.first_name, student.surname, student.gender,
+                classroom.number, classroom.letter, '|'.join(subjects),
+            ))
+        digest.update('\x1f'.join(str(part) for part in parts).encode('utf-8'))
+        return digest.hexdigest()
+
+    def cache_path(self, classroom, key):
+        return os.path.join(self.cache_dir, str(classroom.pk), f'{key}.pdf')
+
+    def read_cached(self, classroom, key):
+        try:
+            with open(self.cache_path(classroom, key), 'rb') as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def write_cached(self, classroom, key, content):
+        # Запись через временный файл: параллельная выгрузка не прочтёт недописанный PDF
+        path = self.cache_path(classroom, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as file:
+            file.write(content)
+        os.replace(tmp_path, path)
+        self.evict(os.path.dirname(path))
+
+    def evict(self, directory):
+        """
+        Оставляет в каталоге класса keep_pdfs последних PDF.
+        """
+        pdfs = []
+        for name in os.listdir(directory):
+            if not name.endswith('.pdf'):
+                continue
+            path = os.path.join(directory, name)
+            try:
+                pdfs.append((os.path.getmtime(path), path))
+            except FileNotFoundError:
+                continue
+        pdfs.sort(reverse=True)
+        for _, path in pdfs[max(self.keep_pdfs, 1):]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def member_name(classroom):
+        return f"Согласия_{classroom.number or ''}{classroom.letter or ''}.pdf"
+
+    def _advance(self, cached=False):
+        self.progress['done'] += 1
+        if cached:
+            self.progress['cached'] += 1
+        if self.on_progress:
+            self.on_progress(dict(self.progress))
+
+    def iter_pdfs(self):
+        """
+        Генератор пар (имя файла в архиве, PDF) по мере готовности: сначала
+        классы из кэша, затем напечатанные, в порядке завершения.
+        """
+        # Дата входит в текст согласия, поэтому фиксируется на всю выгрузку
+        date = datetime.now().strftime("%d.%m.%Y")
+        rosters = self.rosters()
+        self.progress = {'total': len(rosters), 'done': 0, 'cached': 0}
+        if self.on_progress:
+            self.on_progress(dict(self.progress))
+
+        missing = []
+        for classroom, students_data in rosters.items():
+            key = self.cache_key(students_data, date)
+            content = self.read_cached(classroom, key)
+            if content is None:
+                missing.append((classroom, students_data, key))
+                continue
+            self._advance(cached=True)
+            yield self.member_name(classroom), content
+
+        if self.max_workers <= 1 or len(missing) <= 1:
+            for classroom, students_data, key in missing:
+                content = _render_classroom(self.pdf_template, students_data)
+                self.write_cached(classroom, key, content)
+                self._advance()
+                yield self.member_name(classroom), content
+            return
+
+        with process_pool(min(self.max_workers, len(missing))) as executor:
+            futures = {
+                executor.submit(_render_classroom, self.pdf_template, students_data): (classroom, key)
+                for classroom, students_data, key in missing
+            }
+            try:
+                for future in as_completed(futures):
+                    classroom, key = futures[future]
+                    content = future.result()
+                    self.write_cached(classroom, key, content)
+                    self._advance()
+                    yield self.member_name(classroom), content
+            finally:
+                # Клиент мог оборвать загрузку: оставшиеся классы не нужны
+                for future in futures:
+                    future.cancel()
+
+    def stream(self):
+        """
+        Генератор частей ZIP-архива для StreamingHttpResponse.
+        """
+        sink = _ZipStream()
+        with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            for name, content in self.iter_pdfs():
+                archive.writestr(name, content)
+                yield sink.drain()
+        yield sink.drain()
+
+    def write_to(self, path):
+        """
+        Записывает архив в файл; классы дописываются по мере готовности.
+        """
+        with open(path, 'wb') as file:
+            for chunk in self.stream():
+                file.write(chunk)
+        return path
@@ -0,0 +1,194 @@
+"""
+Фоновые выгрузки данных школы.
+
+Клиент создаёт задание (ExportJob), выгрузка выполняется задачей Celery
+run_export_task, а ход работы клиент читает по id задания. Готовый файл
+сохраняется на диске под ключом из вида выгрузки, школы и версии её данных
+(main.versions), а для зависящих от справочников и шаблонов выгрузок — и
+их версий. Пока данные не менялись, новое задание сразу получает готовый
+файл и в очередь не ставится.
+"""
+import hashlib
+import logging
+import os
+import tempfile
+from datetime import datetime
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from main.conf import app_settings
+from main.registry import references
+from main.versions import school_data_version
+from result.exports import CONTENT_TYPES, export_results_to_path
+from .agreements import pdf_settings, selected_template
+from .bundles import AgreementBundle
+from .models import ExportJob
+from .pivot import XLSX_CONTENT_TYPE, save_workbook, school_applications
+
+logger = logging.getLogger(__name__)
+
+EXPORT_DEFAULTS = {
+    'ARTIFACT_DIR': os.path.join(settings.BASE_DIR, 'cache', 'exports'),  # Готовые файлы по версии данных школы
+    'KEEP_ARTIFACTS': 3,  # Последних файлов каждой выгрузки школы на диске
+}
+
+
+def export_settings():
+    return app_settings('EXPORT_JOBS', EXPORT_DEFAULTS)
+
+
+def _build_results_xlsx(school, path, progress):
+    export_results_to_path(school.pk, path, 'xlsx')
+
+
+def _build_results_csv(school, path, progress):
+    export_results_to_path(school.pk, path, 'csv')
+
+
+def _build_applications(school, path, progress):
+    headers, rows = school_applications(school)
+    save_workbook(path, headers, rows)
+
+
+def _build_agreements(school, path, progress):
+    bundle = AgreementBundle.for_school(school, progress=lambda state: progress(state['done'], state['total']))
+    bundle.write_to(path)
+
+
+def _results_extra():
+    return []
+
+
+def _applications_extra():
+    # Колонки предметов берутся из справочника
+    return [references.subjects.version()]
+
+
+def _agreements_extra():
+    # В текст согласия входят шаблон, шрифт и дата печати
+    template = selected_template()
+    return [template.pk, template.updated_at.isoformat(), pdf_settings()['FONT_NAME'],
+            datetime.now().strftime("%d.%m.%Y")]
+
+
+# Вид выгрузки: (имя файла, тип содержимого, построение файла, дополнительные части ключа)
+EXPORTS = {
+    ExportJob.RESULTS_XLSX: ('results.xlsx', CONTENT_TYPES['xlsx'], _build_results_xlsx, _results_extra),
+    ExportJob.RESULTS_CSV: ('results.csv', CONTENT_TYPES['csv'], _build_results_csv, _results_extra),
+    ExportJob.APPLICATIONS: ('applications.xlsx', XLSX_CONTENT_TYPE, _build_applications, _applications_extra),
+    ExportJob.AGREEMENTS: ('agreements.zip', 'application/zip', _build_agreements, _agreements_extra),
+}
+
+
+def artifact_key(school, kind):
+    """
+    Ключ готового файла: вид выгрузки, школа, версия данных школы и
+    дополнительные версии вида.
+    """
+    parts = [kind, school.pk, school_data_version(school.pk), *EXPORTS[kind][3]()]
+    return hashlib.sha256('\x1f'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+
+def artifact_path(school_id, kind, key):
+    extension = os.path.splitext(EXPORTS[kind][0])[1]
+    return os.path.join(export_settings()['ARTIFACT_DIR'], str(school_id), kind, f'{key}{extension}')
+
+
+def request_export(school, kind, user=None):
+    """
+    Задание на выгрузку. Если файл с текущим ключом уже есть, задание сразу
+    завершено; если такая же выгрузка уже в очереди или выполняется,
+    возвращается она. Иначе задача ставится в очередь после коммита.
+    Уникальное ограничение unique_active_export_job не даёт двум параллельным
+    запросам поставить одну выгрузку дважды.
+    """
+    if kind not in EXPORTS:
+        raise ValueError(f'Неизвестный вид выгрузки: {kind}')
+    key = artifact_key(school, kind)
+    path = artifact_path(school.pk, kind, key)
+    fields = {'school': school, 'kind': kind, 'artifact_key': key, 'requested_by': user}
+
+    if os.path.exists(path):
+        return ExportJob.objects.create(
+            **fields, status=ExportJob.FINISHED, path=path, cached=True,
+            progress_done=1, progress_total=1, finished_at=timezone.now(),
+        )
+
+    active = ExportJob.objects.filter(
+        school=school, kind=kind, artifact_key=key, status__in=(ExportJob.PENDING, ExportJob.RUNNING)
+    )
+    job = active.first()
+    if job:
+        return job
+
+    from .tasks import run_export_task
+
+    try:
+        with transaction.atomic():
+            job = ExportJob.objects.create(**fields)
+    except IntegrityError:
+        # Такую же выгрузку параллельно поставил другой запрос (unique_active_export_job)
+        return ExportJob.objects.filter(school=school, kind=kind, artifact_key=key).latest('created_at')
+    transaction.on_commit(lambda: run_export_task.delay(job.pk))
+    return job
+
+
+def _remove_stale(path):
+    """
+    Удаляет файлы той же выгрузки со старыми ключами, оставляя вместе с
+    новым файлом KEEP_ARTIFACTS последних: на них указывают завершённые
+    задания, и их ещё могут скачивать. Файлы новее построенного (их
+    записало параллельное задание) не трогаются.
+    """
+    directory = os.path.dirname(path)
+    built = os.path.getmtime(path)
+    older = []
+    for name in os.listdir(directory):
+        stale = os.path.join(directory, name)
+        if stale == path or name.endswith('.tmp'):
+            continue
+        try:
+            modified = os.path.getmtime(stale)
+        except FileNotFoundError:
+            continue
+        if modified < built:
+            older.append((modified, stale))
+    older.sort(reverse=True)
+    for _, stale in older[max(export_settings()['KEEP_ARTIFACTS'] - 1, 0):]:
+        try:
+            os.remove(stale)
+        except FileNotFoundError:
+            pass
+
+
+def run_export(job):
+    """
+    Выполняет задание: строит файл во временном файле рядом с итоговым и
+    переносит его на место одной операцией.
+    """
+    job.mark(ExportJob.RUNNING)
+    path = artifact_path(job.school_id, job.kind, job.artifact_key)
+    try:
+        if os.path.exists(path):
+            job.mark(ExportJob.FINISHED, path=path, cached=True)
+            return job
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        os.close(fd)
+        try:
+            EXPORTS[job.kind][2](job.school, tmp_path, job.set_progress)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        _remove_stale(path)
+    except Exception as e:
+        logger.exception(f'Выгрузка №{job.pk} завершилась ошибкой.')
+        job.mark(ExportJob.FAILED, error_message=str(e))
+        return job
+
+    steps = max(job.progress_total, 1)
+    job.mark(ExportJob.FINISHED, path=path, progress_done=steps, progress_total=steps)
+    return job
@@ -0,0 +1,153 @@
+"""
+Извлечение таблиц из PDF-протоколов олимпиад.
+
+Поиск таблиц pdfplumber занимает секунды на страницу, поэтому страницы
+большого протокола делятся на группы и разбираются параллельно в пуле
+процессов. Процессам передаётся только путь к файлу и номера страниц:
+каждый открывает PDF сам, объекты страниц между процессами не копируются.
+Таблицы отдаются генератором в порядке страниц, а в работе держится не
+больше двух групп на процесс, поэтому сопоставление строк с базой
+начинается до окончания разбора всего файла и память не растёт с размером
+протокола.
+"""
+import logging
+import os
+import tempfile
+from collections import deque
+from contextlib import contextmanager
+
+import pdfplumber
+
+from main.conf import app_settings
+from main.pools import process_pool
+
+logger = logging.getLogger(__name__)
+
+# Колонки протокола cpkimr.ru в порядке следования
+PROTOCOL_COLUMNS = (
+    'number', 'last_name', 'first_name', 'patronymic', 'school_full_name',
+    'class_current', 'class_competition', 'participant_status', 'result',
+)
+
+EXTRACT_DEFAULTS = {
+    'MAX_WORKERS': min(4, os.cpu_count() or 1),  # Процессов, разбирающих страницы одного файла
+    'PAGES_PER_TASK': 2,  # Страниц в одной задаче процесса
+}
+
+
+def extract_settings():
+    return app_settings('PDF_EXTRACT', EXTRACT_DEFAULTS)
+
+
+def _extract_pages(path, page_numbers):
+    """
+    Таблицы указанных страниц файла: список (номер страницы, строки или None).
+    Выполняется в процессе пула.
+    """
+    with pdfplumber.open(path) as pdf:
+        return [(page_num, pdf.pages[page_num - 1].extract_table()) for page_num in page_numbers]
+
+
+@contextmanager
+def _pdf_path(content=None, path=None):
+    """
+    Путь к файлу протокола; содержимое из памяти записывается во временный файл.
+    """
+    if path is not None:
+        yield path
+        return
+    fd, path = tempfile.mkstemp(suffix='.pdf')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(content)
+        yield path
+    finally:
+        os.remove(path)
+
+
+def iter_page_tables(content=None, path=None, max_workers=None, pages_per_task=None):
+    """
+    Генератор пар (номер страницы, строки таблицы или None) в порядке страниц.
+
+    Файл передаётся содержимым (content) или путём (path). Если страниц мало
+    или задан один процесс, страницы разбираются в текущем процессе. Внутри
+    процесса Celery страницы разбирает пул billiard (main.pools).
+    """
+    options = extract_settings()
+    max_workers = max_workers or options['MAX_WORKERS']
+    pages_per_task = pages_per_task or options['PAGES_PER_TASK']
+
+    with _pdf_path(content, path) as path:
+        with pdfplumber.open(path) as pdf:
+            page_count = len(pdf.pages)
+        chunks = [
+            range(start, min(start + pages_per_task, page_count + 1))
+            for start in range(1, page_count + 1, pages_per_task)
+        ]
+        logger.debug(f'PDF {path}: {page_count} страниц, {len(chunks)} групп.')
+
+        if max_workers <= 1 or len(chunks) <= 1:
+            for pages in chunks:
+                yield from _extract_pages(path, pages)
+            return
+
+        workers = min(max_workers, len(chunks))
+        chunks = iter(chunks)
+        pending = deque()
+        with process_pool(workers) as executor:
+            try:
+                for _ in range(workers * 2):
+                    pages = next(chunks, None)
+                    if pages is None:
+                        break
+                    pending.append(executor.submit(_extract_pages, path, pages))
+                while pending:
+                    tables = pending.popleft().result()
+                    pages = next(chunks, None)
+                    if pages is not None:
+                        pending.append(executor.submit(_extract_pages, path, pages))
+                    yield from tables
+            finally:
+                # Генератор могли закрыть досрочно: оставшиеся группы не нужны
+                for future in pending:
+                    future.cancel()
+
+
+def extract_tables(content):
+    """
+    Все таблицы PDF-файла списком (номер страницы, строки таблицы или None).
+    Результат сериализуется в JSON и кэшируется по хэшу файла (docs.protocols).
+    """
+    return list(iter_page_tables(content))
+
+
+def normalize_cell(value):
+    """
+    Текст ячейки без переносов строк и лишних пробелов; пустая ячейка — ''.
+    """
+    return ' '.join(str(value).split()) if value is not None else ''
+
+
+def iter_rows(page_tables):
+    """
+    Генератор строк протокола в виде словарей с колонками PROTOCOL_COLUMNS,
+    номером страницы (page_num) и строки (row_num). Первая строка таблицы
+    считается заголовком. Вместо отсутствующих таблиц и строк с недостающими
+    колонками отдаются словари с ключом error.
+    """
+    for page_num, table in page_tables:
+        if not table:
+            yield {'page_num': page_num, 'error': f'Таблица на странице {page_num} не найдена.'}
+            continue
+        logger.debug(f'Найдено {len(table) - 1} строк данных на странице {page_num}')
+        for row_num, row in enumerate(table[1:], start=1):
+            if len(row) < len(PROTOCOL_COLUMNS):
+                yield {
+                    'page_num': page_num,
+                    'row_num': row_num,
+                    'error': f'Строка {row_num} на странице {page_num} некорректна (мало колонок): {row}',
+                }
+                continue
+            values = {column: normalize_cell(value) for column, value in zip(PROTOCOL_COLUMNS, row)}
+            values.update(page_num=page_num, row_num=row_num)
+            yield values
@@ -0,0 +1,165 @@
+"""
+Загрузка страниц и протоколов олимпиад с сайта cpkimr.ru.
+
+Все запросы одного запуска импорта идут через один requests.Session с пулом
+соединений (keep-alive), таймаутом и повтором при временных ошибках.
+Страница результатов этапа скачивается и разбирается один раз за запуск, а
+PDF-протоколы скачиваются параллельно пулом потоков с ограниченным числом
+одновременных запросов.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urljoin
+
+import requests
+from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from main.conf import app_settings
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = (
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko)'
+    ' Chrome/58.0.3029.110 Safari/537.3'
+)
+
+FETCH_DEFAULTS = {
+    'BASE_URL': 'https://cpkimr.ru',
+    'MAX_WORKERS': 6,  # Одновременных загрузок
+    'TIMEOUT': 30,  # Таймаут запроса, секунд
+    'RETRIES': 3,  # Повторов при сетевых ошибках и ответах 5xx/429
+}
+
+
+def fetch_settings():
+    return app_settings('CPKIMR_FETCH', FETCH_DEFAULTS)
+
+
+def normalize_subject(name):
+    """
+    Ключ предмета для сопоставления названий с сайта и из системы.
+    """
+    return ' '.join((name or '').split()).lower()
+
+
+def parse_results_index(html, base_url):
+    """
+    Разбирает страницу результатов этапа.
+    Возвращает словарь {название предмета: [ссылки на PDF]} в порядке страницы.
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    index = {}
+    for p in soup.find_all('p', class_='olimplic_page_p'):
+        span = p.find('span')
+        a_tag = p.find('a', href=True)
+        if not (span and a_tag):
+            logger.debug('Тег <p> не содержит одновременно <span> и <a>.')
+            continue
+        subject_name = span.get_text(strip=True)
+        index.setdefault(subject_name, []).append(urljoin(base_url, a_tag['href']))
+    return index
+
+
+class FetchError(Exception):
+    """
+    Ошибка загрузки страницы или файла.
+    """
+
+
+class CpkimrClient:
+    """
+    Клиент сайта cpkimr.ru на один запуск импорта.
+
+    Страницы результатов кэшируются в экземпляре: сколько бы предметов ни
+    запрашивалось, каждая страница этапа скачивается один раз.
+    """
+
+    def __init__(self, base_url=None, max_workers=None, timeout=None, retries=None, session=None):
+        options = fetch_settings()
+        self.base_url = (base_url or options['BASE_URL']).rstrip('/')
+        self.max_workers = max_workers or options['MAX_WORKERS']
+        self.timeout = timeout or options['TIMEOUT']
+        self.session = session or self._build_session(retries if retries is not None else options['RETRIES'])
+        self._indexes = {}
+
+    def _build_session(self, retries):
+        session = requests.Session()
+        retry = Retry(
+            total=retries, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=('GET', 'HEAD'),
+        )
+        # Пул рассчитан на число потоков загрузки, чтобы соединения не пересоздавались
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers, max_retries=retry)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers['User-Agent'] = USER_AGENT
+        return session
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def get(self, url, **kwargs):
+        """
+        GET-запрос через общий пул. Ошибки сети и статусы 4xx/5xx дают FetchError.
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        try:
+            response = self.session.get(url, **kwargs)
+        except requests.RequestException as e:
+            raise FetchError(f'Не удалось получить {url}: {e}') from e
+        if response.status_code >= 400:
+            raise FetchError(f'Не удалось получить {url}: статус {response.status_code}')
+        return response
+
+    def results_url(self, stage_slug):
+        return f'{self.base_url}/activity/olimpic/{stage_slug}/'
+
+    def results_index(self, stage_slug):
+        """
+        Словарь {предмет: [ссылки на PDF]} для этапа; страница скачивается один раз.
+        """
+        if stage_slug not in self._indexes:
+            response = self.get(self.results_url(stage_slug))
+            self._indexes[stage_slug] = parse_results_index(response.content, self.base_url)
+            logger.info(f'Найдено {len(self._indexes[stage_slug])} предметов на странице этапа {stage_slug}.')
+        return self._indexes[stage_slug]
+
+    def pdf_links(self, subject_name, stage_slug):
+        """
+        Ссылки на протоколы предмета без учёта регистра и лишних пробелов.
+        """
+        key = normalize_subject(subject_name)
+        links = []
+        for name, urls in self.results_index(stage_slug).items():
+            if normalize_subject(name) == key:
+                links.extend(urls)
+        return links
+
+    def fetch_many(self, urls, headers=None):
+        """
+        Скачивает файлы параллельно, не более max_workers запросов одновременно.
+        headers — необязательный словарь {url: заголовки запроса}, например
+        для условных запросов. Генератор пар (url, ответ или FetchError)
+        в порядке завершения.
+        """
+        urls = list(dict.fromkeys(urls))
+        if not urls:
+            return
+        headers = headers or {}
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(urls))) as executor:
+            futures = {executor.submit(self.get, url, headers=headers.get(url)): url for url in urls}
+            for future in as_completed(futures):
+                url = futures[future]
+                try:
+                    yield url, future.result()
+                except FetchError as e:
+                    logger.error(str(e))
+                    yield url, e
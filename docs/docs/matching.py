@@ -0,0 +1,86 @@
+"""
+Сопоставление названий школ из протоколов со школами платформы.
+
+Названия школ (School.name_cpkimr и School.name) один раз разбиваются на
+слова и складываются в индекс по первому слову. Название из строки
+протокола разбивается так же, и для каждого слова проверяются только
+названия, которые с него начинаются. Школа подходит, если все слова её
+названия идут в строке подряд; из нескольких подходящих выбирается самое
+длинное название. Результат запоминается для каждой строки названия:
+в протоколе одна школа повторяется десятки раз.
+"""
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+WORD_RE = re.compile(r'\w+')
+
+
+def tokenize(name):
+    """
+    Слова названия в нижнем регистре, без кавычек, знаков препинания и «№».
+    """
+    return tuple(WORD_RE.findall((name or '').lower().replace('ё', 'е')))
+
+
+class SchoolMatcher:
+    """
+    Предкомпилированный индекс названий школ.
+    entries — пары (название, школа); у одной школы может быть несколько названий.
+    """
+
+    def __init__(self, entries):
+        self._index = {}
+        self._cache = {}
+        self.schools = []
+        seen = set()
+        for name, school in entries:
+            tokens = tokenize(name)
+            if not tokens:
+                continue
+            self._index.setdefault(tokens[0], []).append((tokens, school))
+            if school.pk not in seen:
+                seen.add(school.pk)
+                self.schools.append(school)
+
+    @classmethod
+    def for_schools(cls, schools):
+        """
+        Индекс по названиям с сайта (name_cpkimr) и собственным названиям школ.
+        """
+        entries = []
+        for school in schools:
+            if school.name_cpkimr:
+                entries.append((school.name_cpkimr, school))
+            entries.append((school.name, school))
+        return cls(entries)
+
+    def _find(self, name):
+        tokens = tokenize(name)
+        best_length = 0
+        best = set()
+        matched = {}
+        for position, token in enumerate(tokens):
+            for pattern, school in self._index.get(token, ()):
+                if tokens[position:position + len(pattern)] != pattern:
+                    continue
+                if len(pattern) > best_length:
+                    best_length = len(pattern)
+                    best = set()
+                if len(pattern) == best_length:
+                    best.add(school.pk)
+                    matched[school.pk] = school
+        if len(best) > 1:
+            logger.warning(f'Название «{name}» подходит к нескольким школам: {sorted(best)}')
+            return None
+        return matched[best.pop()] if best else None
+
+    def match(self, name):
+        """
+        Школа для названия из протокола или None, если подходящей нет или
+        название неоднозначно.
+        """
+        if name not in self._cache:
+            self._cache[name] = self._find(name)
+        return self._cache[name]
@@ -0,0 +1,255 @@
+from django.db import models
+from django.utils import timezone
+
+
+class FetchedDocument(models.Model):
+    """
+    Протокол олимпиады, скачанный с cpkimr.ru: заголовки для условного
+    запроса и SHA-256 содержимого последней загрузки.
+    """
+    url = models.URLField('Адрес файла', max_length=500, unique=True)
+    subject = models.ForeignKey(
+        'main.Subject', on_delete=models.SET_NULL, blank=True, null=True, verbose_name='Предмет'
+    )
+    stage_slug = models.CharField('Этап на сайте', max_length=32, blank=True)
+    etag = models.CharField('ETag', max_length=256, blank=True)
+    last_modified = models.CharField('Last-Modified', max_length=64, blank=True)
+    sha256 = models.CharField('SHA-256 содержимого', max_length=64, blank=True, db_index=True)
+    size = models.PositiveIntegerField('Размер, байт', default=0)
+    imported_sha256 = models.CharField(
+        'SHA-256 последнего импортированного содержимого', max_length=64, blank=True
+    )
+    fetched_at = models.DateTimeField('Последняя загрузка содержимого', blank=True, null=True)
+    checked_at = models.DateTimeField('Последняя проверка', blank=True, null=True)
+
+    def __str__(self):
+        return self.url
+
+    @property
+    def is_imported(self):
+        return bool(self.sha256) and self.sha256 == self.imported_sha256
+
+    class Meta:
+        verbose_name = 'Скачанный протокол'
+        verbose_name_plural = 'Скачанные протоколы'
+
+
+class ParsedProtocol(models.Model):
+    """
+    Таблицы, извлечённые из PDF-протокола, по хэшу содержимого файла.
+    Позволяют повторить импорт (например, после изменения правил) без сети
+    и без повторного разбора PDF.
+    """
+    sha256 = models.CharField('SHA-256 содержимого', max_length=64)
+    parser_version = models.PositiveIntegerField('Версия разбора')
+    tables = models.JSONField('Таблицы по страницам')
+    pages = models.PositiveIntegerField('Страниц', default=0)
+    created_at = models.DateTimeField('Дата разбора', auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.sha256[:12]} (v{self.parser_version})'
+
+    class Meta:
+        verbose_name = 'Разобранный протокол'
+        verbose_name_plural = 'Разобранные протоколы'
+        constraints = [
+            models.UniqueConstraint(fields=['sha256', 'parser_version'], name='unique_parsed_protocol'),
+        ]
+
+
+class ImportRun(models.Model):
+    """
+    Запуск ночного импорта протоколов. Состоит из единиц работы (ImportCheckpoint)
+    по одному файлу; итог собирается после завершения всех единиц.
+    """
+    RUNNING = 'running'
+    FINISHED = 'finished'
+    FAILED = 'failed'
+
+    STATUSES = [
+        (RUNNING, 'Выполняется'),
+        (FINISHED, 'Завершён'),
+        (FAILED, 'Завершён с ошибками'),
+    ]
+
+    status = models.CharField('Статус', max_length=16, choices=STATUSES, default=RUNNING)
+    stage_slugs = models.JSONField('Этапы', default=list)
+    force = models.BooleanField('Импорт всех файлов заново', default=False)
+    stats = models.JSONField('Итоги', default=dict, blank=True)
+    started_at = models.DateTimeField('Начало', auto_now_add=True)
+    finished_at = models.DateTimeField('Окончание', blank=True, null=True)
+
+    def __str__(self):
+        return f'Импорт №{self.pk} ({self.get_status_display()})'
+
+    def finish(self):
+        """
+        Собирает итоги по контрольным точкам и завершает запуск.
+        """
+        counts = dict(
+            self.checkpoints.values_list('status').annotate(count=models.Count('id')).order_by()
+        )
+        totals = self.checkpoints.aggregate(
+            rows_imported=models.Sum('rows_imported'), errors=models.Sum('errors')
+        )
+        self.stats = {
+            **self.stats,
+            'units': sum(counts.values()),
+            **{status: counts.get(status, 0) for status, _ in ImportCheckpoint.STATUSES},
+            'rows_imported': totals['rows_imported'] or 0,
+            'errors': totals['errors'] or 0,
+        }
+        failed = counts.get(ImportCheckpoint.FAILED, 0) or self.stats.get('index_errors')
+        self.status = self.FAILED if failed else self.FINISHED
+        self.finished_at = timezone.now()
+        self.save(update_fields=['stats', 'status', 'finished_at'])
+
+    class Meta:
+        verbose_name = 'Запуск импорта'
+        verbose_name_plural = 'Запуски импорта'
+
+
+class ImportCheckpoint(models.Model):
+    """
+    Контрольная точка импорта одного протокола (предмет, этап, файл) в
+    запуске. Повторный запуск и возобновление выполняют только единицы,
+    которые не завершены или завершились ошибкой.
+    """
+    PENDING = 'pending'
+    DONE = 'done'
+    UNCHANGED = 'unchanged'
+    FAILED = 'failed'
+
+    STATUSES = [
+        (PENDING, 'Ожидает'),
+        (DONE, 'Импортирован'),
+        (UNCHANGED, 'Не изменился'),
+        (FAILED, 'Ошибка'),
+    ]
+    FINISHED_STATUSES = (DONE, UNCHANGED)
+
+    run = models.ForeignKey(ImportRun, on_delete=models.CASCADE, related_name='checkpoints', verbose_name='Запуск')
+    url = models.URLField('Адрес файла', max_length=500)
+    subject = models.ForeignKey(
+        'main.Subject', on_delete=models.SET_NULL, blank=True, null=True, verbose_name='Предмет'
+    )
+    stage_slug = models.CharField('Этап на сайте', max_length=32)
+    status = models.CharField('Статус', max_length=16, choices=STATUSES, default=PENDING)
+    sha256 = models.CharField('SHA-256 содержимого', max_length=64, blank=True)
+    rows_imported = models.PositiveIntegerField('Импортировано учеников', default=0)
+    errors = models.PositiveIntegerField('Ошибок в строках', default=0)
+    error_message = models.TextField('Ошибка', blank=True)
+    attempts = models.PositiveIntegerField('Попыток', default=0)
+    updated_at = models.DateTimeField('Обновлено', auto_now=True)
+
+    def __str__(self):
+        return f'{self.url} ({self.get_status_display()})'
+
+    @property
+    def is_finished(self):
+        return self.status in self.FINISHED_STATUSES
+
+    def mark(self, status, **fields):
+        """
+        Сохраняет состояние единицы работы.
+        """
+        self.status = status
+        for name, value in fields.items():
+            setattr(self, name, value)
+        self.save(update_fields=['status', 'updated_at', *fields])
+
+    def summary(self):
+        return {
+            'checkpoint': self.pk,
+            'status': self.status,
+            'rows_imported': self.rows_imported,
+            'errors': self.errors,
+        }
+
+    class Meta:
+        verbose_name = 'Контрольная точка импорта'
+        verbose_name_plural = 'Контрольные точки импорта'
+        constraints = [
+            models.UniqueConstraint(fields=['run', 'url'], name='unique_import_checkpoint'),
+        ]
+
+
+class ExportJob(models.Model):
+    """
+    Фоновая выгрузка данных школы. Готовый файл хранится на диске под
+    ключом с версией данных школы (artifact_key) и отдаётся повторно, пока
+    данные не изменились.
+    """
+    RESULTS_XLSX = 'results_xlsx'
+    RESULTS_CSV = 'results_csv'
+    APPLICATIONS = 'applications'
+    AGREEMENTS = 'agreements'
+
+    KINDS = [
+        (RESULTS_XLSX, 'Результаты (xlsx)'),
+        (RESULTS_CSV, 'Результаты (csv)'),
+        (APPLICATIONS, 'Заявки школы (xlsx)'),
+        (AGREEMENTS, 'Согласия по классам (zip)'),
+    ]
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    FINISHED = 'finished'
+    FAILED = 'failed'
+
+    STATUSES = [
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (FINISHED, 'Готово'),
+        (FAILED, 'Ошибка'),
+    ]
+
+    kind = models.CharField('Вид выгрузки', max_length=32, choices=KINDS)
+    school = models.ForeignKey('school.School', on_delete=models.CASCADE, verbose_name='Школа')
+    requested_by = models.ForeignKey(
+        'users.User', on_delete=models.SET_NULL, blank=True, null=True, verbose_name='Запросил'
+    )
+    status = models.CharField('Статус', max_length=16, choices=STATUSES, default=PENDING)
+    artifact_key = models.CharField('Ключ файла', max_length=64, db_index=True)
+    path = models.CharField('Путь к файлу', max_length=500, blank=True)
+    progress_done = models.PositiveIntegerField('Выполнено шагов', default=0)
+    progress_total = models.PositiveIntegerField('Всего шагов', default=0)
+    cached = models.BooleanField('Готовый файл из кэша', default=False)
+    error_message = models.TextField('Ошибка', blank=True)
+    created_at = models.DateTimeField('Создана', auto_now_add=True)
+    finished_at = models.DateTimeField('Завершена', blank=True, null=True)
+
+    class Meta:
+        verbose_name = 'Выгрузка'
+        verbose_name_plural = 'Выгрузки'
+        ordering = ['-created_at']
+        constraints = [
+            # Одна выгрузка с тем же ключом файла в очереди или в работе
+            models.UniqueConstraint(
+                fields=['school', 'kind', 'artifact_key'],
+                condition=models.Q(status__in=['pending', 'running']),
+                name='unique_active_export_job',
+            ),
+        ]
+
+    def __str__(self):
+        return f'Выгрузка №{self.pk}: {self.get_kind_display()} ({self.get_status_display()})'
+
+    @property
+    def is_finished(self):
+        return self.status in (self.FINISHED, self.FAILED)
+
+    def mark(self, status, **fields):
+        """
+        Сохраняет статус и поля задания, не перезаписывая прогресс.
+        """
+        self.status = status
+        if self.is_finished:
+            fields.setdefault('finished_at', timezone.now())
+        for name, value in fields.items():
+            setattr(self, name, value)
+        self.save(update_fields=['status', *fields])
+
+    def set_progress(self, done, total):
+        self.progress_done, self.progress_total = done, total
+        self.save(update_fields=['progress_done', 'progress_total'])
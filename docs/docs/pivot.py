@@ -0,0 +1,132 @@
+"""
+Сводная таблица заявок «ученик × предмет» для выгрузок в Excel.
+
+Заявки читаются одним запросом с join-ами через values_list: объекты
+учеников, классов и олимпиад не создаются и не подгружаются по одному.
+Строки сворачиваются по ученикам в памяти, а книга Excel пишется в
+режиме write-only: строки сразу сериализуются и не хранятся в ячейках.
+"""
+from collections import OrderedDict
+
+from openpyxl import Workbook
+
+from main.registry import normalize_name, references
+from register.models import RegisterAdmin
+
+# Предметы всероссийской олимпиады в порядке колонок выгрузки
+SUBJECT_ORDER = (
+    "Английский язык (4, 5-6, 7-8, 9-11)", "География (5, 6, 7, 8, 9, 10-11)", "Информатика (3, 4)",
+    "Искусство (МХК) (5, 6, 7, 8, 9, 10, 11)", "История (5, 6, 7, 8, 9, 10-11)", "ИЗО (7, 8, 9)",
+    "Литература (5, 6, 7, 8, 9, 10, 11)", "Музыка (5, 6, 7, 8)", "Немецкий язык (4, 5-6, 7-8, 9-11)",
+    "Обществознание (5, 6, 7, 8, 9, 10, 11)", "ОБЗР (5, 6, 7, 8, 9, 10-11)", "Право (9, 10, 11)",
+    "Психология (7-11)", "Русский язык (5, 6, 7, 8, 9, 10, 11)", "Труд (технология) (5-6, 7-8, 9, 10-11)",
+    "Физика (5, 6)", "Физическая культура (5-6, 7-8, 9-11)", "Французский язык (4, 5-6, 7-8, 9-11)",
+    "Экология (7, 8, 9, 10, 11)", "Экономика (7-9, 10-11)", "НШ: литературное чтение (4)",
+    "НШ: окружающий мир (4)", "НШ: русский язык (4)",
+)
+
+# Поля заявки для сводной таблицы, порядок важен для разбора строк
+PIVOT_FIELDS = (
+    'child_admin_id', 'child_admin__last_name', 'child_admin__first_name', 'child_admin__surname',
+    'child_admin__gender', 'child_admin__birth_date', 'child_admin__classroom__number',
+    'child_admin__classroom__letter', 'olympiad_admin__subject__name',
+)
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+def ordered_subjects():
+    """
+    Названия колонок предметов: SUBJECT_ORDER, затем остальные предметы из
+    справочника. Предмет справочника, совпадающий с колонкой SUBJECT_ORDER
+    без учёта регистра и пробелов, второй колонки не получает.
+    """
+    subjects = list(SUBJECT_ORDER)
+    known = {normalize_name(name) for name in subjects}
+    for subject in references.subjects.all():
+        key = normalize_name(subject.name)
+        if key not in known:
+            known.add(key)
+            subjects.append(subject.name.lower().title())
+    return subjects
+
+
+class StudentPivot:
+    """
+    Ученики с отметками 0/1 по предметам. Заявки на предметы без колонки
+    учитываются в общем числе заявлений ученика.
+    """
+
+    def __init__(self, subjects=None):
+        self.subjects = list(subjects) if subjects is not None else ordered_subjects()
+        self._columns = {normalize_name(name): index for index, name in enumerate(self.subjects)}
+        self.students = OrderedDict()
+
+    @classmethod
+    def from_queryset(cls, queryset, subjects=None):
+        """
+        Сводная таблица по заявкам RegisterAdmin одним запросом.
+        """
+        pivot = cls(subjects)
+        rows = queryset.order_by(
+            'child_admin__classroom__number', 'child_admin__classroom__letter',
+            'child_admin__last_name', 'child_admin__first_name', 'child_admin_id',
+        ).values_list(*PIVOT_FIELDS)
+        for row in rows.iterator():
+            pivot.add(*row)
+        return pivot
+
+    def add(self, student_id, last_name, first_name, surname, gender, birth_date, number, letter, subject):
+        student = self.students.get(student_id)
+        if student is None:
+            classroom = f"{number}{letter}" if number is not None else ''
+            student = self.students[student_id] = {
+                'info': [last_name, first_name, surname, gender, birth_date, classroom],
+                'marks': [0] * len(self.subjects),
+                'count': 0,
+            }
+        column = self._columns.get(normalize_name(subject))
+        if column is not None:
+            if student['marks'][column]:
+                return
+            student['marks'][column] = 1
+        student['count'] += 1
+
+    def rows(self, extra=()):
+        """
+        Строки таблицы: №, ФИО, пол, дата рождения, класс, extra, отметки и
+        число заявлений.
+        """
+        extra = list(extra)
+        for index, student in enumerate(self.students.values(), start=1):
+            yield [index] + student['info'] + extra + student['marks'] + [student['count']]
+
+
+def school_applications(school):
+    """
+    Заголовки и строки выгрузки заявок всей школы (ExcelAllAPIView).
+    """
+    pivot = StudentPivot.from_queryset(RegisterAdmin.objects.filter(is_deleted=False, school=school))
+    headers = [
+                  "№", "Фамилия", "Имя", "Отчество", "Пол", "Дата рождения", "Класс", "Гражданство", "ОВЗ",
+                  "Наименование ОУ"
+              ] + pivot.subjects + ["Кол-во заявлений"]
+    extra = [
+        "РФ",  # Гражданство
+        "",  # ОВЗ
+        "МАОУ «МЛ № 1»",  # Наименование ОУ
+    ]
+    return headers, pivot.rows(extra)
+
+
+def save_workbook(target, headers, rows):
+    """
+    Записывает таблицу в файл или файловый объект (например, HttpResponse)
+    через write-only книгу.
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(headers)
+    for row in rows:
+        ws.append(row)
+    wb.save(target)
@@ -0,0 +1,144 @@
+"""
+Кэш протоколов олимпиад между запусками импорта.
+
+Для каждого адреса протокола хранятся ETag, Last-Modified и SHA-256
+содержимого (FetchedDocument). Уже импортированные файлы запрашиваются
+условным GET: ответ 304 или совпадение хэша означают, что файл не
+изменился, и он пропускается без разбора и без работы с базой.
+
+Таблицы, извлечённые из PDF, сохраняются по хэшу содержимого
+(ParsedProtocol), поэтому повторный импорт после изменения правил
+выполняется из кэша без сети и без pdfplumber.
+"""
+import hashlib
+import logging
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .extract import extract_tables
+from .fetch import FetchError
+from .models import FetchedDocument, ParsedProtocol
+from .matching import SchoolMatcher
+from .utils import import_pdf_for_schools
+from users.fio import FioIndex
+
+logger = logging.getLogger(__name__)
+
+# Меняется при изменении извлечения таблиц: старые разборы перестают использоваться
+PARSER_VERSION = 1
+
+
+def conditional_headers(document):
+    """
+    Заголовки условного запроса по сохранённым валидаторам.
+    """
+    headers = {}
+    if document.etag:
+        headers['If-None-Match'] = document.etag
+    if document.last_modified:
+        headers['If-Modified-Since'] = document.last_modified
+    return headers
+
+
+def fetch_protocols(client, subjects_by_url, stage_slug, force=False):
+    """
+    Скачивает протоколы с условными запросами.
+
+    Генератор пар (FetchedDocument, содержимое файла, FetchError или None).
+    None означает, что сервер ответил 304 и файл не изменился. Для уже
+    импортированных файлов без force отправляются If-None-Match/If-Modified-Since.
+    """
+    urls = list(subjects_by_url)
+    documents = {document.url: document for document in FetchedDocument.objects.filter(url__in=urls)}
+    headers = {}
+    if not force:
+        headers = {
+            url: conditional_headers(document) for url, document in documents.items() if document.is_imported
+        }
+
+    for url, response in client.fetch_many(urls, headers=headers):
+        document = documents.get(url) or FetchedDocument(url=url)
+        document.subject = subjects_by_url[url]
+        document.stage_slug = stage_slug
+        if isinstance(response, FetchError):
+            yield document, response
+            continue
+
+        now = timezone.now()
+        document.checked_at = now
+        if response.status_code == 304:
+            document.save()
+            yield document, None
+            continue
+
+        content = response.content
+        sha256 = hashlib.sha256(content).hexdigest()
+        if sha256 != document.sha256:
+            document.fetched_at = now
+        document.sha256 = sha256
+        document.size = len(content)
+        document.etag = response.headers.get('ETag', '')
+        document.last_modified = response.headers.get('Last-Modified', '')
+        document.save()
+        yield document, content
+
+
+def load_tables(sha256, content=None):
+    """
+    Таблицы протокола из кэша разборов; при отсутствии разбирает content и
+    сохраняет результат. Возвращает None, если разбора нет и файла тоже.
+    """
+    parsed = ParsedProtocol.objects.filter(sha256=sha256, parser_version=PARSER_VERSION).first()
+    if parsed:
+        return parsed.tables
+    if content is None:
+        return None
+
+    tables = [[page_num, table] for page_num, table in extract_tables(content)]
+    try:
+        with transaction.atomic():
+            ParsedProtocol.objects.create(
+                sha256=sha256, parser_version=PARSER_VERSION, tables=tables, pages=len(tables)
+            )
+    except IntegrityError:
+        # Тот же файл параллельно разобрал другой обработчик
+        pass
+    return tables
+
+
+def import_protocol(document, tables, schools, fio_index=None):
+    """
+    Импортирует разобранный протокол за один проход для всех школ и отмечает
+    содержимое импортированным. schools — список школ или SchoolMatcher,
+    fio_index — общие для запуска словари ФИО (FioIndex).
+    Возвращает (число импортированных учеников, число ошибок).
+    """
+    report = import_pdf_for_schools(
+        document.subject, document.stage_slug, schools, document.url, tables=tables, fio_index=fio_index
+    )
+    document.imported_sha256 = document.sha256
+    FetchedDocument.objects.filter(pk=document.pk).update(imported_sha256=document.sha256)
+    return len(report['imported_users']), len(report['errors'])
+
+
+def replay_protocols(schools, documents=None):
+    """
+    Повторно импортирует сохранённые протоколы из кэша разборов без обращения к сети.
+    """
+    stats = {'files': 0, 'imported_users': 0, 'errors': 0, 'missing': 0}
+    matcher = SchoolMatcher.for_schools(schools)
+    fio_index = FioIndex()
+    if documents is None:
+        documents = FetchedDocument.objects.exclude(sha256='').filter(subject__isnull=False)
+    for document in documents.select_related('subject'):
+        tables = load_tables(document.sha256)
+        if tables is None:
+            logger.warning(f'Нет сохранённого разбора для {document.url}')
+            stats['missing'] += 1
+            continue
+        imported_users, errors = import_protocol(document, tables, matcher, fio_index)
+        stats['files'] += 1
+        stats['imported_users'] += imported_users
+        stats['errors'] += errors
+    return stats
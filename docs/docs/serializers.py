@@ -1,9 +1,13 @@
 # serializers.py
 
 from rest_framework import serializers
+from django.urls import reverse
+
 from classroom.models import Classroom
+from docs.models import ExportJob
 from files.models import PDFTemplate, AgreementSettings
 from main.models import Subject, Olympiad, Category, LevelOlympiad, Stage, Post
+from main.serializers import ReferenceField
 from register.models import RegisterAdmin, RegisterSend
 from result.models import Result
 from users.models import User
@@ -40,10 +44,11 @@ class PostSerializer(serializers.ModelSerializer):
 
 
 class OlympiadSerializer(serializers.ModelSerializer):
-    category = CategorySerializer(read_only=True)
-    level = LevelOlympiadSerializer(read_only=True)
-    stage = StageSerializer(read_only=True)
-    subject = SubjectSerializer(read_only=True)
+    # Справочники берутся из памяти процесса, а не запросом на каждую олимпиаду
+    category = ReferenceField('categories', source='category_id')
+    level = ReferenceField('levels', source='level_id')
+    stage = ReferenceField('stages', source='stage_id')
+    subject = ReferenceField('subjects', source='subject_id')
 
     class Meta:
         model = Olympiad
@@ -113,3 +118,20 @@ class ResultSerializer(serializers.ModelSerializer):
     class Meta:
         model = Result
         fields = '__all__'
+
+
+class ExportJobSerializer(serializers.ModelSerializer):
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ExportJob
+        fields = (
+            'id', 'kind', 'status', 'progress_done', 'progress_total', 'cached', 'error_message',
+            'created_at', 'finished_at', 'download_url',
+        )
+        read_only_fields = fields
+
+    def get_download_url(self, obj):
+        if obj.status != ExportJob.FINISHED:
+            return None
+        return reverse('docs:export_download', args=[obj.pk])
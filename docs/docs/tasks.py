@@ -0,0 +1,187 @@
+"""
+Ночной импорт протоколов cpkimr.ru в виде графа задач Celery.
+
+import_cpkimr_results_task создаёт запуск (ImportRun), находит протоколы
+всех предметов и на каждый файл заводит контрольную точку (ImportCheckpoint)
+и отдельную задачу. Задачи выполняются параллельно и записывают в свою
+точку хэш файла, число импортированных учеников и ошибки; после всех задач
+chord вызывает finish_cpkimr_import_task, который собирает итоги запуска.
+
+Единица работы идемпотентна: результаты пишутся upsert'ом, начисления идут
+через журнал RatingEvent, поэтому повтор задачи ничего не удваивает. Новый
+запуск пропускает неизменившиеся файлы (условный GET), а
+resume_cpkimr_import_task повторяет в запуске только незавершённые и
+упавшие единицы.
+"""
+import logging
+
+from celery import chord, shared_task
+
+from main.registry import references
+from school.models import School
+from users.fio import FioIndex
+from .fetch import CpkimrClient, FetchError
+from .matching import SchoolMatcher
+from .exports import run_export
+from .models import ExportJob, ImportCheckpoint, ImportRun
+from .protocols import fetch_protocols, import_protocol, load_tables, replay_protocols
+from .utils import STAGE_SLUGS
+
+logger = logging.getLogger(__name__)
+
+
+def approved_schools():
+    """
+    Школы, для которых выполняется импорт протоколов.
+    """
+    return list(School.objects.filter(status='approved', name_cpkimr__isnull=False).exclude(name_cpkimr=''))
+
+
+def dispatch_checkpoints(run, checkpoint_ids):
+    """
+    Запускает задачи по контрольным точкам и сбор итогов после них.
+    """
+    if not checkpoint_ids:
+        return finish_cpkimr_import_task.delay([], run.pk)
+    header = [import_cpkimr_protocol_task.s(checkpoint_id, run.force) for checkpoint_id in checkpoint_ids]
+    return chord(header)(finish_cpkimr_import_task.s(run.pk))
+
+
+@shared_task
+def import_cpkimr_results_task(stage_slugs=None, force=False):
+    """
+    Ночной импорт протоколов cpkimr.ru для всех одобренных школ.
+
+    Страница каждого этапа скачивается один раз; на каждый найденный протокол
+    создаётся контрольная точка и задача импорта. force=True импортирует все
+    файлы заново. Возвращает id запуска.
+    """
+    stage_slugs = stage_slugs or [STAGE_SLUGS['школьный']]
+    run = ImportRun.objects.create(stage_slugs=stage_slugs, force=force)
+    if not approved_schools():
+        run.finish()
+        return run.pk
+
+    checkpoints = {}
+    index_errors = []
+    with CpkimrClient() as client:
+        for stage_slug in stage_slugs:
+            try:
+                client.results_index(stage_slug)
+            except FetchError as e:
+                logger.error(f'Страница этапа {stage_slug} недоступна: {e}')
+                index_errors.append(str(e))
+                continue
+            for subject in references.subjects.all():
+                for url in client.pdf_links(subject.name, stage_slug):
+                    checkpoints.setdefault(url, ImportCheckpoint(
+                        run=run, url=url, subject_id=subject.pk, stage_slug=stage_slug
+                    ))
+
+    if index_errors:
+        run.stats = {'index_errors': index_errors}
+        run.save(update_fields=['stats'])
+    ImportCheckpoint.objects.bulk_create(checkpoints.values())
+    # bulk_create в MySQL не возвращает id, поэтому они читаются заново
+    checkpoint_ids = list(run.checkpoints.order_by('id').values_list('id', flat=True))
+    logger.info(f'Импорт №{run.pk}: {len(checkpoint_ids)} протоколов.')
+    dispatch_checkpoints(run, checkpoint_ids)
+    return run.pk
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=60)
+def import_cpkimr_protocol_task(self, checkpoint_id, force=False):
+    """
+    Импортирует один протокол и записывает итог в контрольную точку.
+
+    Завершённая точка повторно не выполняется. Сетевые ошибки повторяются
+    с задержкой; прочие ошибки и исчерпанные повторы отмечают точку
+    упавшей. Исключения наружу не выходят, чтобы chord собрал итоги.
+    """
+    checkpoint = ImportCheckpoint.objects.select_related('subject').get(pk=checkpoint_id)
+    if checkpoint.is_finished:
+        return checkpoint.summary()
+    checkpoint.mark(checkpoint.status, attempts=checkpoint.attempts + 1)
+
+    try:
+        schools = approved_schools()
+        with CpkimrClient(max_workers=1) as client:
+            [(document, content)] = fetch_protocols(
+                client, {checkpoint.url: checkpoint.subject}, checkpoint.stage_slug, force=force
+            )
+        if isinstance(content, FetchError):
+            raise content
+
+        if document.is_imported and not force:
+            checkpoint.mark(ImportCheckpoint.UNCHANGED, sha256=document.sha256, error_message='')
+            return checkpoint.summary()
+
+        tables = load_tables(document.sha256, content)
+        if tables is None:
+            raise FetchError(f'Нет содержимого и сохранённого разбора для {document.url}')
+        imported_users, errors = import_protocol(
+            document, tables, SchoolMatcher.for_schools(schools), FioIndex()
+        )
+        checkpoint.mark(
+            ImportCheckpoint.DONE, sha256=document.sha256, rows_imported=imported_users, errors=errors,
+            error_message='',
+        )
+    except FetchError as e:
+        if self.request.retries < self.max_retries:
+            checkpoint.mark(ImportCheckpoint.PENDING, error_message=str(e))
+            raise self.retry(exc=e)
+        checkpoint.mark(ImportCheckpoint.FAILED, error_message=str(e))
+    except Exception as e:
+        logger.exception(f'Ошибка импорта {checkpoint.url}')
+        checkpoint.mark(ImportCheckpoint.FAILED, error_message=str(e))
+    return checkpoint.summary()
+
+
+@shared_task
+def finish_cpkimr_import_task(results, run_id):
+    """
+    Собирает итоги запуска по контрольным точкам.
+    """
+    run = ImportRun.objects.get(pk=run_id)
+    run.finish()
+    logger.info(f'Импорт №{run.pk} завершён: {run.stats}')
+    return run.stats
+
+
+@shared_task
+def resume_cpkimr_import_task(run_id=None):
+    """
+    Возобновляет запуск (по умолчанию последний): повторяет только
+    незавершённые и упавшие единицы. Возвращает число запущенных единиц.
+    """
+    run = ImportRun.objects.get(pk=run_id) if run_id else ImportRun.objects.order_by('-id').first()
+    if run is None:
+        return 0
+    checkpoints = run.checkpoints.filter(status__in=[ImportCheckpoint.PENDING, ImportCheckpoint.FAILED])
+    checkpoint_ids = list(checkpoints.order_by('id').values_list('id', flat=True))
+    checkpoints.update(status=ImportCheckpoint.PENDING)
+    run.status = ImportRun.RUNNING
+    run.finished_at = None
+    run.save(update_fields=['status', 'finished_at'])
+    dispatch_checkpoints(run, checkpoint_ids)
+    return len(checkpoint_ids)
+
+
+@shared_task
+def replay_cpkimr_results_task():
+    """
+    Повторяет импорт всех сохранённых протоколов из кэша разборов без сети,
+    например после изменения правил определения статуса.
+    """
+    return replay_protocols(approved_schools())
+
+
+@shared_task
+def run_export_task(job_id):
+    """
+    Выполняет фоновую выгрузку (docs.exports). Возвращает статус задания.
+    """
+    job = ExportJob.objects.select_related('school').get(pk=job_id)
+    if job.is_finished:
+        return job.status
+    return run_export(job).status
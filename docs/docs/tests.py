@@ -0,0 +1,779 @@
+import io
+import os
+import shutil
+import threading
+import tempfile
+import time
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from unittest import mock
+
+from django.db import connection
+from django.db.models import QuerySet
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from openpyxl import load_workbook
+from reportlab.pdfbase import pdfmetrics
+
+from docs.agreements import AgreementRenderer, compile_template
+from docs.bundles import AgreementBundle, _render_classroom
+from docs.exports import _remove_stale, artifact_key, request_export
+from docs.extract import iter_page_tables, iter_rows
+from docs.fetch import CpkimrClient, FetchError
+from docs.models import FetchedDocument, ParsedProtocol
+from docs.matching import SchoolMatcher
+from docs.models import ExportJob, ImportCheckpoint, ImportRun
+from docs.pivot import SUBJECT_ORDER
+from docs.protocols import PARSER_VERSION, fetch_protocols, load_tables
+from docs.tasks import import_cpkimr_results_task, resume_cpkimr_import_task
+from docs.utils import import_pdf, import_pdf_for_schools
+from OlympiadAPI.celery import app as celery_app
+from classroom.models import Classroom
+from files.models import AgreementSettings, PDFTemplate
+from main.models import Category, LevelOlympiad, Olympiad, Stage, Subject
+from main.pools import BilliardExecutor
+from main.versions import school_data_version
+from register.models import RegisterAdmin
+from result.models import Result
+from school.models import School
+from users.models import User
+
+INDEX_HTML = '''
+<html><body>
+<p class="olimplic_page_p"><span>Химия</span> <a href="/upload/chem.pdf">Протокол</a></p>
+<p class="olimplic_page_p"><span>Физика </span> <a href="/upload/phys-7.pdf">7 класс</a></p>
+<p class="olimplic_page_p"><span>Физика</span> <a href="/upload/phys-8.pdf">8 класс</a></p>
+<p class="olimplic_page_p"><span>Без ссылки</span></p>
+</body></html>
+'''.encode('utf-8')
+
+
+class CpkimrStubHandler(BaseHTTPRequestHandler):
+    """Локальная копия сайта: страница этапа и протоколы."""
+    protocol_version = 'HTTP/1.1'
+    hits = []
+    conditional_hits = []
+    active = 0
+    max_active = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        cls = CpkimrStubHandler
+        with cls.lock:
+            cls.hits.append(self.path)
+            cls.active += 1
+            cls.max_active = max(cls.max_active, cls.active)
+        try:
+            if self.path == '/activity/olimpic/school/':
+                self.reply(200, INDEX_HTML)
+            elif self.path.startswith('/upload/etag-'):
+                etag = f'"{self.path}"'
+                if self.headers.get('If-None-Match') == etag:
+                    with cls.lock:
+                        cls.conditional_hits.append(self.path)
+                    self.reply(304, b'')
+                else:
+                    self.reply(200, f'%PDF {self.path}'.encode(), {'ETag': etag})
+            elif self.path.startswith('/upload/'):
+                time.sleep(0.05)
+                self.reply(200, f'%PDF {self.path}'.encode())
+            else:
+                self.reply(404, b'')
+        finally:
+            with cls.lock:
+                cls.active -= 1
+
+    def reply(self, code, body, headers=None):
+        self.send_response(code)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class CpkimrStubMixin:
+    """Запускает локальную копию сайта на время тестов класса."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), CpkimrStubHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_port}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        CpkimrStubHandler.hits = []
+        CpkimrStubHandler.conditional_hits = []
+        CpkimrStubHandler.max_active = 0
+        self.client = CpkimrClient(base_url=self.base_url, max_workers=3, timeout=5, retries=0)
+
+    def tearDown(self):
+        self.client.close()
+
+
+class CpkimrClientTest(CpkimrStubMixin, SimpleTestCase):
+    """Тесты загрузки страниц и протоколов через общий пул."""
+
+    def test_index_is_fetched_once_per_run(self):
+        self.assertEqual(self.client.pdf_links('химия', 'school'), [f'{self.base_url}/upload/chem.pdf'])
+        self.assertEqual(self.client.pdf_links('ФИЗИКА', 'school'), [
+            f'{self.base_url}/upload/phys-7.pdf', f'{self.base_url}/upload/phys-8.pdf'
+        ])
+        self.assertEqual(self.client.pdf_links('Биология', 'school'), [])
+        self.assertEqual(CpkimrStubHandler.hits, ['/activity/olimpic/school/'])
+
+    def test_fetch_many_is_parallel_and_bounded(self):
+        urls = [f'{self.base_url}/upload/{i}.pdf' for i in range(9)] + [f'{self.base_url}/missing']
+        results = dict(self.client.fetch_many(urls))
+
+        self.assertEqual(results[urls[0]].content, b'%PDF /upload/0.pdf')
+        self.assertIsInstance(results[urls[-1]], FetchError)
+        self.assertEqual(len(results), 10)
+        self.assertGreater(CpkimrStubHandler.max_active, 1)
+        self.assertLessEqual(CpkimrStubHandler.max_active, 3)
+
+
+class ProtocolCacheTest(CpkimrStubMixin, TestCase):
+    """Тесты условных запросов и кэша разборов протоколов."""
+
+    def setUp(self):
+        super().setUp()
+        self.subject = Subject.objects.create(name='Химия')
+        self.url = f'{self.base_url}/upload/etag-chem.pdf'
+
+    def fetch(self, force=False):
+        return list(fetch_protocols(self.client, {self.url: self.subject}, 'school', force=force))
+
+    def test_imported_document_is_requested_conditionally(self):
+        [(document, content)] = self.fetch()
+        self.assertEqual(content, b'%PDF /upload/etag-chem.pdf')
+        self.assertEqual(document.etag, '"/upload/etag-chem.pdf"')
+        self.assertEqual(len(document.sha256), 64)
+        self.assertFalse(document.is_imported)
+
+        # Пока файл не импортирован, он скачивается целиком
+        [(document, content)] = self.fetch()
+        self.assertIsNotNone(content)
+        self.assertEqual(CpkimrStubHandler.conditional_hits, [])
+
+        FetchedDocument.objects.filter(pk=document.pk).update(imported_sha256=document.sha256)
+        [(document, content)] = self.fetch()
+        self.assertIsNone(content)
+        self.assertTrue(document.is_imported)
+        self.assertEqual(CpkimrStubHandler.conditional_hits, ['/upload/etag-chem.pdf'])
+
+        [(document, content)] = self.fetch(force=True)
+        self.assertIsNotNone(content)
+        self.assertEqual(FetchedDocument.objects.count(), 1)
+
+    def test_tables_are_parsed_once_per_hash(self):
+        tables = [(1, [['№', 'Фамилия'], ['1', 'Иванов']])]
+        with mock.patch('docs.protocols.extract_tables', return_value=tables) as extract:
+            first = load_tables('a' * 64, b'%PDF')
+            second = load_tables('a' * 64, b'%PDF')
+
+        self.assertEqual(extract.call_count, 1)
+        self.assertEqual(first, second)
+        self.assertEqual(second, [[1, [['№', 'Фамилия'], ['1', 'Иванов']]]])
+        self.assertTrue(ParsedProtocol.objects.filter(sha256='a' * 64, parser_version=PARSER_VERSION).exists())
+        self.assertIsNone(load_tables('b' * 64))
+
+
+def build_protocol_pdf(pages):
+    """PDF с таблицей протокола на каждой странице: pages — список списков строк."""
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.platypus import PageBreak, SimpleDocTemplate, Table, TableStyle
+
+    header = ['N', 'Last', 'First', 'Middle', 'School', 'Class', 'Comp', 'Status', 'Result']
+    style = TableStyle([('GRID', (0, 0), (-1, -1), 0.5, (0, 0, 0))])
+    story = []
+    for rows in pages:
+        story.extend([Table([header] + rows, style=style), PageBreak()])
+    buffer = io.BytesIO()
+    SimpleDocTemplate(buffer, pagesize=landscape(A4)).build(story)
+    return buffer.getvalue()
+
+
+class ExtractTest(SimpleTestCase):
+    """Тесты постраничного разбора протоколов."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.pages = [
+            [[str(page * 10 + i), f'Last{page}', f'First{i}', 'Middle', 'School 1', '7', '7', 'ok', f'{i}.5']
+             for i in range(3)]
+            for page in range(5)
+        ]
+        cls.content = build_protocol_pdf(cls.pages)
+
+    def test_process_pool_keeps_page_order(self):
+        inline = list(iter_page_tables(self.content, max_workers=1))
+        parallel = list(iter_page_tables(self.content, max_workers=2, pages_per_task=1))
+
+        self.assertEqual([page_num for page_num, _ in parallel], [1, 2, 3, 4, 5])
+        self.assertEqual(parallel, inline)
+        self.assertEqual(parallel[2][1][1], self.pages[2][0])
+
+    def test_daemon_process_uses_billiard_pool(self):
+        # Процессы prefork-пула Celery демонические: разбор идёт в пуле billiard
+        inline = list(iter_page_tables(self.content, max_workers=1))
+        with mock.patch('main.pools.is_daemon', return_value=True), \
+                mock.patch('main.pools.BilliardExecutor', wraps=BilliardExecutor) as executor:
+            parallel = list(iter_page_tables(self.content, max_workers=2, pages_per_task=1))
+            tables = iter_page_tables(self.content, max_workers=2, pages_per_task=1)
+            next(tables)
+            tables.close()
+        self.assertEqual(executor.call_count, 2)
+        self.assertEqual(parallel, inline)
+
+    def test_rows_are_normalized(self):
+        rows = list(iter_rows([
+            (1, [['header'] * 9, ['1', ' Иванов\n', 'Иван', None, 'Школа  1', '7', '7', 'ok', '10']]),
+            (2, None),
+            (3, [['header'] * 9, ['1', 'Петров']]),
+        ]))
+
+        self.assertEqual(rows[0]['last_name'], 'Иванов')
+        self.assertEqual(rows[0]['patronymic'], '')
+        self.assertEqual(rows[0]['school_full_name'], 'Школа 1')
+        self.assertEqual((rows[0]['page_num'], rows[0]['row_num']), (1, 1))
+        self.assertEqual(rows[1], {'page_num': 2, 'error': 'Таблица на странице 2 не найдена.'})
+        self.assertIn('мало колонок', rows[2]['error'])
+
+
+class SchoolMatcherTest(TestCase):
+    """Тесты маршрутизации строк протокола по школам."""
+
+    def setUp(self):
+        self.first = School.objects.create(name='Школа 1', name_cpkimr='МБОУ СОШ №1')
+        self.twelfth = School.objects.create(name='Школа 12', name_cpkimr='МБОУ СОШ № 12')
+        self.lyceum = School.objects.create(name='Лицей «Ёлка»')
+        self.matcher = SchoolMatcher.for_schools([self.first, self.twelfth, self.lyceum])
+
+    def test_match_by_whole_words(self):
+        self.assertEqual(self.matcher.match('Муниципальное МБОУ "СОШ № 1" г. Тест').pk, self.first.pk)
+        self.assertEqual(self.matcher.match('мбоу сош 12').pk, self.twelfth.pk)
+        self.assertEqual(self.matcher.match('лицей елка').pk, self.lyceum.pk)
+        self.assertIsNone(self.matcher.match('МБОУ СОШ № 123'))
+        self.assertIsNone(self.matcher.match(''))
+
+    def test_ambiguous_name_is_not_routed(self):
+        other = School.objects.create(name='Другая', name_cpkimr='мбоу сош 1')
+        matcher = SchoolMatcher.for_schools([self.first, other])
+        self.assertIsNone(matcher.match('МБОУ СОШ №1'))
+
+
+class MultiSchoolImportTest(TestCase):
+    """Тесты импорта протокола для всех школ за один проход."""
+
+    def setUp(self):
+        self.subject = Subject.objects.create(name='Химия')
+        self.olympiad = Olympiad.objects.create(
+            name='Химия 7',
+            category=Category.objects.create(name='Предметная'),
+            level=LevelOlympiad.objects.create(name='Всероссийская'),
+            stage=Stage.objects.create(name='Школьный'),
+            subject=self.subject,
+            class_olympiad=7,
+        )
+        self.schools = [
+            School.objects.create(name=f'Школа {i}', name_cpkimr=f'СОШ № {i}', status='approved')
+            for i in (1, 2)
+        ]
+        for i, school in enumerate(self.schools, start=1):
+            User.objects.create_user(
+                username=f'child{i}', password='pass', is_child=True, school=school,
+                last_name='Иванов', first_name='Иван', surname='Иванович'
+            )
+        header = ['N', 'Фамилия', 'Имя', 'Отчество', 'Школа', 'Класс', 'Класс', 'Статус', 'Баллы']
+        self.tables = [
+            (1, [header, ['1', 'Иванов', 'Иван', 'Иванович', 'МБОУ "СОШ № 1"', '7', '7', '', '55']]),
+            (2, [header,
+                 ['2', 'Иванов', 'Иван', 'Иванович', 'МБОУ "СОШ № 2"', '7', '7', '', '120'],
+                 ['3', 'Петров', 'Пётр', 'Петрович', 'Гимназия № 5', '7', '7', '', '30']]),
+        ]
+
+    def test_rows_are_routed_to_their_schools(self):
+        with mock.patch('docs.extract.iter_page_tables') as parse:
+            report = import_pdf_for_schools(self.subject, 'school', self.schools, 'http://cpkimr/chem.pdf',
+                                            tables=self.tables)
+
+        parse.assert_not_called()
+        self.assertEqual(report['errors'], [])
+        self.assertEqual(report['skipped_rows'], 1)
+        self.assertEqual(report['rows_by_school'], {self.schools[0].pk: 1, self.schools[1].pk: 1})
+        statuses = dict(Result.objects.values_list('school_id', 'status_result'))
+        self.assertEqual(statuses, {self.schools[0].pk: Result.PRIZE, self.schools[1].pk: Result.WINNER})
+
+    def test_single_school_import_reports_other_schools(self):
+        report = import_pdf(self.subject, 'school', 'СОШ № 2', self.schools[1], 'http://cpkimr/chem.pdf',
+                            tables=self.tables)
+
+        self.assertEqual(len(report['imported_users']), 1)
+        self.assertEqual(len(report['errors']), 2)
+        self.assertEqual(Result.objects.get().school_id, self.schools[1].pk)
+
+    def test_queries_do_not_grow_with_rows(self):
+        header = self.tables[0][1][0]
+
+        def protocol(count):
+            rows = [[str(i), f'Ученик{i}', 'Имя', '', 'СОШ № 1', '7', '7', '', '60'] for i in range(count)]
+            return [(1, [header] + rows[:count // 2]), (2, [header] + rows[count // 2:])]
+
+        for i in range(20):
+            User.objects.create_user(
+                username=f'student{i}', password='pass', is_child=True, school=self.schools[0],
+                last_name=f'Ученик{i}', first_name='Имя'
+            )
+        small = import_pdf_for_schools(self.subject, 'school', self.schools, 'http://cpkimr/a.pdf', tables=protocol(4))
+        Result.objects.all().delete()
+        large = import_pdf_for_schools(self.subject, 'school', self.schools, 'http://cpkimr/b.pdf', tables=protocol(20))
+
+        self.assertEqual(len(small['imported_users']), 4)
+        self.assertEqual(len(large['imported_users']), 20)
+        # Первый запуск ещё и загружает справочники этапов и лиг
+        self.assertLessEqual(large['queries'], small['queries'])
+        self.assertGreaterEqual(large['seconds'], 0)
+
+
+class ImportRunTest(CpkimrStubMixin, TestCase):
+    """Тесты графа задач ночного импорта с контрольными точками."""
+
+    def setUp(self):
+        super().setUp()
+        # Задачи выполняются синхронно, результаты chord хранятся в памяти процесса
+        self.eager = celery_app.conf.task_always_eager
+        celery_app.conf.update(task_always_eager=True)
+        backend = mock.patch.dict('os.environ', {'CELERY_RESULT_BACKEND': 'cache+memory://'})
+        backend.start()
+        self.addCleanup(backend.stop)
+        settings = override_settings(CPKIMR_FETCH={'BASE_URL': self.base_url, 'RETRIES': 0, 'TIMEOUT': 5})
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        chemistry = Subject.objects.create(name='Химия')
+        Subject.objects.create(name='Физика')
+        Olympiad.objects.create(
+            name='Химия 7',
+            category=Category.objects.create(name='Предметная'),
+            level=LevelOlympiad.objects.create(name='Всероссийская'),
+            stage=Stage.objects.create(name='Школьный'),
+            subject=chemistry,
+            class_olympiad=7,
+        )
+        school = School.objects.create(name='Школа 1', name_cpkimr='СОШ № 1', status='approved')
+        self.child = User.objects.create_user(
+            username='child', password='pass', is_child=True, school=school,
+            last_name='Иванов', first_name='Иван', surname='Иванович'
+        )
+        self.broken = {b'%PDF /upload/phys-8.pdf'}
+
+    def tearDown(self):
+        celery_app.conf.update(task_always_eager=self.eager)
+        super().tearDown()
+
+    def extract(self, content):
+        if content in self.broken:
+            raise ValueError('Повреждённый файл')
+        header = ['N', 'Фамилия', 'Имя', 'Отчество', 'Школа', 'Класс', 'Класс', 'Статус', 'Баллы']
+        return [(1, [header, ['1', 'Иванов', 'Иван', 'Иванович', 'СОШ № 1', '7', '7', '', '55']])]
+
+    def test_failed_units_are_resumed_and_unchanged_skipped(self):
+        with mock.patch('docs.protocols.extract_tables', side_effect=self.extract):
+            run = ImportRun.objects.get(pk=import_cpkimr_results_task())
+
+        self.assertEqual(run.status, ImportRun.FAILED)
+        self.assertEqual((run.stats['units'], run.stats['done'], run.stats['failed']), (3, 2, 1))
+        failed = run.checkpoints.get(status=ImportCheckpoint.FAILED)
+        self.assertTrue(failed.url.endswith('/upload/phys-8.pdf'))
+        self.assertEqual(failed.error_message, 'Повреждённый файл')
+        self.assertEqual(run.checkpoints.get(url__endswith='chem.pdf').rows_imported, 1)
+        self.assertEqual(Result.objects.get().info_children_id, self.child.pk)
+
+        self.broken = set()
+        CpkimrStubHandler.hits = []
+        with mock.patch('docs.protocols.extract_tables', side_effect=self.extract):
+            self.assertEqual(resume_cpkimr_import_task(run.pk), 1)
+
+        run.refresh_from_db()
+        self.assertEqual(run.status, ImportRun.FINISHED)
+        self.assertEqual(CpkimrStubHandler.hits, ['/upload/phys-8.pdf'])
+        self.assertEqual(run.checkpoints.get(pk=failed.pk).attempts, 2)
+
+        with mock.patch('docs.protocols.extract_tables', side_effect=self.extract) as extract:
+            rerun = ImportRun.objects.get(pk=import_cpkimr_results_task())
+        extract.assert_not_called()
+        self.assertEqual((rerun.status, rerun.stats['unchanged']), (ImportRun.FINISHED, 3))
+
+
+def reportlab_font_path():
+    import reportlab
+    return os.path.join(os.path.dirname(reportlab.__file__), 'fonts', 'Vera.ttf')
+
+
+@override_settings(AGREEMENT_PDF={'FONT_NAME': 'AgreementTestFont', 'FONT_PATH': reportlab_font_path()})
+class AgreementRendererTest(TestCase):
+    """Тесты печати согласий с кэшами шаблонов, шрифта и склонений."""
+
+    def setUp(self):
+        self.template = PDFTemplate.objects.create(
+            name='Согласие',
+            content=(
+                '<p style="text-align: center;">Согласие</p>'
+                '<p><span dir="ltr">Я разрешаю {{ son_or_daughter }} {{ full_name }}</span>, '
+                'класс {{ classroom }}, участвовать: {{ subjects }}.</p>'
+                '<p style="text-align: right;">{{ date }}</p>'
+            ),
+        )
+        AgreementSettings.objects.create(selected_template=self.template)
+        school = School.objects.create(name='Школа 1')
+        classroom = Classroom.objects.create(number=7, letter='А', school=school)
+        self.students = [
+            User.objects.create_user(
+                username=f'child{i}', password='pass', is_child=True, school=school, classroom=classroom,
+                last_name=f'Ученик{i}', first_name='Имя', gender=User.MALE if i % 2 else User.FEMALE,
+            )
+            for i in range(30)
+        ]
+
+    def test_class_pdf_uses_cached_template_and_font(self):
+        with mock.patch('docs.agreements.pdfmetrics.registerFont', wraps=pdfmetrics.registerFont) as register:
+            first = AgreementRenderer.from_settings()
+            second = AgreementRenderer.from_settings()
+        self.assertLessEqual(register.call_count, 1)
+        self.assertIs(first.template, second.template)
+
+        paragraphs = first.template.render(first.context(self.students[1], ['Химия', 'Химия'], '01.09.2026'))
+        texts = [text for _, text in paragraphs if text]
+        self.assertEqual(texts[1], '<p align="left">Я разрешаю моего сына Ученик1 Имя, класс 7А, участвовать: Химия.')
+        self.assertEqual([alignment for alignment, text in paragraphs if text], [1, 0, 2])
+
+        pdf = AgreementRenderer.from_settings().render([(student, ['Химия', 'Физика']) for student in self.students])
+        self.assertTrue(pdf.startswith(b'%PDF'))
+
+    def test_template_change_invalidates_cache(self):
+        compiled = compile_template(self.template)
+        self.template.content = '<p>{{ full_name }}</p>'
+        self.template.save()
+        self.assertIsNot(compile_template(self.template), compiled)
+
+    def test_template_tags_across_paragraphs(self):
+        self.template.content = '{% if full_name %}<p>{{ full_name }}</p><p>ещё</p>{% endif %}'
+        compiled = compile_template(self.template)
+        self.assertIsNone(compiled.paragraphs)
+        texts = [text for _, text in compiled.render({'full_name': 'Иванов Иван'}) if text]
+        self.assertEqual(texts, ['<p align="left">Иванов Иван', '<p align="left">ещё'])
+
+    def test_font_size_fitting(self):
+        renderer = AgreementRenderer.from_settings()
+        height = 60
+
+        def linear(text):
+            # Прежний подбор: уменьшение шрифта на пункт, пока абзац не поместится
+            for size in range(12, 8, -1):
+                if renderer.fits(text, size, height, 400, 0):
+                    return size
+            return 8
+
+        texts = ['Согласие ' * count for count in (1, 20, 40, 60, 200, 50, 2)]
+        sizes = [renderer.fit_font_size(text, height, 400, 0, index=1) for text in texts]
+        self.assertEqual(sizes, [linear(text) for text in texts])
+        self.assertEqual(sizes[0], 12)
+        self.assertEqual(sizes[4], 8)
+
+        # Размер из кэша не переносится на текст, которому он не подходит
+        self.assertEqual(renderer.fit_font_size(texts[0], height, 400, 0, index=1), 12)
+        style = renderer.create_paragraph(texts[4], height, 400, 0).style
+        self.assertEqual(renderer.base_style.fontSize, 12)
+        self.assertIs(renderer.create_paragraph(texts[4], height, 400, 0).style, style)
+
+
+@override_settings(
+    AGREEMENT_PDF={'FONT_NAME': 'AgreementTestFont', 'FONT_PATH': reportlab_font_path()},
+    AUDIT_LOG={'ASYNC': False},
+)
+class AgreementBundleTest(TestCase):
+    """Тесты архива согласий школы: пул процессов, потоковый ZIP и кэш PDF классов."""
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+        template = PDFTemplate.objects.create(name='Согласие', content='<p>{{ full_name }}: {{ subjects }}</p>')
+        AgreementSettings.objects.create(selected_template=template)
+        self.school = School.objects.create(name='Школа 1')
+        self.admin = User.objects.create_user(username='admin', password='pass', is_admin=True, school=self.school)
+        olympiads = [
+            Olympiad.objects.create(
+                name=name, category=Category.objects.create(name=f'Категория {name}'),
+                level=LevelOlympiad.objects.create(name=f'Уровень {name}'),
+                stage=Stage.objects.create(name=f'Этап {name}'),
+                subject=Subject.objects.create(name=name), class_olympiad=7,
+            )
+            for name in ('Химия', 'Физика')
+        ]
+        self.students = []
+        for number, letter in ((7, 'А'), (7, 'Б'), (8, 'А')):
+            classroom = Classroom.objects.create(number=number, letter=letter, school=self.school)
+            for i in range(3):
+                student = User.objects.create_user(
+                    username=f'child{number}{letter}{i}', password='pass', is_child=True, school=self.school,
+                    classroom=classroom, last_name=f'Ученик{i}', first_name='Имя', gender=User.MALE,
+                )
+                self.students.append(student)
+                for olympiad in olympiads:
+                    RegisterAdmin.objects.create(
+                        school=self.school, teacher_admin=self.admin, child_admin=student, olympiad_admin=olympiad,
+                    )
+        Classroom.objects.create(number=9, letter='В', school=self.school)
+
+    def bundle(self, **kwargs):
+        kwargs.setdefault('cache_dir', self.cache_dir)
+        return AgreementBundle.for_school(self.school, **kwargs)
+
+    def test_classes_are_rendered_in_pool_and_streamed(self):
+        progress = []
+        bundle = self.bundle(max_workers=2, progress=progress.append)
+        chunks = list(bundle.stream())
+
+        # Каждый класс уходит клиенту отдельной частью, пустой класс пропускается
+        self.assertGreaterEqual(len(chunks), 4)
+        with zipfile.ZipFile(io.BytesIO(b''.join(chunks))) as archive:
+            names = archive.namelist()
+            self.assertTrue(all(archive.read(name).startswith(b'%PDF') for name in names))
+        self.assertEqual(sorted(names), ['Согласия_7А.pdf', 'Согласия_7Б.pdf', 'Согласия_8А.pdf'])
+        self.assertEqual(progress[0], {'total': 3, 'done': 0, 'cached': 0})
+        self.assertEqual(progress[-1], {'total': 3, 'done': 3, 'cached': 0})
+
+    def test_unchanged_classes_come_from_cache(self):
+        path = os.path.join(self.cache_dir, 'bundle.zip')
+        self.bundle(max_workers=1).write_to(path)
+
+        RegisterAdmin.objects.filter(child_admin=self.students[0], olympiad_admin__subject__name='Физика').delete()
+        progress = []
+        with mock.patch('docs.bundles._render_classroom', side_effect=_render_classroom) as render:
+            self.bundle(max_workers=1, progress=progress.append).write_to(path)
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual([student for student, _ in render.call_args[0][1]], self.students[:3])
+        self.assertEqual(progress[-1], {'total': 3, 'done': 3, 'cached': 2})
+        with zipfile.ZipFile(path) as archive:
+            self.assertEqual(len(archive.namelist()), 3)
+
+    def test_superseded_class_pdfs_are_evicted(self):
+        classroom = self.students[0].classroom
+        directory = os.path.join(self.cache_dir, str(classroom.pk))
+        for i, subject in enumerate(('Физика', 'Химия')):
+            self.bundle(max_workers=1).write_to(os.path.join(self.cache_dir, 'bundle.zip'))
+            if i == 0:
+                first = set(os.listdir(directory))
+            RegisterAdmin.objects.filter(child_admin=self.students[i], olympiad_admin__subject__name=subject).delete()
+        self.bundle(max_workers=1).write_to(os.path.join(self.cache_dir, 'bundle.zip'))
+        # Три версии PDF класса, на диске две последние
+        pdfs = set(os.listdir(directory))
+        self.assertEqual(len(pdfs), 2)
+        self.assertFalse(pdfs & first)
+
+    def test_view_streams_archive(self):
+        from rest_framework.test import APIClient
+
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        with override_settings(AGREEMENT_BUNDLE={'CACHE_DIR': self.cache_dir, 'MAX_WORKERS': 1}):
+            response = client.get('/docs/download/zip/')
+            self.assertTrue(response.streaming)
+            content = b''.join(response.streaming_content)
+            progress = client.get('/docs/download/zip/progress/').json()
+        with zipfile.ZipFile(io.BytesIO(content)) as archive:
+            self.assertEqual(len(archive.namelist()), 3)
+        self.assertEqual(progress, {'total': 3, 'done': 3, 'cached': 0})
+
+
+class SchoolApplicationsMixin:
+    """Школа с администратором, классом и олимпиадами для выгрузок заявок."""
+
+    def setUp(self):
+        from rest_framework.test import APIClient
+
+        self.school = School.objects.create(name='Школа 1')
+        self.admin = User.objects.create_user(username='admin', password='pass', is_admin=True, school=self.school)
+        self.classroom = Classroom.objects.create(number=7, letter='А', school=self.school)
+        self.olympiads = [
+            Olympiad.objects.create(
+                name=name, category=Category.objects.create(name=f'Категория {name}'),
+                level=LevelOlympiad.objects.create(name=f'Уровень {name}'),
+                stage=Stage.objects.create(name=f'Этап {name}'),
+                subject=Subject.objects.create(name=name), class_olympiad=7,
+            )
+            for name in ('физика (5, 6)', 'Астрономия')
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def add_students(self, count, start=0):
+        for i in range(start, start + count):
+            student = User.objects.create_user(
+                username=f'child{i}', password='pass', is_child=True, school=self.school, classroom=self.classroom,
+                last_name=f'Ученик{i:03}', first_name='Имя', gender=User.MALE,
+            )
+            for olympiad in self.olympiads:
+                RegisterAdmin.objects.create(
+                    school=self.school, teacher_admin=self.admin, child_admin=student, olympiad_admin=olympiad,
+                )
+
+
+
+@override_settings(AUDIT_LOG={'ASYNC': False})
+class ExcelExportTest(SchoolApplicationsMixin, TestCase):
+    """Тесты выгрузки заявок в Excel через сводную таблицу."""
+
+    def export(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertTrue(response['Content-Disposition'].startswith('attachment;'))
+        content = b''.join(response.streaming_content)
+        response.close()
+        rows = list(load_workbook(io.BytesIO(content)).active.iter_rows(values_only=True))
+        return rows, len(queries)
+
+    def test_school_export_pivots_subjects(self):
+        self.add_students(2)
+        rows, _ = self.export('/docs/export/excel/')
+        headers = rows[0]
+        # Предмет из справочника попадает в колонку SUBJECT_ORDER без учёта регистра
+        self.assertEqual(headers[10:10 + len(SUBJECT_ORDER)], SUBJECT_ORDER)
+        self.assertEqual(headers[-2:], ('Астрономия', 'Кол-во заявлений'))
+        self.assertEqual(len(rows), 3)
+        first = dict(zip(headers, rows[1]))
+        self.assertEqual((first['Фамилия'], first['Класс'], first['Гражданство']), ('Ученик000', '7А', 'РФ'))
+        self.assertEqual((first['Физика (5, 6)'], first['Астрономия'], first['Кол-во заявлений']), (1, 1, 2))
+        self.assertEqual(first['Право (9, 10, 11)'], 0)
+
+    def test_export_queries_do_not_grow_with_students(self):
+        url = f'/docs/export/excel/classroom/{self.classroom.pk}/'
+        self.add_students(2)
+        self.export(url)  # справочник предметов загружается при первой выгрузке
+        rows, few = self.export(url)
+        self.add_students(20, start=2)
+        rows, many = self.export(url)
+        self.assertEqual(few, many)
+        self.assertEqual(len(rows), 23)
+        self.assertEqual(rows[-1][-1], 2)
+
+
+@override_settings(AUDIT_LOG={'ASYNC': False})
+class ExportJobTest(SchoolApplicationsMixin, TestCase):
+    """Тесты фоновых выгрузок с готовыми файлами по версии данных школы."""
+
+    def setUp(self):
+        super().setUp()
+        self.eager = celery_app.conf.task_always_eager
+        celery_app.conf.update(task_always_eager=True)
+        self.addCleanup(celery_app.conf.update, task_always_eager=self.eager)
+        # Задача ставится через delay: брокер и результаты в памяти процесса
+        backend = mock.patch.dict(
+            'os.environ', {'CELERY_BROKER_URL': 'memory://', 'CELERY_RESULT_BACKEND': 'cache+memory://'}
+        )
+        backend.start()
+        self.addCleanup(backend.stop)
+        artifact_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, artifact_dir)
+        settings = override_settings(EXPORT_JOBS={'ARTIFACT_DIR': artifact_dir})
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.add_students(2)
+
+    def request_export(self, kind='applications'):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/docs/exports/', {'kind': kind})
+
+    def test_job_runs_in_background_and_reports_progress(self):
+        response = self.request_export()
+        self.assertEqual(response.status_code, 202)
+        progress = self.client.get(f"/docs/check_progress/{response.json()['id']}/").json()
+        self.assertEqual((progress['status'], progress['progress_done'], progress['cached']), ('finished', 1, False))
+
+        download = self.client.get(progress['download_url'])
+        rows = list(load_workbook(io.BytesIO(b''.join(download.streaming_content))).active.iter_rows(values_only=True))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(self.client.post('/docs/exports/', {'kind': 'unknown'}).status_code, 400)
+
+    def test_concurrent_request_reuses_active_job(self):
+        key = artifact_key(self.school, ExportJob.APPLICATIONS)
+        first = QuerySet.first
+        others = []
+
+        def first_after_other_request(queryset):
+            # Другой запрос ставит ту же выгрузку между проверкой и созданием задания
+            if not others:
+                others.append(ExportJob.objects.create(school=self.school, kind=ExportJob.APPLICATIONS, artifact_key=key))
+                return None
+            return first(queryset)
+
+        with mock.patch('docs.tasks.run_export_task.delay') as delay:
+            with mock.patch.object(QuerySet, 'first', first_after_other_request):
+                with self.captureOnCommitCallbacks(execute=True):
+                    job = request_export(self.school, ExportJob.APPLICATIONS, self.admin)
+        self.assertEqual(job.pk, others[0].pk)
+        delay.assert_not_called()
+        self.assertEqual(ExportJob.objects.count(), 1)
+
+    def test_unchanged_data_is_served_from_artifact(self):
+        first = ExportJob.objects.get(pk=self.request_export().json()['id'])
+
+        with mock.patch('docs.exports.save_workbook') as build:
+            response = self.request_export()
+        build.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['cached'])
+
+        # Новая заявка меняет версию данных школы: файл строится заново, старый ещё можно скачать
+        self.add_students(1, start=2)
+        response = self.request_export()
+        self.assertEqual(response.status_code, 202)
+        job = ExportJob.objects.get(pk=response.json()['id'])
+        self.assertEqual(job.status, ExportJob.FINISHED)
+        self.assertNotEqual(job.artifact_key, first.artifact_key)
+        self.assertTrue(os.path.exists(job.path))
+        self.assertTrue(os.path.exists(first.path))
+
+    def test_stale_artifacts_keep_recent_and_newer_files(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        now = time.time()
+        # Последний файл новее построенного: его записало параллельное задание
+        for name, age in (('a', 400), ('b', 300), ('c', 200), ('d', -100), ('built', 0)):
+            path = os.path.join(directory, f'{name}.xlsx')
+            open(path, 'wb').close()
+            os.utime(path, (now - age, now - age))
+        with override_settings(EXPORT_JOBS={'KEEP_ARTIFACTS': 3}):
+            _remove_stale(os.path.join(directory, 'built.xlsx'))
+        self.assertEqual(sorted(os.listdir(directory)), ['b.xlsx', 'built.xlsx', 'c.xlsx', 'd.xlsx'])
+
+    def test_only_student_export_fields_change_version(self):
+        version = school_data_version(self.school.pk)
+        student = User.objects.get(username='child0')
+        student.last_login = timezone.now()
+        student.save(update_fields=['last_login'])
+        student.set_password('new-password')
+        student.save()
+        self.admin.first_name = 'Администратор'
+        self.admin.save()
+        self.assertEqual(school_data_version(self.school.pk), version)
+
+        student.last_name = 'Новиков'
+        student.save()
+        self.assertNotEqual(school_data_version(self.school.pk), version)
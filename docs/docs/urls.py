@@ -1,18 +1,15 @@
-# from django.urls import path
-# from .views import *
-#
-# app_name = 'docs'
-#
-# urlpatterns = [
-#     path('check_progress/', CheckProgressView.as_view(), name='check_progress'),
-#     path('export/excel/', ExcelAllView.as_view(), name='zayvki_export_excel'),
-#     path('export/excel/classroom/<int:Classroom_id>/', ExcelClassroomView.as_view(), name='excel_classroom'),
-#     path('export/dashboard/', ExportExcelView.as_view(), name='export_excel_result'),
-#     path('import/users', ImportUsersView.as_view(), name='import_users'),
-#     path('import_olympiads/', ImportOlympiadsView.as_view(), name='import_olympiads'),
-#     path('download/zip/', CreateZipArchiveView.as_view(), name='download_applications_zip'),
-#     path('download/teacher/zip/', CreateZipArchiveForTeacherView.as_view(), name='download_teacher_applications_zip'),
-#     path('dashboard/', DashboardView.as_view(), name='dashboard'),
-#     path('dashboard/export/', ExportExcelView.as_view(), name='export_excel'),
-#     path('import_cpkimr/', import_cpkimr, name='import_cpkimr'),
-# ]
+from django.urls import path
+from .views import *
+
+app_name = 'docs'
+
+urlpatterns = [
+    path('export/excel/', ExcelAllAPIView.as_view(), name='zayvki_export_excel'),
+    path('export/excel/classroom/<int:Classroom_id>/', ExcelClassroomAPIView.as_view(), name='excel_classroom'),
+    path('download/zip/', AgreementBundleAPIView.as_view(), name='download_applications_zip'),
+    path('download/zip/progress/', AgreementBundleProgressAPIView.as_view(), name='download_applications_progress'),
+    path('download/teacher/zip/', TeacherAgreementBundleAPIView.as_view(), name='download_teacher_applications_zip'),
+    path('exports/', ExportJobAPIView.as_view(), name='exports'),
+    path('check_progress/<int:job_id>/', CheckProgressAPIView.as_view(), name='check_progress'),
+    path('exports/<int:job_id>/download/', ExportJobDownloadAPIView.as_view(), name='export_download'),
+]
@@ -4,4 +4,12 @@ from django.apps import AppConfig
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'main'
-    verbose_name = 'Управление олимпиадами'
\ No newline at end of file
+    verbose_name = 'Управление олимпиадами'
+
+    def ready(self):
+        """
+        Импортируем сигналы при загрузке приложения.
+        """
+        from django.db.models.signals import post_migrate
+        from main.signals import create_search_index
+        post_migrate.connect(create_search_index, sender=self)
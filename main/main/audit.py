@@ -0,0 +1,116 @@
+"""
+Запись журнала аудита вне пути обработки запроса.
+
+Middleware кладёт записи в очередь в памяти процесса, а фоновый поток
+забирает их пачками и сохраняет одним bulk_create. Время действия
+фиксируется при постановке в очередь. При переполнении очереди записи
+отбрасываются с предупреждением в лог, чтобы не тормозить запросы; при
+завершении процесса очередь сбрасывается в базу.
+
+С настройкой AUDIT_LOG['ASYNC'] = False записи сохраняются сразу в
+потоке запроса (используется в тестах).
+"""
+import atexit
+import logging
+import queue
+import threading
+
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .conf import app_settings
+from .models import AuditLog
+
+logger = logging.getLogger(__name__)
+
+AUDIT_DEFAULTS = {
+    'ASYNC': True,  # Сохранять записи фоновым потоком
+    'BATCH_SIZE': 200,  # Записей в одном INSERT
+    'FLUSH_INTERVAL': 2.0,  # Секунд ожидания записи фоновым потоком
+    'MAX_QUEUE': 10000,  # Записей в очереди, сверх этого записи отбрасываются
+}
+
+
+def audit_settings():
+    return app_settings('AUDIT_LOG', AUDIT_DEFAULTS)
+
+
+class AuditWriter:
+    """
+    Очередь записей аудита с фоновым потоком записи.
+    """
+
+    def __init__(self):
+        self._queue = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _start(self, options):
+        with self._lock:
+            if self._queue is None:
+                self._queue = queue.Queue(maxsize=options['MAX_QUEUE'])
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, args=(options,), name='audit-log-writer', daemon=True
+                )
+                self._thread.start()
+
+    def record(self, user_id, school_id, action, object_name):
+        """
+        Ставит запись в очередь. Не обращается к базе в асинхронном режиме.
+        """
+        entry = AuditLog(
+            user_id=user_id, school_id=school_id, action=action[:256],
+            object_name=object_name[:256], timestamp=timezone.now()
+        )
+        options = audit_settings()
+        if not options['ASYNC']:
+            self._write([entry])
+            return
+        self._start(options)
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            logger.warning(f"Очередь журнала аудита переполнена, запись отброшена: {action} {object_name}")
+
+    def _drain(self, batch_size):
+        batch = []
+        while len(batch) < batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, entries):
+        try:
+            AuditLog.objects.bulk_create(entries)
+        except Exception:
+            logger.exception(f"Не удалось сохранить записи журнала аудита: {len(entries)}")
+
+    def _run(self, options):
+        while True:
+            try:
+                first = self._queue.get(timeout=options['FLUSH_INTERVAL'])
+            except queue.Empty:
+                continue
+            batch = [first] + self._drain(options['BATCH_SIZE'] - 1)
+            self._write(batch)
+            close_old_connections()
+
+    def flush(self):
+        """
+        Синхронно сохраняет всё, что накопилось в очереди.
+        """
+        if self._queue is None:
+            return
+        batch_size = audit_settings()['BATCH_SIZE']
+        while True:
+            batch = self._drain(batch_size)
+            if not batch:
+                break
+            self._write(batch)
+
+
+audit_writer = AuditWriter()
+atexit.register(audit_writer.flush)
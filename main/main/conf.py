@@ -0,0 +1,19 @@
+"""
+Настройки подсистем проекта.
+
+Подсистема (журнал аудита, загрузка протоколов, выгрузки и т. п.) читает
+свои параметры из словаря в settings, например settings.EXPORT_JOBS.
+Значения по умолчанию объявлены в модуле подсистемы, а в settings.py
+указываются только отличающиеся от них значения.
+"""
+from django.conf import settings
+
+
+def app_settings(name, defaults):
+    """
+    Словарь settings.<name> поверх значений по умолчанию defaults. Читается
+    при каждом вызове, поэтому учитывает override_settings в тестах.
+    """
+    options = dict(defaults)
+    options.update(getattr(settings, name, {}))
+    return options
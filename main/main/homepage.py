@@ -0,0 +1,172 @@
+"""
+Кэшированные данные главной страницы.
+
+Сводки хранятся в кэше отдельными ключами: по ученику (результаты, рейтинг,
+медали), по учителю (заявки), по классу (ученики) и по школе (счётчики для
+администратора). Главная страница читает все нужные ключи одним get_many и
+обращается к базе только за отсутствующими сводками.
+
+Сводки сбрасываются явно из путей записи: сигналов моделей, пакетного
+импорта результатов и начисления рейтинга. Счётчики администратора после
+создания и удаления записей меняются через cache.incr/decr, без COUNT(*).
+Сводки сбрасываются через main.versions.now_and_on_commit.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .versions import now_and_on_commit
+
+RECENT_RESULTS_LIMIT = 10
+
+# Поля учеников в сводке учителя: без пароля и служебных полей
+STUDENT_FIELDS = (
+    'id', 'username', 'last_name', 'first_name', 'surname', 'email', 'birth_date',
+    'gender', 'telegram_id', 'is_expelled', 'classroom_id', 'school_id',
+)
+
+OLYMPIADS_COUNT_KEY = 'homepage:olympiads:count'
+
+
+def summary_timeout():
+    return getattr(settings, 'HOMEPAGE_CACHE_TIMEOUT', 15 * 60)
+
+
+def user_key(user_id):
+    return f'homepage:user:{user_id}'
+
+
+def classroom_key(classroom_id):
+    return f'homepage:classroom:{classroom_id}'
+
+
+def school_users_key(school_id):
+    return f'homepage:school:{school_id}:users'
+
+
+def school_applications_key(school_id):
+    return f'homepage:school:{school_id}:applications'
+
+
+def _delete(keys):
+    keys = list(keys)
+    if keys:
+        now_and_on_commit(lambda: cache.delete_many(keys))
+
+
+def invalidate_users(user_ids):
+    """
+    Сбрасывает сводки учеников и учителей с указанными id.
+    """
+    _delete(user_key(user_id) for user_id in set(user_ids) if user_id)
+
+
+def invalidate_classrooms(classroom_ids):
+    """
+    Сбрасывает списки учеников указанных классов.
+    """
+    _delete(classroom_key(classroom_id) for classroom_id in set(classroom_ids) if classroom_id)
+
+
+def invalidate_school(school_id):
+    """
+    Сбрасывает счётчики школы, например после пакетной записи без сигналов.
+    """
+    _delete([school_users_key(school_id), school_applications_key(school_id)])
+
+
+def adjust_counter(key, delta):
+    """
+    Меняет закэшированный счётчик после коммита. Если счётчика нет в кэше,
+    он будет посчитан заново при следующем чтении.
+    """
+    def apply():
+        try:
+            cache.incr(key, delta)
+        except ValueError:
+            pass
+    transaction.on_commit(apply)
+
+
+def _child_summary(user):
+    from result.models import Result
+    from raiting_system.models import Rating, Medal, PersonalMedal
+
+    recent_results = Result.objects.filter(
+        info_children=user, school=user.school
+    ).order_by('-date_added')[:RECENT_RESULTS_LIMIT]
+    points = Rating.objects.filter(user=user).values_list('points', flat=True).first()
+    return {
+        'recent_results': list(recent_results.values()),
+        'user_rating': points or 0,
+        'medals': list(Medal.objects.filter(user=user).values()),
+        'personal_medals': list(PersonalMedal.objects.filter(user=user).values()),
+    }
+
+
+def _teacher_summary(user):
+    from register.models import RegisterSend
+
+    return {
+        'pending_applications': list(RegisterSend.objects.filter(teacher_send=user).values()),
+    }
+
+
+def _classroom_students(classroom_id):
+    from users.models import User
+
+    if not classroom_id:
+        return []
+    return list(User.objects.filter(classroom_id=classroom_id).values(*STUDENT_FIELDS))
+
+
+def _count_users(school_id):
+    from users.models import User
+    return User.objects.filter(school_id=school_id).count()
+
+
+def _count_applications(school_id):
+    from register.models import RegisterAdmin
+    return RegisterAdmin.objects.filter(school_id=school_id).count()
+
+
+def _count_olympiads():
+    from .models import Olympiad
+    return Olympiad.objects.count()
+
+
+def get_homepage_data(user):
+    """
+    Данные главной страницы для роли пользователя.
+    Все сводки читаются из кэша одним запросом; отсутствующие строятся и сохраняются.
+    """
+    builders = {}
+    if user.is_child:
+        builders[user_key(user.id)] = lambda: _child_summary(user)
+    elif user.is_teacher:
+        builders[user_key(user.id)] = lambda: _teacher_summary(user)
+        builders[classroom_key(user.classroom_guide_id)] = lambda: _classroom_students(user.classroom_guide_id)
+    elif user.is_admin:
+        builders[school_users_key(user.school_id)] = lambda: _count_users(user.school_id)
+        builders[OLYMPIADS_COUNT_KEY] = _count_olympiads
+        builders[school_applications_key(user.school_id)] = lambda: _count_applications(user.school_id)
+
+    values = cache.get_many(list(builders))
+    missing = {key: builder() for key, builder in builders.items() if key not in values}
+    if missing:
+        cache.set_many(missing, summary_timeout())
+        values.update(missing)
+
+    data = {}
+    if user.is_child:
+        data.update(values[user_key(user.id)])
+    elif user.is_teacher:
+        data['classroom_students'] = values[classroom_key(user.classroom_guide_id)]
+        data.update(values[user_key(user.id)])
+    elif user.is_admin:
+        data.update({
+            'total_users': values[school_users_key(user.school_id)],
+            'total_olympiads': values[OLYMPIADS_COUNT_KEY],
+            'total_applications': values[school_applications_key(user.school_id)],
+        })
+    return data
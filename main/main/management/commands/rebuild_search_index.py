@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from main.search import get_backend
+
+
+class Command(BaseCommand):
+    help = 'Создаёт при необходимости и полностью перестраивает поисковый индекс олимпиад.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Псевдоним базы данных.')
+
+    def handle(self, *args, **options):
+        backend = get_backend(options['database'])
+        if backend is None:
+            raise CommandError('Поисковый индекс не поддерживается для этой СУБД.')
+
+        if backend.ensure_table():
+            self.stdout.write('Таблица поискового индекса создана.')
+        else:
+            with transaction.atomic(using=options['database']):
+                backend.rebuild()
+        self.stdout.write(self.style.SUCCESS('Поисковый индекс перестроен.'))
@@ -0,0 +1,39 @@
+from .audit import audit_writer
+
+# Методы, изменяющие данные, и их названия в журнале
+AUDITED_METHODS = {
+    'POST': 'Создание',
+    'PUT': 'Изменение',
+    'PATCH': 'Изменение',
+    'DELETE': 'Удаление',
+}
+
+
+class AuditLogMiddleware:
+    """
+    Записывает успешные изменяющие запросы к API в журнал аудита.
+    Пользователь берётся после обработки запроса: DRF проставляет его
+    в исходный HttpRequest при аутентификации по токену.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method in AUDITED_METHODS and response.status_code < 400:
+            self.record(request)
+        return response
+
+    def record(self, request):
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated or not user.school_id:
+            return
+        match = request.resolver_match
+        view_name = match.view_name if match else request.path
+        audit_writer.record(
+            user_id=user.id,
+            school_id=user.school_id,
+            action=f'{AUDITED_METHODS[request.method]}: {view_name}',
+            object_name=request.path,
+        )
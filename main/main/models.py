@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 
 class AuditLog(models.Model):
@@ -8,7 +9,8 @@ class AuditLog(models.Model):
     user = models.ForeignKey('users.User', on_delete=models.CASCADE, verbose_name='Пользователь')
     action = models.CharField(max_length=256, verbose_name='Действие')
     object_name = models.CharField(max_length=256, verbose_name='Объект')
-    timestamp = models.DateTimeField(auto_now_add=True, verbose_name='Время действия')
+    # Время задаётся при перехвате запроса: запись попадает в базу позже, пачкой
+    timestamp = models.DateTimeField(default=timezone.now, verbose_name='Время действия')
     school = models.ForeignKey('school.School', on_delete=models.CASCADE, verbose_name='Школа',
                                related_name='school_audit')
 
@@ -18,6 +20,9 @@ class AuditLog(models.Model):
     class Meta:
         verbose_name_plural = "Журнал аудита"
         verbose_name = "Запись аудита"
+        indexes = [
+            models.Index(fields=['school', '-timestamp'], name='auditlog_school_timestamp'),
+        ]
 
 
 class Subject(models.Model):
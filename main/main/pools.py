@@ -0,0 +1,79 @@
+"""
+Пулы процессов для тяжёлых вычислений: разбора PDF-протоколов, печати
+согласий и хэширования паролей.
+
+В обычном процессе используется concurrent.futures.ProcessPoolExecutor.
+Процессы prefork-пула Celery, в которых выполняются ночной импорт и
+выгрузки, демонические, а multiprocessing не разрешает демоническим
+процессам запускать дочерние. Там используется пул billiard — форка
+multiprocessing, на котором построен Celery и у которого такого запрета
+нет. Интерфейс у обоих пулов один: submit, map, отмена Future и with.
+"""
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+
+
+def is_daemon():
+    """
+    Выполняется ли код в демоническом процессе (например, в процессе prefork-пула Celery).
+    """
+    return multiprocessing.current_process().daemon
+
+
+class BilliardExecutor:
+    """
+    Пул billiard с интерфейсом concurrent.futures.Executor. Отменённая
+    Future не получает результата, но уже поставленная задача в пуле
+    billiard не снимается и при выходе из with выполняется до конца:
+    terminate() при задачах в работе может зависнуть.
+    """
+
+    def __init__(self, max_workers):
+        from billiard.pool import Pool
+
+        self._pool = Pool(processes=max_workers)
+        self._futures = []
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+
+        def resolve(method):
+            def callback(value):
+                # Отменённая Future результата не получает
+                if future.set_running_or_notify_cancel():
+                    getattr(future, method)(value)
+            return callback
+
+        self._pool.apply_async(
+            fn, args, kwargs, callback=resolve('set_result'), error_callback=resolve('set_exception')
+        )
+        self._futures.append(future)
+        return future
+
+    def map(self, fn, iterable, chunksize=1):
+        return iter(self._pool.map(fn, list(iterable), chunksize))
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        if cancel_futures:
+            for future in self._futures:
+                future.cancel()
+        self._pool.close()
+        if wait:
+            self._pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown(wait=True)
+        return False
+
+
+def process_pool(max_workers):
+    """
+    Пул из max_workers процессов для использования в with: ProcessPoolExecutor,
+    а в демоническом процессе — BilliardExecutor.
+    """
+    if is_daemon():
+        return BilliardExecutor(max_workers)
+    return ProcessPoolExecutor(max_workers=max_workers)
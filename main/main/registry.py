@@ -0,0 +1,143 @@
+"""
+Справочники в памяти процесса.
+
+Предметы, этапы, категории, уровни олимпиад и должности меняются редко, а
+читаются при каждом импорте, выгрузке и сериализации олимпиад. Каждый
+справочник загружается одним запросом и хранится в виде словарей
+id -> объект и нормализованное название -> объект. Актуальность сверяется
+с ключом версии в общем кэше (main.versions.VersionedState), как у таблицы
+лиг: изменение записи в любом процессе после коммита меняет версию, и
+остальные процессы перечитывают справочник.
+
+Объекты из справочника общие для всех потоков процесса, их нельзя изменять.
+"""
+from .versions import VersionedState
+
+
+def normalize_name(name):
+    """
+    Ключ поиска по названию: без лишних пробелов и без учёта регистра.
+    """
+    return ' '.join(str(name or '').split()).lower()
+
+
+class ReferenceRegistry:
+    """
+    Версионированный справочник одной модели.
+    """
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self.version_key = f'main:registry:{model_name.lower()}:version'
+        # Данные: ({id: объект}, {название: объект}, {id: данные})
+        self._state = VersionedState(self.version_key, self._read)
+
+    @property
+    def model(self):
+        from django.apps import apps
+        return apps.get_model('main', self.model_name)
+
+    def _read(self):
+        objects = list(self.model.objects.order_by('id'))
+        fields = [field.attname for field in self.model._meta.concrete_fields]
+        by_name = {}
+        for obj in objects:
+            # При совпадении названий побеждает запись с меньшим id
+            by_name.setdefault(normalize_name(obj.name), obj)
+        return (
+            {obj.id: obj for obj in objects},
+            by_name,
+            {obj.id: {field: getattr(obj, field) for field in fields} for obj in objects},
+        )
+
+    def _load(self):
+        version, data = self._state.get()
+        return (version, *data)
+
+    def version(self):
+        """
+        Версия загруженного справочника; меняется после каждого сброса.
+        """
+        return self._load()[0]
+
+    def all(self):
+        """
+        Все записи справочника в порядке id.
+        """
+        return list(self._load()[1].values())
+
+    def by_id(self, pk):
+        """
+        Запись по id или None.
+        """
+        return self._load()[1].get(pk)
+
+    def by_name(self, name):
+        """
+        Запись по названию без учёта регистра и лишних пробелов или None.
+        """
+        return self._load()[2].get(normalize_name(name))
+
+    def first_by_names(self, names):
+        """
+        Первая найденная запись из списка вариантов названия или None.
+        """
+        by_name = self._load()[2]
+        for name in names:
+            obj = by_name.get(normalize_name(name))
+            if obj is not None:
+                return obj
+        return None
+
+    def data(self, pk):
+        """
+        Поля записи в виде словаря (как у ModelSerializer с fields='__all__') или None.
+        """
+        return self._load()[3].get(pk)
+
+    def invalidate(self):
+        """
+        Сбрасывает справочник в этом процессе сейчас, а во всех — после коммита.
+        """
+        self._state.invalidate()
+
+    def clear(self):
+        """
+        Отбрасывает справочник, загруженный этим процессом.
+        """
+        self._state.clear()
+
+
+class References:
+    """
+    Справочники приложения main.
+    """
+
+    def __init__(self):
+        self.subjects = ReferenceRegistry('Subject')
+        self.stages = ReferenceRegistry('Stage')
+        self.categories = ReferenceRegistry('Category')
+        self.levels = ReferenceRegistry('LevelOlympiad')
+        self.posts = ReferenceRegistry('Post')
+
+    def all(self):
+        return (self.subjects, self.stages, self.categories, self.levels, self.posts)
+
+    def clear(self):
+        """
+        Отбрасывает все справочники, загруженные этим процессом.
+        """
+        for registry in self.all():
+            registry.clear()
+
+    def for_model(self, model):
+        """
+        Справочник для класса модели или None.
+        """
+        for registry in self.all():
+            if registry.model_name == model.__name__:
+                return registry
+        return None
+
+
+references = References()
@@ -0,0 +1,204 @@
+"""
+Полнотекстовый индекс олимпиад.
+
+Поиск по названию, категории, этапу, уровню, предмету и месту проведения
+выполняется по отдельной таблице индекса, а не сканированием олимпиад с
+LOWER() по четырём присоединённым таблицам:
+
+* SQLite — виртуальная таблица FTS5 с токенизатором trigram: поиск по
+  подстроке без учёта регистра (в том числе кириллицы) и ранжирование bm25;
+* MySQL — InnoDB-таблица с FULLTEXT-индексом на парсере ngram и
+  ранжированием по релевантности MATCH ... AGAINST.
+
+Для остальных СУБД get_backend() возвращает None, и представление
+использует прежний поиск через icontains. Таблица создаётся после migrate,
+а записи обновляются сигналами при сохранении олимпиад и справочников.
+"""
+from django.db import connections
+from django.db.models import FloatField
+from django.db.models.expressions import RawSQL
+
+from .models import Olympiad
+
+TABLE_NAME = 'main_olympiad_search'
+
+# Поля олимпиады, попадающие в индекс, и их вес при ранжировании
+SEARCH_FIELDS = (
+    ('name', 'name', 10.0),
+    ('category', 'category__name', 2.0),
+    ('stage', 'stage__name', 2.0),
+    ('level', 'level__name', 2.0),
+    ('subject', 'subject__name', 3.0),
+    ('location', 'location', 1.0),
+)
+COLUMNS = [column for column, _, _ in SEARCH_FIELDS]
+
+BATCH_SIZE = 500
+
+
+def normalize_query(query):
+    """
+    Приводит поисковую строку к виду, в котором хранится индекс.
+    """
+    return ' '.join((query or '').split()).lower()
+
+
+def escape_like(value):
+    """
+    Экранирует спецсимволы LIKE.
+    """
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+class SearchBackend:
+    """
+    Общая часть бэкендов: чтение документов олимпиад и пакетная запись индекса.
+    """
+    # Строки короче этого числа символов не разбиваются на n-граммы и ищутся через LIKE
+    min_match_length = 3
+    like_escape = ''
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def documents(self, ids=None):
+        """
+        Документы индекса одним запросом: (id, значения столбцов в нижнем регистре).
+        """
+        queryset = Olympiad.objects.using(self.connection.alias).order_by()
+        if ids is not None:
+            queryset = queryset.filter(id__in=ids)
+        rows = queryset.values_list('id', *[field for _, field, _ in SEARCH_FIELDS])
+        for olympiad_id, *values in rows.iterator(chunk_size=BATCH_SIZE):
+            yield olympiad_id, [normalize_query(value) for value in values]
+
+    def table_exists(self):
+        with self.connection.cursor() as cursor:
+            return TABLE_NAME in self.connection.introspection.table_names(cursor)
+
+    def ensure_table(self):
+        """
+        Создаёт таблицу индекса и заполняет её. Возвращает True, если таблица создана.
+        """
+        if self.table_exists():
+            return False
+        with self.connection.cursor() as cursor:
+            cursor.execute(self.create_sql)
+        self.rebuild()
+        return True
+
+    def _write(self, cursor, documents):
+        batch = []
+        for olympiad_id, values in documents:
+            batch.append([olympiad_id, *values])
+            if len(batch) >= BATCH_SIZE:
+                cursor.executemany(self.insert_sql, batch)
+                batch = []
+        if batch:
+            cursor.executemany(self.insert_sql, batch)
+
+    def update(self, ids):
+        """
+        Переиндексирует олимпиады с указанными id; удалённые исчезают из индекса.
+        """
+        ids = list(ids)
+        if not ids:
+            return
+        with self.connection.cursor() as cursor:
+            self._delete(cursor, ids)
+            self._write(cursor, self.documents(ids))
+
+    def remove(self, ids):
+        ids = list(ids)
+        if ids:
+            with self.connection.cursor() as cursor:
+                self._delete(cursor, ids)
+
+    def rebuild(self):
+        """
+        Полностью перестраивает индекс по таблице олимпиад.
+        """
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLE_NAME}')
+            self._write(cursor, self.documents())
+
+    def _delete(self, cursor, ids):
+        placeholders = ', '.join(['%s'] * len(ids))
+        cursor.execute(f'DELETE FROM {TABLE_NAME} WHERE {self.id_column} IN ({placeholders})', ids)
+
+    def filter(self, queryset, query):
+        """
+        Олимпиады из queryset, содержащие подстроку query хотя бы в одном из
+        полей, от наиболее релевантных к менее релевантным. Таблица индекса
+        присоединяется к запросу олимпиад, и ранг вычисляется в нём же: id
+        совпадений не передаются обратно в запрос параметрами.
+        """
+        query = normalize_query(query)
+        if not query:
+            return queryset.none()
+        if len(query) < self.min_match_length:
+            condition = '(' + ' OR '.join(f'{TABLE_NAME}.{column} LIKE %s{self.like_escape}' for column in COLUMNS) + ')'
+            params = [f'%{escape_like(query)}%'] * len(COLUMNS)
+            rank, rank_params = '0', []
+        else:
+            condition, params, rank, rank_params = self.match_sql(query)
+        join = f'{TABLE_NAME}.{self.id_column} = {queryset.model._meta.db_table}.id'
+        return queryset.extra(tables=[TABLE_NAME], where=[join, condition], params=params).annotate(
+            search_rank=RawSQL(rank, rank_params, output_field=FloatField()),
+        ).order_by('search_rank', 'id')
+
+
+class SQLiteSearchBackend(SearchBackend):
+    id_column = 'rowid'
+    like_escape = " ESCAPE '\\'"
+    create_sql = (
+        f"CREATE VIRTUAL TABLE {TABLE_NAME} USING fts5({', '.join(COLUMNS)}, tokenize='trigram')"
+    )
+    insert_sql = (
+        f"INSERT INTO {TABLE_NAME} (rowid, {', '.join(COLUMNS)}) "
+        f"VALUES ({', '.join(['%s'] * (len(COLUMNS) + 1))})"
+    )
+
+    def match_sql(self, query):
+        """
+        Условие совпадения с параметрами и ранг (меньше — релевантнее) с параметрами.
+        """
+        weights = ', '.join(str(weight) for _, _, weight in SEARCH_FIELDS)
+        phrase = '"' + query.replace('"', '""') + '"'
+        return f'{TABLE_NAME} MATCH %s', [phrase], f'bm25({TABLE_NAME}, {weights})', []
+
+
+class MySQLSearchBackend(SearchBackend):
+    # ngram_token_size по умолчанию равен 2
+    min_match_length = 2
+    id_column = 'olympiad_id'
+    create_sql = (
+        f"CREATE TABLE {TABLE_NAME} (olympiad_id BIGINT NOT NULL PRIMARY KEY, "
+        + ', '.join(f'{column} VARCHAR(256) NOT NULL' for column in COLUMNS)
+        + f", FULLTEXT KEY {TABLE_NAME}_ft ({', '.join(COLUMNS)}) WITH PARSER ngram"
+        + ") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"
+    )
+    insert_sql = (
+        f"INSERT INTO {TABLE_NAME} (olympiad_id, {', '.join(COLUMNS)}) "
+        f"VALUES ({', '.join(['%s'] * (len(COLUMNS) + 1))})"
+    )
+
+    def match_sql(self, query):
+        match = f"MATCH ({', '.join(f'{TABLE_NAME}.{column}' for column in COLUMNS)}) AGAINST (%s IN BOOLEAN MODE)"
+        phrase = '"' + query.replace('"', ' ') + '"'
+        return match, [phrase], f'-{match}', [phrase]
+
+
+BACKENDS = {
+    'sqlite': SQLiteSearchBackend,
+    'mysql': MySQLSearchBackend,
+}
+
+
+def get_backend(using='default'):
+    """
+    Бэкенд индекса для подключения или None, если СУБД не поддерживается.
+    """
+    connection = connections[using]
+    backend_class = BACKENDS.get(connection.vendor)
+    return backend_class(connection) if backend_class else None
@@ -1,17 +1,44 @@
 from rest_framework import serializers
 from .models import AuditLog, Olympiad
+from .registry import references
 from users.serializers import UserSerializer
 
 
+class ReferenceField(serializers.Field):
+    """
+    Вложенное представление записи справочника по id внешнего ключа.
+    Данные берутся из справочника в памяти, без запроса на каждую олимпиаду.
+    Пример: category = ReferenceField('categories', source='category_id').
+    """
+
+    def __init__(self, registry_name, **kwargs):
+        kwargs['read_only'] = True
+        self.registry_name = registry_name
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        return getattr(references, self.registry_name).data(value)
+
+
+class AuditUserSerializer(serializers.ModelSerializer):
+    """
+    Краткие сведения о пользователе для журнала аудита.
+    """
+
+    class Meta:
+        model = UserSerializer.Meta.model
+        fields = ['id', 'username', 'last_name', 'first_name', 'surname']
+
+
 class AuditLogSerializer(serializers.ModelSerializer):
     """
     Сериализатор для журнала аудита.
     """
-    user = UserSerializer()
+    user = AuditUserSerializer()
 
     class Meta:
         model = AuditLog
-        fields = '__all__'
+        fields = ['id', 'user', 'action', 'object_name', 'timestamp', 'school']
 
 
 class OlympiadSerializer(serializers.ModelSerializer):
@@ -0,0 +1,239 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from .models import Category, LevelOlympiad, Olympiad, Post, Stage, Subject
+from .registry import references
+from .search import get_backend
+from . import homepage, versions
+from classroom.models import Classroom
+from users.models import User
+from register.models import RegisterAdmin, RegisterSend
+from result.models import Result
+from raiting_system.models import Medal, PersonalMedal, Rating
+
+# Поля пользователя, которые читают сводки главной страницы (место: класс и
+# школа) и выгрузки школы (docs.exports); изменение остальных полей, например
+# last_login или пароля, версию данных школы не меняет
+PLACEMENT_ATTNAMES = ('classroom_id', 'school_id')
+EXPORT_ATTNAMES = ('last_name', 'first_name', 'surname', 'gender', 'birth_date', 'is_child')
+TRACKED_ATTNAMES = PLACEMENT_ATTNAMES + EXPORT_ATTNAMES
+TRACKED_FIELDS = {*TRACKED_ATTNAMES, 'classroom', 'school'}
+
+
+@receiver(post_save, sender=Olympiad)
+def index_olympiad(sender, instance, using, **kwargs):
+    """
+    Сигнал для обновления записи олимпиады в поисковом индексе.
+    """
+    backend = get_backend(using)
+    if backend:
+        backend.update([instance.pk])
+
+
+@receiver(post_delete, sender=Olympiad)
+def unindex_olympiad(sender, instance, using, **kwargs):
+    """
+    Сигнал для удаления олимпиады из поискового индекса.
+    """
+    backend = get_backend(using)
+    if backend:
+        backend.remove([instance.pk])
+
+
+@receiver(post_save, sender=Subject)
+@receiver(post_delete, sender=Subject)
+@receiver(post_save, sender=Stage)
+@receiver(post_delete, sender=Stage)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=LevelOlympiad)
+@receiver(post_delete, sender=LevelOlympiad)
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_reference_registry(sender, **kwargs):
+    """
+    Сигнал для сброса справочника после изменения или удаления записи.
+    """
+    references.for_model(sender).invalidate()
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=LevelOlympiad)
+@receiver(post_save, sender=Stage)
+@receiver(post_save, sender=Subject)
+def reindex_related_olympiads(sender, instance, using, created, **kwargs):
+    """
+    Сигнал для переиндексации олимпиад после переименования справочника.
+    """
+    backend = get_backend(using)
+    if backend and not created:
+        field = {Category: 'category', LevelOlympiad: 'level', Stage: 'stage', Subject: 'subject'}[sender]
+        backend.update(
+            Olympiad.objects.using(using).filter(**{field: instance}).values_list('id', flat=True)
+        )
+
+
+def create_search_index(sender, using, **kwargs):
+    """
+    Создаёт и заполняет поисковый индекс после migrate, если его ещё нет.
+    """
+    backend = get_backend(using)
+    if backend:
+        backend.ensure_table()
+
+
+@receiver(post_save, sender=Result)
+@receiver(post_delete, sender=Result)
+def invalidate_child_homepage_by_result(sender, instance, **kwargs):
+    """
+    Сигнал для сброса сводки главной страницы ученика после изменения результата.
+    """
+    homepage.invalidate_users([instance.info_children_id])
+
+
+@receiver(post_save, sender=Medal)
+@receiver(post_delete, sender=Medal)
+@receiver(post_save, sender=PersonalMedal)
+@receiver(post_delete, sender=PersonalMedal)
+@receiver(post_save, sender=Rating)
+@receiver(post_delete, sender=Rating)
+def invalidate_child_homepage(sender, instance, **kwargs):
+    """
+    Сигнал для сброса сводки главной страницы ученика после изменения медалей или рейтинга.
+    """
+    homepage.invalidate_users([instance.user_id])
+
+
+@receiver(post_save, sender=RegisterSend)
+@receiver(post_delete, sender=RegisterSend)
+def invalidate_teacher_homepage(sender, instance, **kwargs):
+    """
+    Сигнал для сброса сводки главной страницы учителя после изменения заявки.
+    """
+    homepage.invalidate_users([instance.teacher_send_id])
+
+
+@receiver(pre_save, sender=User)
+def remember_user_placement(sender, instance, update_fields, **kwargs):
+    """
+    Запоминает прежние класс, школу и поля выгрузок пользователя перед
+    сохранением, чтобы сбросить сводки и счётчики и того класса, из которого
+    ученик ушёл, и менять версию данных школы, только если изменились данные
+    ученика в выгрузках. Прежние значения читаются одним запросом и только
+    если сохранение может их изменить: при update_fields без этих полей
+    (например, обновление last_login) запроса нет.
+    """
+    if instance._state.adding:
+        previous = None
+    elif (
+        update_fields is not None and not TRACKED_FIELDS & set(update_fields)
+        or set(TRACKED_ATTNAMES) <= instance.get_deferred_fields()
+    ):
+        previous = {}
+    else:
+        values = User.objects.filter(pk=instance.pk).values(*TRACKED_ATTNAMES).first()
+        previous = values or None
+    instance._previous_values = previous
+
+
+def _school_data_changed(instance, created, previous):
+    """
+    Изменились ли данные ученика, которые попадают в выгрузки школы.
+    """
+    if created:
+        return instance.is_child
+    if not previous or not (instance.is_child or previous['is_child']):
+        return False
+    # Отложенные поля не загружались и не сохранялись
+    return any(
+        previous[field] != instance.__dict__[field]
+        for field in TRACKED_ATTNAMES if field in instance.__dict__
+    )
+
+
+@receiver(post_save, sender=User)
+def update_homepage_for_user(sender, instance, created, **kwargs):
+    """
+    Сигнал для сброса списков учеников класса и обновления счётчика пользователей школы.
+    """
+    previous = instance.__dict__.pop('_previous_values', None)
+    deferred = set(PLACEMENT_ATTNAMES) & instance.get_deferred_fields()
+    if deferred:
+        instance.refresh_from_db(fields=list(deferred))
+    if previous:
+        old_classroom_id, old_school_id = previous['classroom_id'], previous['school_id']
+    elif created:
+        old_classroom_id, old_school_id = None, None
+    else:
+        old_classroom_id, old_school_id = instance.classroom_id, instance.school_id
+    homepage.invalidate_classrooms([old_classroom_id, instance.classroom_id])
+    if _school_data_changed(instance, created, previous):
+        # Выгрузки кэшируются по версии данных школы, в том числе школы, из которой ученик ушёл
+        versions.invalidate_schools([old_school_id, instance.school_id])
+    if created:
+        if instance.school_id:
+            homepage.adjust_counter(homepage.school_users_key(instance.school_id), 1)
+    elif old_school_id != instance.school_id:
+        if old_school_id:
+            homepage.adjust_counter(homepage.school_users_key(old_school_id), -1)
+        if instance.school_id:
+            homepage.adjust_counter(homepage.school_users_key(instance.school_id), 1)
+
+
+@receiver(post_delete, sender=User)
+def update_homepage_for_deleted_user(sender, instance, **kwargs):
+    """
+    Сигнал для обновления сводок после удаления пользователя.
+    """
+    homepage.invalidate_classrooms([instance.classroom_id])
+    homepage.invalidate_users([instance.id])
+    if instance.is_child:
+        versions.invalidate_schools([instance.school_id])
+    if instance.school_id:
+        homepage.adjust_counter(homepage.school_users_key(instance.school_id), -1)
+
+
+@receiver(post_save, sender=RegisterAdmin)
+def increment_school_applications(sender, instance, created, **kwargs):
+    """
+    Сигнал для увеличения счётчика утверждённых заявок школы.
+    """
+    if created:
+        homepage.adjust_counter(homepage.school_applications_key(instance.school_id), 1)
+
+
+@receiver(post_delete, sender=RegisterAdmin)
+def decrement_school_applications(sender, instance, **kwargs):
+    """
+    Сигнал для уменьшения счётчика утверждённых заявок школы.
+    """
+    homepage.adjust_counter(homepage.school_applications_key(instance.school_id), -1)
+
+
+@receiver(post_save, sender=Olympiad)
+def increment_olympiads_counter(sender, instance, created, **kwargs):
+    """
+    Сигнал для увеличения счётчика олимпиад.
+    """
+    if created:
+        homepage.adjust_counter(homepage.OLYMPIADS_COUNT_KEY, 1)
+
+
+@receiver(post_delete, sender=Olympiad)
+def decrement_olympiads_counter(sender, instance, **kwargs):
+    """
+    Сигнал для уменьшения счётчика олимпиад.
+    """
+    homepage.adjust_counter(homepage.OLYMPIADS_COUNT_KEY, -1)
+
+
+@receiver(post_save, sender=Result)
+@receiver(post_delete, sender=Result)
+@receiver(post_save, sender=RegisterAdmin)
+@receiver(post_delete, sender=RegisterAdmin)
+@receiver(post_save, sender=Classroom)
+@receiver(post_delete, sender=Classroom)
+def invalidate_school_data(sender, instance, **kwargs):
+    """
+    Сигнал для смены версии данных школы, по которой кэшируются выгрузки.
+    """
+    versions.invalidate_schools([instance.school_id])
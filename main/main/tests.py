@@ -0,0 +1,329 @@
+import threading
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from users.models import User
+from school.models import School
+from main.models import AuditLog, Olympiad, Subject, Stage, Category, LevelOlympiad
+from main.search import get_backend
+from main.homepage import get_homepage_data
+from main.registry import references
+from main.versions import VersionedState
+from docs.serializers import OlympiadSerializer
+from result.models import Result
+
+
+class OlympiadSearchTest(TestCase):
+    """Тесты поиска олимпиад по полнотекстовому индексу."""
+
+    def setUp(self):
+        self.category = Category.objects.create(name='Предметная')
+        self.level = LevelOlympiad.objects.create(name='Всероссийская')
+        self.stage = Stage.objects.create(name='Школьный')
+        self.chemistry = Subject.objects.create(name='Химия')
+        self.math = Subject.objects.create(name='Математика')
+        self.chem_olympiad = self.create_olympiad('Олимпиада по химии', self.chemistry, location='Кабинет 12')
+        self.math_olympiad = self.create_olympiad('Турнир Ломоносова', self.math, location='Актовый зал химфака')
+
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(
+            username='teacher', password='pass', is_teacher=True, school=School.objects.create(name='Школа')
+        ))
+
+    def create_olympiad(self, name, subject, **kwargs):
+        return Olympiad.objects.create(
+            name=name, category=self.category, level=self.level, stage=self.stage,
+            subject=subject, class_olympiad=9, **kwargs
+        )
+
+    def search(self, query):
+        response = self.client.get('/main/olympiads/', {'query': query})
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.data['results']]
+
+    def test_substring_search_is_case_insensitive_and_ranked(self):
+        # Совпадение в названии ранжируется выше совпадения в месте проведения
+        self.assertEqual(self.search('ХИМ'), [self.chem_olympiad.id, self.math_olympiad.id])
+        self.assertEqual(self.search('ломонос'), [self.math_olympiad.id])
+        self.assertEqual(self.search('12'), [self.chem_olympiad.id])
+        self.assertEqual(self.search('биология'), [])
+
+    def test_index_follows_changes(self):
+        self.math.name = 'Астрономия'
+        self.math.save()
+        self.assertEqual(self.search('астроном'), [self.math_olympiad.id])
+
+        self.chem_olympiad.name = 'Олимпиада Менделеева'
+        self.chem_olympiad.save()
+        self.assertEqual(self.search('менделеев'), [self.chem_olympiad.id])
+
+        self.math_olympiad.delete()
+        self.assertEqual(self.search('астроном'), [])
+
+    def test_rebuild_restores_rows_written_without_signals(self):
+        Olympiad.objects.bulk_create([Olympiad(
+            name='Кенгуру', category=self.category, level=self.level, stage=self.stage,
+            subject=self.math, class_olympiad=5
+        )])
+        self.assertEqual(self.search('кенгуру'), [])
+        get_backend().rebuild()
+        # Число найденных записей кэшируется пагинацией
+        cache.clear()
+        self.assertEqual(len(self.search('кенгуру')), 1)
+
+    def test_broad_query_does_not_pass_ids_back(self):
+        Olympiad.objects.bulk_create([
+            Olympiad(name=f'Олимпиада {i}', category=self.category, level=self.level, stage=self.stage,
+                     subject=self.math, class_olympiad=5)
+            for i in range(1000)
+        ])
+        get_backend().rebuild()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/main/olympiads/', {'query': 'ол', 'page_size': 5})
+        self.assertEqual(response.data['count'], 1002)
+        self.assertEqual(response.data['results'][0]['id'], self.chem_olympiad.id)
+        # Индекс присоединяется к запросу олимпиад, а не передаёт в него список id
+        self.assertTrue(all(len(query['sql']) < 2000 for query in queries.captured_queries))
+
+
+class OlympiadPaginationTest(TestCase):
+    """Тесты курсорной и постраничной пагинации списков."""
+
+    def setUp(self):
+        category = Category.objects.create(name='Предметная')
+        level = LevelOlympiad.objects.create(name='Всероссийская')
+        stage = Stage.objects.create(name='Школьный')
+        subject = Subject.objects.create(name='Химия')
+        Olympiad.objects.bulk_create([
+            Olympiad(name=f'Олимпиада {i}', category=category, level=level, stage=stage,
+                     subject=subject, class_olympiad=9)
+            for i in range(5)
+        ])
+        self.ids = list(Olympiad.objects.order_by('-id').values_list('id', flat=True))
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='teacher', password='pass'))
+        cache.clear()
+
+    def test_cursor_pages_follow_id(self):
+        response = self.client.get('/main/olympiads/', {'page_size': 2})
+        self.assertNotIn('count', response.data)
+        self.assertEqual([item['id'] for item in response.data['results']], self.ids[:2])
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual([item['id'] for item in response.data['results']], self.ids[2:4])
+
+    def test_page_number_mode_caches_count(self):
+        response = self.client.get('/main/olympiads/', {'page': 1, 'page_size': 2})
+        self.assertEqual(response.data['count'], 5)
+        self.assertEqual([item['id'] for item in response.data['results']], self.ids[:2])
+
+        Olympiad.objects.filter(id=self.ids[0]).delete()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/main/olympiads/', {'page': 2, 'page_size': 2})
+        self.assertEqual(response.data['count'], 5)
+        self.assertFalse(any('COUNT(' in query['sql'] for query in queries.captured_queries))
+
+    def test_page_number_mode_with_empty_search(self):
+        response = self.client.get('/main/olympiads/', {'query': 'биология', 'page': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['count'], response.data['results']), (0, []))
+
+
+class HomepageSummaryTest(TestCase):
+    """Тесты кэшированной главной страницы."""
+
+    def setUp(self):
+        cache.clear()
+        self.school = School.objects.create(name='Школа')
+        self.other_school = School.objects.create(name='Другая школа')
+        self.admin = User.objects.create_user(username='admin', password='pass', is_admin=True, school=self.school)
+        self.child = User.objects.create_user(username='child', password='pass', is_child=True, school=self.school)
+        User.objects.create_user(username='stranger', password='pass', school=self.other_school)
+        self.olympiad = Olympiad.objects.create(
+            name='Химия 8',
+            category=Category.objects.create(name='Предметная'),
+            level=LevelOlympiad.objects.create(name='Всероссийская'),
+            stage=Stage.objects.create(name='Школьный'),
+            subject=Subject.objects.create(name='Химия'),
+            class_olympiad=8,
+        )
+        self.client = APIClient()
+
+    def homepage(self, user):
+        self.client.force_authenticate(user)
+        response = self.client.get('/main/olympiads/homepage/')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_child_summary_is_cached_and_invalidated_by_results(self):
+        self.assertEqual(self.homepage(self.child)['recent_results'], [])
+        with self.assertNumQueries(0):
+            get_homepage_data(self.child)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Result.objects.create(
+                info_children=self.child, info_olympiad=self.olympiad, points=70,
+                school=self.school, status_result=Result.WINNER
+            )
+        data = self.homepage(self.child)
+        self.assertEqual(len(data['recent_results']), 1)
+        self.assertEqual(data['user_rating'], 100)
+        self.assertEqual(len(data['medals']), 1)
+
+    def test_admin_counters_are_school_scoped_and_incremental(self):
+        data = self.homepage(self.admin)
+        self.assertEqual((data['total_users'], data['total_olympiads'], data['total_applications']), (2, 1, 0))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.create_user(username='child2', password='pass', is_child=True, school=self.school)
+            User.objects.create_user(username='stranger2', password='pass', school=self.other_school)
+        with self.assertNumQueries(0):
+            data = get_homepage_data(self.admin)
+        self.assertEqual(data['total_users'], 3)
+
+    def test_user_moving_between_schools_updates_both_counters(self):
+        self.homepage(self.admin)
+        # Сохранение без класса и школы не читает прежнее место пользователя
+        with self.assertNumQueries(1):
+            self.child.save(update_fields=['last_login'])
+        self.assertEqual(User.objects.only('id').get(pk=self.child.pk).username, 'child')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.child.school = self.other_school
+            self.child.save()
+        self.assertEqual(get_homepage_data(self.admin)['total_users'], 1)
+
+
+@override_settings(AUDIT_LOG={'ASYNC': False})
+class AuditLogTest(TestCase):
+    """Тесты записи и чтения журнала аудита."""
+
+    def setUp(self):
+        self.school = School.objects.create(name='Школа')
+        self.admin = User.objects.create_user(username='admin', password='pass', is_admin=True, school=self.school)
+        other_admin = User.objects.create_user(
+            username='other', password='pass', is_admin=True, school=School.objects.create(name='Другая')
+        )
+        AuditLog.objects.create(user=other_admin, school=other_admin.school, action='Создание', object_name='/x/')
+        self.subject = Subject.objects.create(name='Химия')
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_mutating_requests_are_logged_and_reader_is_school_scoped(self):
+        response = self.client.post('/main/olympiads/', {
+            'name': 'Химия 8',
+            'category': Category.objects.create(name='Предметная').id,
+            'level': LevelOlympiad.objects.create(name='Всероссийская').id,
+            'stage': Stage.objects.create(name='Школьный').id,
+            'subject': self.subject.id,
+            'class_olympiad': 8,
+        })
+        self.assertEqual(response.status_code, 201)
+        self.client.get('/main/olympiads/')
+
+        log = AuditLog.objects.get(school=self.school)
+        self.assertEqual((log.user, log.action, log.object_name), (
+            self.admin, 'Создание: main:olympiad-list', '/main/olympiads/'
+        ))
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/main/olympiads/audit_logs/')
+        self.assertEqual([item['id'] for item in response.data['results']], [log.id])
+        self.assertEqual(response.data['results'][0]['user']['username'], 'admin')
+
+
+class ReferenceRegistryTest(TestCase):
+    """Тесты справочников в памяти процесса."""
+
+    def setUp(self):
+        cache.clear()
+        self.stage = Stage.objects.create(name='Школьный')
+        Stage.objects.create(name='Муниципальный')
+
+    def test_lookups_hit_database_once(self):
+        references.stages.invalidate()
+        with self.assertNumQueries(1):
+            self.assertEqual(references.stages.by_name('  школьный ').id, self.stage.id)
+            self.assertEqual(references.stages.by_id(self.stage.id).name, 'Школьный')
+            self.assertEqual(references.stages.first_by_names(['school', 'МУНИЦИПАЛЬНЫЙ']).name, 'Муниципальный')
+            self.assertEqual(references.stages.data(self.stage.id), {'id': self.stage.id, 'name': 'Школьный'})
+
+    def test_changes_invalidate_registry(self):
+        self.assertIsNotNone(references.stages.by_name('школьный'))
+        self.stage.name = 'Региональный'
+        self.stage.save()
+        self.assertIsNone(references.stages.by_name('школьный'))
+        self.assertEqual(references.stages.by_name('региональный').id, self.stage.id)
+
+        self.stage.delete()
+        self.assertIsNone(references.stages.by_id(self.stage.id))
+
+
+    def test_list_serialization_reads_versions_once(self):
+        category = Category.objects.create(name='Предметная')
+        level = LevelOlympiad.objects.create(name='Всероссийская')
+        subject = Subject.objects.create(name='Химия')
+        Olympiad.objects.bulk_create([
+            Olympiad(name=f'Олимпиада {i}', category=category, level=level, stage=self.stage, subject=subject,
+                     class_olympiad=9)
+            for i in range(50)
+        ])
+        olympiads = list(Olympiad.objects.order_by('id'))
+        # Версии уже в кэше, справочники — общие данные процесса, как вне транзакции записи
+        for registry in references.all():
+            registry.version()
+        references.clear()
+        with mock.patch('main.versions.cache', wraps=cache) as versions_cache:
+            data = OlympiadSerializer(olympiads, many=True).data
+        self.assertEqual(len(data), 50)
+        self.assertEqual(data[-1]['stage'], {'id': self.stage.id, 'name': 'Школьный'})
+        # Одно чтение версии на справочник, а не на каждое значение
+        self.assertEqual(versions_cache.get.call_count, 4)
+
+
+class VersionedStateTest(TestCase):
+    """Тесты версионированных данных в памяти процесса."""
+
+    def test_transaction_data_stays_in_its_thread(self):
+        # Незафиксированное изменение видно только потоку, который его сделал
+        view = threading.local()
+        state = VersionedState('main:test:versioned-state', lambda: getattr(view, 'value', 'old'))
+        self.addCleanup(cache.delete, state.version_key)
+        version = state.get()[0]
+        invalidated, read = threading.Event(), threading.Event()
+        seen = []
+
+        def writer():
+            try:
+                with transaction.atomic():
+                    view.value = 'new'
+                    state.invalidate()
+                    seen.append(state.get()[1])
+                    invalidated.set()
+                    read.wait(5)
+                    seen.append(state.get()[1])
+            finally:
+                connection.close()
+
+        def reader():
+            try:
+                seen.append(state.get())
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=writer)
+        thread.start()
+        self.assertTrue(invalidated.wait(5))
+        # Поток вне транзакции получает зафиксированные данные и не сбрасывает данные транзакции писателя
+        other = threading.Thread(target=reader)
+        other.start()
+        other.join(5)
+        read.set()
+        thread.join(5)
+        self.assertEqual(seen, ['new', (version, 'old'), 'new'])
+        # После коммита писателя версия сменилась, и данные перечитываются
+        self.assertNotEqual(state.get()[0], version)
@@ -0,0 +1,165 @@
+"""
+Версии закэшированных данных.
+
+Версия — случайная строка в общем кэше, которая меняется при изменении
+данных. Две области применения:
+
+* Версии данных школ (school_data_version): версия меняется при любом
+  изменении учеников, классов, заявок и результатов школы. Готовые выгрузки
+  (docs.exports) хранятся на диске под ключом с версией: пока данные школы
+  не менялись, повторная выгрузка отдаётся готовым файлом. Версия меняется
+  из сигналов моделей (main.signals) и из путей пакетной записи, которые
+  сигналы обходят.
+* Данные в памяти процесса (VersionedState): справочники (main.registry) и
+  таблица лиг (raiting_system.leagues) загружаются один раз и перечитываются,
+  когда версия в общем кэше меняется в любом процессе. Версия читается из
+  кэша не чаще раза в VERSION_CHECK_INTERVAL секунд, чтобы сериализация
+  списка не обращалась к кэшу за каждым значением.
+"""
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+def version_check_interval():
+    return getattr(settings, 'VERSION_CHECK_INTERVAL', 1.0)
+
+
+def now_and_on_commit(action):
+    """
+    Выполняет сброс кэша сейчас и повторно после коммита транзакции.
+
+    Первый сброс нужен, чтобы этот же процесс до коммита не читал устаревшие
+    данные. Но параллельный запрос может успеть снова закэшировать данные,
+    прочитанные до фиксации транзакции, поэтому сброс повторяется после
+    коммита. Вне транзакции on_commit выполняет действие сразу.
+    """
+    action()
+    transaction.on_commit(action)
+
+
+def school_version_key(school_id):
+    return f'main:school:{school_id}:data-version'
+
+
+def school_data_version(school_id):
+    """
+    Текущая версия данных школы; при отсутствии в кэше создаётся новая.
+    """
+    key = school_version_key(school_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def invalidate_schools(school_ids):
+    """
+    Меняет версии данных указанных школ (см. now_and_on_commit).
+    """
+    keys = [school_version_key(school_id) for school_id in set(school_ids) if school_id]
+    if keys:
+        now_and_on_commit(lambda: cache.set_many({key: uuid.uuid4().hex for key in keys}, None))
+
+
+class VersionedState:
+    """
+    Данные в памяти процесса, которые загружает loader() и которые считаются
+    актуальными, пока не изменилась версия под ключом version_key.
+
+    invalidate() меняет версию только после коммита: другие процессы не
+    должны перечитать и запомнить под новой версией данные, которых другие
+    соединения ещё не видят. До коммита поток, выполнивший сброс, пользуется
+    данными, перечитанными внутри своей транзакции. Они хранятся отдельно для
+    каждого потока (threading.local), как и соединения с базой, и общие данные
+    процесса не заменяют: остальные потоки видят зафиксированные данные.
+    Если транзакция откатилась, on_commit не срабатывает: данные потока
+    отбрасываются, как только закрыт блок atomic, в котором был сброс.
+    Если версии нет в кэше (кэш очищен или ключ вытеснен), загруженные данные
+    тоже отбрасываются.
+
+    Версия сверяется не чаще раза в version_check_interval() секунд: изменения
+    из других процессов видны с этой задержкой, сброс в своём процессе — сразу.
+    """
+
+    def __init__(self, version_key, loader):
+        self.version_key = version_key
+        self.loader = loader
+        # (версия, данные), общие для всех потоков
+        self._state = None
+        # Когда версия общих данных последний раз сверялась с кэшем (time.monotonic)
+        self._checked_at = None
+        # pending — блоки atomic потока, внутри которых был сброс, ещё не
+        # зафиксированный коммитом; state — данные, прочитанные в этих блоках
+        self._local = threading.local()
+
+    def _current_version(self):
+        version = cache.get(self.version_key)
+        if version is None:
+            self._state = None
+            cache.add(self.version_key, uuid.uuid4().hex, None)
+            version = cache.get(self.version_key)
+        return version
+
+    def _pending_blocks(self):
+        """
+        Блоки atomic со сбросом, если транзакция потока, в которой был сброс, ещё открыта.
+        """
+        pending = getattr(self._local, 'pending', None)
+        if pending is None:
+            return None
+        blocks = transaction.get_connection().atomic_blocks
+        if len(blocks) < len(pending) or any(block is not item for block, item in zip(blocks, pending)):
+            # Блок со сбросом закрыт без коммита транзакции: изменения могли
+            # откатиться. Внутри ещё открытой транзакции данные остаются
+            # несохранёнными до её коммита.
+            self._local.state = None
+            self._local.pending = pending = list(blocks) or None
+        return pending
+
+    def get(self):
+        """
+        Пара (версия, данные).
+        """
+        if self._pending_blocks() is not None:
+            if self._local.state is None:
+                self._local.state = (self._current_version(), self.loader())
+            return self._local.state
+        state = self._state
+        now = time.monotonic()
+        if state is not None and now - self._checked_at < version_check_interval():
+            return state
+        version = self._current_version()
+        state = self._state
+        if state is None or state[0] != version:
+            state = self._state = (version, self.loader())
+        self._checked_at = now
+        return state
+
+    def invalidate(self):
+        """
+        Сбрасывает данные в этом потоке сейчас, а во всех процессах — после коммита.
+        """
+        self._local.state = None
+        if transaction.get_connection().in_atomic_block:
+            self._local.pending = list(transaction.get_connection().atomic_blocks)
+        transaction.on_commit(self._bump)
+
+    def _bump(self):
+        cache.set(self.version_key, uuid.uuid4().hex, None)
+        self._local.pending = None
+        self._local.state = None
+        self._state = None
+
+    def clear(self):
+        """
+        Отбрасывает данные этого процесса и транзакции текущего потока (например, между тестами).
+        """
+        self._local.pending = None
+        self._local.state = None
+        self._state = None
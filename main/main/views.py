@@ -3,8 +3,9 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.db.models import Q
-from django.db.models.functions import Lower
 from .models import AuditLog, Olympiad
+from .search import get_backend
+from .homepage import get_homepage_data
 from .serializers import (
     AuditLogSerializer,
     OlympiadSerializer,
@@ -12,10 +13,6 @@ from .serializers import (
     UpdateOlympiadSerializer,
     HomePageSerializer
 )
-from users.models import User
-from register.models import RegisterAdmin, RegisterSend
-from result.models import Result
-from raiting_system.models import Rating, Medal, PersonalMedal
 
 
 class OlympiadViewSet(viewsets.ModelViewSet):
@@ -26,6 +23,13 @@ class OlympiadViewSet(viewsets.ModelViewSet):
     serializer_class = OlympiadSerializer
     permission_classes = [IsAuthenticated]
 
+    @property
+    def cursor_ordering(self):
+        """
+        Поле курсора пагинации: журнал аудита листается по индексу (school, -timestamp).
+        """
+        return '-timestamp' if self.action == 'audit_logs' else '-id'
+
     def get_serializer_class(self):
         if self.action in ['create']:
             return CreateOlympiadSerializer
@@ -47,24 +51,22 @@ class OlympiadViewSet(viewsets.ModelViewSet):
         class_olympiad = query_params.get('class_olympiad')
         location = query_params.get('location', '').strip().lower()
 
-        queryset = self.queryset.annotate(
-            name_lower=Lower('name'),
-            category_lower=Lower('category__name'),
-            stage_lower=Lower('stage__name'),
-            level_lower=Lower('level__name'),
-            subject_lower=Lower('subject__name'),
-            location_lower=Lower('location'),
-        )
+        queryset = self.queryset
 
         if query:
-            queryset = queryset.filter(
-                Q(name_lower__icontains=query) |
-                Q(category_lower__icontains=query) |
-                Q(stage_lower__icontains=query) |
-                Q(level_lower__icontains=query) |
-                Q(subject_lower__icontains=query) |
-                Q(location_lower__icontains=query)
-            )
+            backend = get_backend(queryset.db)
+            if backend:
+                # Ранжированные совпадения из полнотекстового индекса
+                queryset = backend.filter(queryset, query)
+            else:
+                queryset = queryset.filter(
+                    Q(name__icontains=query) |
+                    Q(category__name__icontains=query) |
+                    Q(stage__name__icontains=query) |
+                    Q(level__name__icontains=query) |
+                    Q(subject__name__icontains=query) |
+                    Q(location__icontains=query)
+                )
         if date:
             queryset = queryset.filter(date=date)
         if category:
@@ -78,7 +80,7 @@ class OlympiadViewSet(viewsets.ModelViewSet):
         if class_olympiad:
             queryset = queryset.filter(class_olympiad=class_olympiad)
         if location:
-            queryset = queryset.filter(location_lower__icontains=location)
+            queryset = queryset.filter(location__icontains=location)
 
         page = self.paginate_queryset(queryset)
         if page is not None:
@@ -95,8 +97,11 @@ class OlympiadViewSet(viewsets.ModelViewSet):
         """
         if not request.user.is_admin:
             return Response(status=status.HTTP_403_FORBIDDEN)
-        queryset = AuditLog.objects.all().order_by('-timestamp')
-        serializer = AuditLogSerializer(queryset, many=True)
+        queryset = AuditLog.objects.filter(school=request.user.school).select_related('user')
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(AuditLogSerializer(page, many=True).data)
+        serializer = AuditLogSerializer(queryset.order_by('-timestamp'), many=True)
         return Response(serializer.data)
 
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
@@ -108,33 +113,7 @@ class OlympiadViewSet(viewsets.ModelViewSet):
         data = {
             'user_info': HomePageSerializer(user).data,
         }
-
-        # Добавить информацию на основе роли пользователя
-        if user.is_child:
-            recent_results = Result.objects.filter(info_children=user, school=user.school).order_by('-date_added')[:10]
-            user_rating = Rating.objects.filter(user=user).first()
-            medals = Medal.objects.filter(user=user)
-            personal_medals = PersonalMedal.objects.filter(user=user)
-            data.update({
-                'recent_results': recent_results.values(),
-                'user_rating': user_rating.points if user_rating else 0,
-                'medals': medals.values(),
-                'personal_medals': personal_medals.values(),
-            })
-
-        elif user.is_teacher:
-            classroom_students = User.objects.filter(classroom=user.classroom_guide)
-            pending_applications = RegisterSend.objects.filter(teacher_send=user)
-            data.update({
-                'classroom_students': classroom_students.values(),
-                'pending_applications': pending_applications.values(),
-            })
-
-        elif user.is_admin:
-            data.update({
-                'total_users': User.objects.count(),
-                'total_olympiads': Olympiad.objects.count(),
-                'total_applications': RegisterAdmin.objects.count(),
-            })
+        # Сводки по роли пользователя читаются из кэша главной страницы
+        data.update(get_homepage_data(user))
 
         return Response(data)
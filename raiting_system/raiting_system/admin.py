@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Rating, Medal, League, PersonalMedal
+from .models import Rating, Medal, League, PersonalMedal, RatingEvent
 from result.models import Result
 
 
@@ -36,3 +36,13 @@ class PersonalMedalAdmin(admin.ModelAdmin):
     search_fields = ('name', 'user__username', 'user__last_name')  # Поля для поиска
     list_filter = ('date_awarded',)  # Фильтр по дате вручения
     ordering = ('-date_awarded',)  # Сортировка по дате вручения (убыванию)
+
+
+@admin.register(RatingEvent)
+class RatingEventAdmin(admin.ModelAdmin):
+    """Админ-панель для журнала начислений рейтинга (только просмотр)"""
+    list_display = ('id', 'user', 'result', 'rule', 'points', 'created_at')  # Отображаемые поля в списке
+    search_fields = ('user__username', 'user__last_name', 'rule')  # Поля для поиска
+    list_filter = ('rule',)  # Фильтры по правилу начисления
+    ordering = ('-created_at',)  # Сортировка по дате начисления (убыванию)
+    readonly_fields = ('user', 'result', 'rule', 'points', 'created_at')
@@ -5,3 +5,9 @@ class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'raiting_system'
     verbose_name = 'Управление рейтингом'
+
+    def ready(self):
+        """
+        Импортируем сигналы при загрузке приложения.
+        """
+        import raiting_system.signals
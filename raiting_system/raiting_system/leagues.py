@@ -0,0 +1,86 @@
+"""
+Таблица границ лиг в памяти процесса.
+
+Лиги меняются редко, а тип лиги пересчитывается при каждом начислении очков,
+поэтому границы загружаются один раз и ищутся через bisect. Актуальность
+таблицы сверяется с ключом версии в общем кэше (main.versions.VersionedState):
+изменение лиги в любом процессе после коммита меняет версию, и остальные
+процессы перечитывают таблицу.
+"""
+import bisect
+
+from django.db.models import Case, CharField, Value, When
+from django.db.models.lookups import GreaterThanOrEqual, LessThanOrEqual
+
+from main.versions import VersionedState
+
+VERSION_KEY = 'raiting_system:league_table_version'
+
+
+class LeagueTable:
+    """
+    Отсортированные по min_points границы лиг с поиском через bisect.
+    """
+
+    def __init__(self):
+        # Данные: (отсортированные min_points, лиги в том же порядке)
+        self._state = VersionedState(VERSION_KEY, self._read)
+
+    @staticmethod
+    def _read():
+        from .models import League
+
+        leagues = sorted(League.objects.all(), key=lambda league: (league.min_points, league.pk))
+        return [league.min_points for league in leagues], leagues
+
+    def _load(self):
+        return self._state.get()[1]
+
+    def get(self, points):
+        """
+        Возвращает лигу для количества очков или None.
+        """
+        bounds, leagues = self._load()
+        index = bisect.bisect_right(bounds, points) - 1
+        while index >= 0:
+            league = leagues[index]
+            if league.max_points is None or points <= league.max_points:
+                return league
+            index -= 1
+        return None
+
+    def get_type(self, points):
+        """
+        Возвращает тип лиги для количества очков или None.
+        """
+        league = self.get(points)
+        return league.type if league else None
+
+    def case_for(self, points):
+        """
+        Возвращает SQL-выражение Case, вычисляющее тип лиги для выражения очков.
+        Используется для пересчёта лиги в том же UPDATE, что и начисление очков.
+        """
+        _, leagues = self._load()
+        whens = []
+        for league in reversed(leagues):
+            condition = GreaterThanOrEqual(points, league.min_points)
+            if league.max_points is not None:
+                condition &= LessThanOrEqual(points, league.max_points)
+            whens.append(When(condition, then=Value(league.type)))
+        return Case(*whens, default=Value(None), output_field=CharField())
+
+    def invalidate(self):
+        """
+        Сбрасывает таблицу в этом процессе сейчас, а во всех — после коммита.
+        """
+        self._state.invalidate()
+
+    def clear(self):
+        """
+        Отбрасывает таблицу, загруженную этим процессом.
+        """
+        self._state.clear()
+
+
+league_table = LeagueTable()
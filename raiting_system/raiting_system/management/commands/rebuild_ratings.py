@@ -0,0 +1,74 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+
+from main import homepage
+from raiting_system.models import League, Rating, RatingEvent
+from raiting_system.services import award_results
+from result.models import Result
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает очки и лиги всех рейтингов по журналу начислений RatingEvent.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--backfill', action='store_true',
+            help='Сначала записать в журнал начисления за результаты, по которым их ещё нет (без выдачи медалей).'
+        )
+
+    def handle(self, *args, **options):
+        if options['backfill']:
+            self.stdout.write(f'Добавлено записей журнала: {self.backfill()}')
+
+        with transaction.atomic():
+            # Один агрегирующий запрос по всему журналу
+            totals = dict(
+                RatingEvent.objects.order_by().values_list('user_id').annotate(total=Sum('points'))
+            )
+
+            changed = []
+            for rating in Rating.objects.only('id', 'user_id', 'points', 'league').iterator(chunk_size=BATCH_SIZE):
+                points = totals.pop(rating.user_id, 0)
+                league = League.get_league_for_points(points)
+                if (rating.points, rating.league) != (points, league):
+                    rating.points, rating.league = points, league
+                    changed.append(rating)
+            Rating.objects.bulk_update(changed, ['points', 'league'], batch_size=BATCH_SIZE)
+            homepage.invalidate_users(rating.user_id for rating in changed)
+
+            homepage.invalidate_users(totals)
+            created = Rating.objects.bulk_create(
+                [
+                    Rating(user_id=user_id, points=points, league=League.get_league_for_points(points))
+                    for user_id, points in totals.items()
+                ],
+                batch_size=BATCH_SIZE
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Рейтинги пересчитаны: изменено {len(changed)}, создано {len(created)}.'
+        ))
+
+    def backfill(self):
+        """
+        Записывает в журнал начисления за результаты без записей журнала.
+        Медали не выдаются: за старые результаты они уже существуют.
+        """
+        results = (
+            Result.objects.filter(rating_events__isnull=True)
+            .values_list('id', 'info_children_id', 'info_olympiad_id', 'info_olympiad__stage__name', 'status_result')
+            .iterator(chunk_size=BATCH_SIZE)
+        )
+        created = 0
+        batch = []
+        for item in results:
+            batch.append(item)
+            if len(batch) >= BATCH_SIZE:
+                created += award_results(batch, with_medals=False)
+                batch = []
+        if batch:
+            created += award_results(batch, with_medals=False)
+        return created
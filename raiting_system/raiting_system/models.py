@@ -1,6 +1,9 @@
 from django.db import models
+from django.db.models import F
 from users.models import User
+from main import homepage
 from main.models import Olympiad
+from .leagues import league_table
 
 
 class League(models.Model):
@@ -33,10 +36,7 @@ class League(models.Model):
     @staticmethod
     def get_league_for_points(points):
         """Возвращает тип лиги в зависимости от количества очков"""
-        for league in League.objects.all():
-            if league.min_points <= points and (league.max_points is None or points <= league.max_points):
-                return league.type
-        return None
+        return league_table.get_type(points)
 
 
 class Medal(models.Model):
@@ -77,10 +77,24 @@ class Rating(models.Model):
         return f'{self.user.get_full_name()} - {self.points} очков - {self.get_league_display()}'
 
     def update_points(self, additional_points):
-        """Обновляет очки пользователя и пересчитывает его лигу"""
-        self.points += additional_points
-        self.league = League.get_league_for_points(self.points)
-        self.save()
+        """Атомарно прибавляет очки пользователю и пересчитывает его лигу"""
+        Rating.add_points([self.user_id], additional_points)
+        self.refresh_from_db(fields=['points', 'league'])
+
+    @staticmethod
+    def add_points(user_ids, additional_points):
+        """
+        Прибавляет очки рейтингам пользователей одним UPDATE через F().
+        Лига стоит в SET первой: MySQL вычисляет присваивания слева направо,
+        и лига должна считаться от прежних очков плюс прибавка, как в остальных СУБД.
+        """
+        new_points = F('points') + additional_points
+        updated = Rating.objects.filter(user_id__in=user_ids).update(
+            league=league_table.case_for(new_points),
+            points=new_points,
+        )
+        homepage.invalidate_users(user_ids)
+        return updated
 
 
 class PersonalMedal(models.Model):
@@ -91,3 +105,41 @@ class PersonalMedal(models.Model):
 
     def __str__(self):
         return f'{self.name} - {self.user.get_full_name()}'
+
+
+class RatingEvent(models.Model):
+    """
+    Журнал начислений рейтинга. Записи только добавляются, сумма очков
+    записей результата равна награде за его текущий статус. Правило включает
+    номер записи результата, поэтому уникальность (результат, правило) не даёт
+    провести одно и то же изменение дважды.
+    """
+    STAGE_AWARD = 'stage_award'
+
+    result = models.ForeignKey(
+        'result.Result', on_delete=models.CASCADE, related_name='rating_events', verbose_name='Результат'
+    )
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='rating_events', verbose_name='Пользователь')
+    rule = models.CharField('Правило начисления', max_length=64)
+    points = models.IntegerField('Очки')
+    created_at = models.DateTimeField('Дата начисления', auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.user} - {self.rule} - {self.points} очков'
+
+    @classmethod
+    def stage_award_rule(cls, status_result, sequence):
+        """Правило начисления за получение статуса на этапе олимпиады (sequence — номер записи результата)"""
+        return f'{cls.STAGE_AWARD}:{status_result}:{sequence}'
+
+    @staticmethod
+    def rule_status(rule):
+        """Статус из правила начисления (в том числе из записей без номера)"""
+        return rule.split(':')[1]
+
+    class Meta:
+        verbose_name = 'Начисление рейтинга'
+        verbose_name_plural = 'Журнал начислений рейтинга'
+        constraints = [
+            models.UniqueConstraint(fields=['result', 'rule'], name='unique_rating_event_per_rule'),
+        ]
@@ -0,0 +1,125 @@
+"""
+Начисление рейтинга через журнал RatingEvent.
+
+Каждое изменение награды за результат записывается в журнал прибавкой
+(разница между наградой за текущий статус и суммой уже начисленного) с
+уникальным ключом (результат, правило с номером записи), и только
+вставленные записи увеличивают Rating через F(). Повторное сохранение или
+повторный импорт ничего не добавляют, понижение статуса вычитает очки, а два
+процесса, начисляющие одно и то же изменение, получают один и тот же номер
+записи и не могут провести его дважды. Запись рейтинга блокируется лишь на
+время одного UPDATE.
+"""
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+
+from .models import Medal, Rating, RatingEvent
+from main import homepage
+
+BATCH_SIZE = 500
+
+
+def award_results(items, with_medals=True):
+    """
+    Начисляет очки и медали за результаты.
+
+    items — последовательность кортежей
+    (id результата, id ученика, id олимпиады, название этапа, статус).
+    За смену статуса начисляется разница между наградой за новый статус и уже
+    начисленными по результату очками, в том числе отрицательная при
+    понижении. Возвращает число новых записей журнала.
+    """
+    from result.models import Result
+
+    items = [item for item in items if item[3]]
+    if not items:
+        return 0
+
+    # Для каждого результата: число записей журнала, сумма очков, статусы с записями
+    awarded = defaultdict(lambda: [0, 0, set()])
+    for result_id, rule, points in RatingEvent.objects.filter(
+        result_id__in={item[0] for item in items}
+    ).values_list('result_id', 'rule', 'points'):
+        state = awarded[result_id]
+        state[0] += 1
+        state[1] += points
+        state[2].add(RatingEvent.rule_status(rule))
+
+    events = []
+    medal_types = {}
+    for result_id, user_id, olympiad_id, stage_name, status_result in items:
+        state = awarded[result_id]
+        sequence, total, statuses = state
+        points, medal_type = Result.get_award(stage_name, status_result)
+        # Медаль за статус выдаётся один раз, даже если статус возвращается после понижения
+        medal_type = medal_type if status_result not in statuses else None
+        if points == total and not medal_type:
+            continue
+        rule = RatingEvent.stage_award_rule(status_result, sequence)
+        events.append(RatingEvent(result_id=result_id, user_id=user_id, rule=rule, points=points - total))
+        state[0] += 1
+        state[1] = points
+        statuses.add(status_result)
+        if medal_type and with_medals:
+            medal_types[(result_id, rule)] = (medal_type, olympiad_id)
+
+    if not events:
+        return 0
+
+    with transaction.atomic():
+        events = _insert_events(events)
+        _apply_events(events)
+        medals = [
+            Medal(type=medal_types[(event.result_id, event.rule)][0],
+                  olympiad_id=medal_types[(event.result_id, event.rule)][1],
+                  user_id=event.user_id)
+            for event in events if (event.result_id, event.rule) in medal_types
+        ]
+        Medal.objects.bulk_create(medals, batch_size=BATCH_SIZE)
+        homepage.invalidate_users(event.user_id for event in events)
+    return len(events)
+
+
+def _insert_events(events):
+    """
+    Вставляет записи журнала и возвращает действительно вставленные.
+    Если параллельный процесс успел записать то же правило, пачка
+    откатывается до точки сохранения и записи вставляются по одной.
+    """
+    try:
+        with transaction.atomic():
+            RatingEvent.objects.bulk_create(events, batch_size=BATCH_SIZE)
+        return events
+    except IntegrityError:
+        inserted = []
+        for event in events:
+            try:
+                with transaction.atomic():
+                    event.pk = None
+                    event.save(force_insert=True)
+                inserted.append(event)
+            except IntegrityError:
+                continue
+        return inserted
+
+
+def _apply_events(events):
+    """
+    Прибавляет очки из записей журнала к рейтингам: одно UPDATE на каждое
+    различное значение прибавки, а не на каждого ученика.
+    """
+    deltas = defaultdict(int)
+    for event in events:
+        deltas[event.user_id] += event.points
+
+    Rating.objects.bulk_create(
+        [Rating(user_id=user_id) for user_id in deltas], batch_size=BATCH_SIZE, ignore_conflicts=True
+    )
+
+    by_delta = defaultdict(list)
+    for user_id, delta in deltas.items():
+        if delta:
+            by_delta[delta].append(user_id)
+    for delta, user_ids in by_delta.items():
+        Rating.add_points(user_ids, delta)
@@ -0,0 +1,13 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import League
+from .leagues import league_table
+
+
+@receiver(post_save, sender=League)
+@receiver(post_delete, sender=League)
+def invalidate_league_table(sender, **kwargs):
+    """
+    Сигнал для сброса таблицы границ лиг после изменения или удаления лиги.
+    """
+    league_table.invalidate()
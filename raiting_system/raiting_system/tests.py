@@ -0,0 +1,111 @@
+from io import StringIO
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase
+from users.models import User
+from school.models import School
+from main.models import Olympiad, Subject, Stage, Category, LevelOlympiad
+from result.models import Result
+from raiting_system.models import League, Medal, Rating, RatingEvent
+from raiting_system.leagues import VERSION_KEY, league_table
+
+
+class LeagueTableTest(TestCase):
+    """Тесты таблицы границ лиг."""
+
+    def setUp(self):
+        League.objects.create(type=League.SILVER, min_points=151, max_points=500)
+        League.objects.create(type=League.BRONZE, min_points=0, max_points=150)
+        League.objects.create(type=League.DIAMOND, min_points=3501)
+
+    def test_lookup_by_points(self):
+        self.assertEqual(League.get_league_for_points(0), League.BRONZE)
+        self.assertEqual(League.get_league_for_points(150), League.BRONZE)
+        self.assertEqual(League.get_league_for_points(151), League.SILVER)
+        self.assertIsNone(League.get_league_for_points(1000))
+        self.assertEqual(League.get_league_for_points(10000), League.DIAMOND)
+        self.assertIsNone(League.get_league_for_points(-1))
+
+    def test_table_is_cached_and_invalidated_on_save(self):
+        league_table.get(0)
+        with self.assertNumQueries(0):
+            self.assertEqual(League.get_league_for_points(200), League.SILVER)
+
+        League.objects.filter(type=League.SILVER).first().delete()
+        self.assertIsNone(League.get_league_for_points(200))
+
+    def test_rolled_back_change_is_not_kept(self):
+        league_table.get(0)
+        version = cache.get(VERSION_KEY)
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                League.objects.get(type=League.SILVER).delete()
+                self.assertIsNone(League.get_league_for_points(200))
+                raise RuntimeError
+        # Версия меняется только после коммита, а данные откатившейся транзакции отброшены
+        self.assertEqual(cache.get(VERSION_KEY), version)
+        self.assertEqual(League.get_league_for_points(200), League.SILVER)
+
+
+class RatingLedgerTest(TestCase):
+    """Тесты начисления рейтинга через журнал."""
+
+    def setUp(self):
+        self.school = School.objects.create(name='Test School')
+        self.child = User.objects.create_user(username='child', password='pass', is_child=True, school=self.school)
+        self.olympiad = Olympiad.objects.create(
+            name='Физика 9',
+            category=Category.objects.create(name='Предметная'),
+            level=LevelOlympiad.objects.create(name='Всероссийская'),
+            stage=Stage.objects.create(name='Городской'),
+            subject=Subject.objects.create(name='Физика'),
+            class_olympiad=9,
+        )
+        League.objects.create(type=League.BRONZE, min_points=0, max_points=150)
+        League.objects.create(type=League.SILVER, min_points=151, max_points=500)
+
+    def create_result(self, status_result):
+        return Result.objects.create(
+            info_children=self.child, info_olympiad=self.olympiad,
+            status_result=status_result, school=self.school
+        )
+
+    def test_resave_does_not_add_points_again(self):
+        result = self.create_result(Result.PRIZE)
+        result.save()
+        result.notified = True
+        result.save(update_fields=['notified'])
+        rating = Rating.objects.get(user=self.child)
+        self.assertEqual((rating.points, rating.league), (300, League.SILVER))
+        self.assertEqual(Medal.objects.filter(user=self.child).count(), 1)
+
+    def test_status_upgrade_adds_difference(self):
+        result = self.create_result(Result.PRIZE)
+        result.status_result = Result.WINNER
+        result.save()
+        self.assertEqual(Rating.objects.get(user=self.child).points, 450)
+        self.assertEqual(
+            list(RatingEvent.objects.order_by('id').values_list('points', flat=True)), [300, 150]
+        )
+
+    def test_status_downgrade_takes_points_back(self):
+        result = self.create_result(Result.PRIZE)
+        for status_result in (Result.WINNER, Result.PRIZE):
+            result.status_result = status_result
+            result.save()
+        self.assertEqual(Rating.objects.get(user=self.child).points, 300)
+        self.assertEqual(
+            list(RatingEvent.objects.order_by('id').values_list('points', flat=True)), [300, 150, -150]
+        )
+        # Повторное сохранение после понижения ничего не меняет, медаль за статус одна
+        result.save()
+        self.assertEqual(RatingEvent.objects.count(), 3)
+        self.assertEqual(Medal.objects.filter(user=self.child).count(), 2)
+
+    def test_rebuild_ratings_from_ledger(self):
+        self.create_result(Result.PRIZE)
+        Rating.objects.filter(user=self.child).update(points=9999, league=None)
+        call_command('rebuild_ratings', stdout=StringIO())
+        rating = Rating.objects.get(user=self.child)
+        self.assertEqual((rating.points, rating.league), (300, League.SILVER))
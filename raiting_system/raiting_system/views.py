@@ -4,6 +4,7 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework import status
 from .models import League, Medal, Rating, PersonalMedal
+from .leagues import league_table
 from .serializers import LeagueSerializer, MedalSerializer, RatingSerializer, PersonalMedalSerializer
 from users.models import User
 
@@ -22,13 +23,11 @@ class LeagueViewSet(ModelViewSet):
         Пользовательский метод для получения лиги по количеству очков.
         """
         try:
-            points = int(points)
-            league_type = League.get_league_for_points(points)
-            league = League.objects.get(type=league_type)
+            league = league_table.get(int(points))
+            if league is None:
+                return Response({'detail': 'Лига не найдена.'}, status=status.HTTP_404_NOT_FOUND)
             serializer = self.get_serializer(league)
             return Response(serializer.data, status=status.HTTP_200_OK)
-        except League.DoesNotExist:
-            return Response({'detail': 'Лига не найдена.'}, status=status.HTTP_404_NOT_FOUND)
         except ValueError:
             return Response({'detail': 'Неверный формат очков.'}, status=status.HTTP_400_BAD_REQUEST)
 
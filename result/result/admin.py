@@ -1,5 +1,6 @@
 from django.contrib import admin
-from result.models import Result
+from django.utils import timezone
+from result.models import Result, NotificationOutbox
 
 
 @admin.register(Result)
@@ -42,3 +43,23 @@ class ResultAdmin(admin.ModelAdmin):
     def mark_as_advanced(self, request, queryset):
         queryset.update(advanced=True)
         self.message_user(request, f'Отмечено {queryset.count()} результатов как "Прошедшие на следующий этап".')
+
+
+@admin.register(NotificationOutbox)
+class NotificationOutboxAdmin(admin.ModelAdmin):
+    """Настройки отображения очереди уведомлений в панели администратора."""
+
+    list_display = ('id', 'chat_id', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at')
+    list_filter = ['status']
+    search_fields = ['chat_id', 'message']
+    ordering = ['-created_at']
+    readonly_fields = ['created_at', 'sent_at', 'claim_token', 'last_error']
+
+    actions = ['retry_notifications']
+
+    @admin.action(description='Повторить отправку')
+    def retry_notifications(self, request, queryset):
+        updated = queryset.exclude(status=NotificationOutbox.SENT).update(
+            status=NotificationOutbox.PENDING, attempts=0, next_attempt_at=timezone.now(), claim_token=''
+        )
+        self.message_user(request, f'Поставлено на повторную отправку: {updated}.')
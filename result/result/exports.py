@@ -0,0 +1,121 @@
+"""
+Потоковая выгрузка результатов олимпиад.
+
+Строки читаются из базы через values_list().iterator() порциями и сразу
+записываются в CSV-поток или в xlsx-книгу в режиме write_only, поэтому
+расход памяти не зависит от числа результатов школы.
+"""
+import csv
+import tempfile
+
+from openpyxl import Workbook
+
+from .models import Result
+
+CHUNK_SIZE = 2000
+
+EXPORT_FORMATS = ('xlsx', 'csv')
+
+EXPORT_HEADERS = ['ФИО', 'Класс', 'Название олимпиады', 'Очки', 'Статус', 'Дата']
+
+EXPORT_FIELDS = (
+    'info_children__last_name', 'info_children__first_name', 'info_children__surname',
+    'info_children__classroom__number', 'info_children__classroom__letter',
+    'info_olympiad__name', 'points', 'status_result', 'date_added',
+)
+
+CONTENT_TYPES = {
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+NO_DATA = 'Нет данных'
+
+
+def iter_export_rows(queryset, chunk_size=CHUNK_SIZE):
+    """
+    Генератор строк выгрузки из набора результатов в порядке их добавления.
+    """
+    statuses = dict(Result.STATUSRES)
+    rows = queryset.order_by('id').values_list(*EXPORT_FIELDS)
+    for last_name, first_name, surname, number, letter, olympiad, points, status_result, date_added in (
+        rows.iterator(chunk_size=chunk_size)
+    ):
+        yield [
+            f"{last_name} {first_name} {surname or ''}".strip(),
+            f"{number} {letter}" if number is not None else NO_DATA,
+            olympiad,
+            points,
+            statuses.get(status_result, status_result),
+            date_added.strftime('%Y-%m-%d') if date_added else NO_DATA,
+        ]
+
+
+class Echo:
+    """
+    Псевдофайл для csv.writer: возвращает записанную строку вместо буферизации.
+    """
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows):
+    """
+    Генератор фрагментов CSV-файла. BOM нужен, чтобы Excel распознал UTF-8.
+    """
+    writer = csv.writer(Echo())
+    yield '﻿' + writer.writerow(EXPORT_HEADERS)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def write_xlsx(rows, file):
+    """
+    Записывает строки в xlsx-файл. Книга write_only сбрасывает строки на диск
+    по мере добавления и не хранит лист в памяти.
+    """
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Results')
+    sheet.append(EXPORT_HEADERS)
+    count = 0
+    for row in rows:
+        sheet.append(row)
+        count += 1
+    workbook.save(file)
+    return count
+
+
+def write_csv(rows, file):
+    """
+    Записывает строки в CSV-файл, открытый в текстовом режиме.
+    """
+    count = -1
+    for count, chunk in enumerate(iter_csv(rows)):
+        file.write(chunk)
+    return max(count, 0)
+
+
+def build_xlsx_tempfile(queryset):
+    """
+    Формирует xlsx во временном файле и возвращает его открытым на начале.
+    Файл удаляется при закрытии, то есть после отправки ответа.
+    """
+    file = tempfile.TemporaryFile()
+    write_xlsx(iter_export_rows(queryset), file)
+    file.seek(0)
+    return file
+
+
+def export_results_to_path(school_id, path, file_format='xlsx'):
+    """
+    Выгружает результаты школы в файл на диске. Возвращает число строк.
+    """
+    if file_format not in EXPORT_FORMATS:
+        raise ValueError(f'Неизвестный формат выгрузки: {file_format}')
+    queryset = Result.objects.filter(school_id=school_id)
+    if file_format == 'csv':
+        with open(path, 'w', encoding='utf-8', newline='') as file:
+            return write_csv(iter_export_rows(queryset), file)
+    with open(path, 'wb') as file:
+        return write_xlsx(iter_export_rows(queryset), file)
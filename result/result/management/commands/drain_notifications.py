@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from result.notifications import drain_outbox
+
+
+class Command(BaseCommand):
+    help = 'Отправляет накопившиеся в очереди уведомления о результатах.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-batches', type=int, default=None, help='Максимальное число пачек за запуск.')
+
+    def handle(self, *args, **options):
+        stats = drain_outbox(max_batches=options['max_batches'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Отправлено: {stats['sent']}, отложено или не доставлено: {stats['failed']}."
+        ))
@@ -1,7 +1,9 @@
 from django.db import models
+from django.utils import timezone
 from django.db.models.signals import post_save
 from django.dispatch import receiver
-from raiting_system.models import Rating, Medal
+from raiting_system.models import Medal
+from raiting_system.services import award_results
 
 
 class Result(models.Model):
@@ -18,6 +20,14 @@ class Result(models.Model):
         (WINNER, 'Победитель')
     ]
 
+    # Очки рейтинга и медаль за статус на каждом этапе олимпиады
+    STAGE_AWARDS = {
+        'Школьный': {WINNER: (100, Medal.SILVER), PRIZE: (50, Medal.BRONZE)},
+        'Городской': {WINNER: (450, Medal.PLATINUM), PRIZE: (300, Medal.GOLD)},
+        'Региональный': {WINNER: (1000, Medal.RUBY), PRIZE: (450, Medal.PLATINUM)},
+        'Заключительный': {WINNER: (6000, Medal.PERSONAL), PRIZE: (3000, Medal.DIAMOND)},
+    }
+
     info_children = models.ForeignKey(
         'users.User',
         on_delete=models.CASCADE,
@@ -49,6 +59,14 @@ class Result(models.Model):
     )
     notified = models.BooleanField(default=False, verbose_name='Уведомление отправлено')
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['info_children', 'info_olympiad'],
+                name='unique_result_per_olympiad'
+            ),
+        ]
+
     def __str__(self):
         """
         Строковое представление результата.
@@ -60,33 +78,75 @@ class Result(models.Model):
         Переопределение метода save для обновления рейтинга пользователя после сохранения результата.
         """
         super().save(*args, **kwargs)
-        self.update_user_rating()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or {'status_result', 'info_olympiad'} & set(update_fields):
+            self.update_user_rating()
 
     def update_user_rating(self):
         """
         Обновление рейтинга пользователя и добавление медалей в зависимости от результата и этапа олимпиады.
+        Начисление идёт через журнал RatingEvent, поэтому повторное сохранение не удваивает очки.
         """
         if not self.info_olympiad or not self.info_olympiad.stage:
             return
 
-        stage_points = {
-            'Школьный': {self.WINNER: (100, Medal.SILVER), self.PRIZE: (50, Medal.BRONZE)},
-            'Городской': {self.WINNER: (450, Medal.PLATINUM), self.PRIZE: (300, Medal.GOLD)},
-            'Региональный': {self.WINNER: (1000, Medal.RUBY), self.PRIZE: (450, Medal.PLATINUM)},
-            'Заключительный': {self.WINNER: (6000, Medal.PERSONAL), self.PRIZE: (3000, Medal.DIAMOND)},
-        }
-
-        stage_name = self.info_olympiad.stage.name
-        points, medal_type = stage_points.get(stage_name, {}).get(self.status_result, (0, None))
-
-        # Обновляем рейтинг
-        rating, _ = Rating.objects.get_or_create(user=self.info_children)
-        rating.update_points(points)
-
-        # Добавляем медаль, если требуется
-        if medal_type:
-            Medal.objects.create(
-                type=medal_type,
-                olympiad=self.info_olympiad,
-                user=self.info_children
-            )
+        award_results([(
+            self.pk, self.info_children_id, self.info_olympiad_id,
+            self.info_olympiad.stage.name, self.status_result
+        )])
+
+    @classmethod
+    def get_award(cls, stage_name, status_result):
+        """
+        Возвращает пару (очки рейтинга, тип медали) для статуса на этапе олимпиады.
+        """
+        return cls.STAGE_AWARDS.get(stage_name, {}).get(status_result, (0, None))
+
+
+class NotificationOutbox(models.Model):
+    """
+    Очередь исходящих уведомлений в Telegram.
+
+    Запись создаётся в той же транзакции, что и результат, а доставляет её
+    отдельный обработчик (задача Celery или команда drain_notifications).
+    """
+    PENDING = 'pending'
+    SENDING = 'sending'
+    SENT = 'sent'
+    DEAD = 'dead'
+
+    STATUSES = [
+        (PENDING, 'Ожидает отправки'),
+        (SENDING, 'Отправляется'),
+        (SENT, 'Отправлено'),
+        (DEAD, 'Не доставлено'),
+    ]
+
+    result = models.ForeignKey(
+        Result,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='notifications',
+        verbose_name='Результат'
+    )
+    chat_id = models.CharField(max_length=50, verbose_name='Telegram ID получателя')
+    message = models.TextField(verbose_name='Текст сообщения')
+    parse_mode = models.CharField(max_length=16, default='Markdown', verbose_name='Режим разметки')
+    status = models.CharField(max_length=16, choices=STATUSES, default=PENDING, verbose_name='Статус')
+    attempts = models.PositiveIntegerField(default=0, verbose_name='Количество попыток')
+    next_attempt_at = models.DateTimeField(default=timezone.now, verbose_name='Время следующей попытки')
+    claim_token = models.CharField(max_length=32, blank=True, default='', verbose_name='Метка обработчика')
+    last_error = models.TextField(blank=True, default='', verbose_name='Последняя ошибка')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+    sent_at = models.DateTimeField(blank=True, null=True, verbose_name='Дата отправки')
+
+    def __str__(self):
+        return f'{self.chat_id} - {self.get_status_display()} ({self.attempts} попыток)'
+
+    class Meta:
+        verbose_name = 'Исходящее уведомление'
+        verbose_name_plural = 'Очередь уведомлений'
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_status_next_attempt'),
+        ]
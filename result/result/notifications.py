@@ -0,0 +1,259 @@
+"""
+Доставка уведомлений о результатах через очередь NotificationOutbox.
+
+Сигналы и импорт только добавляют записи в очередь. Обработчик забирает
+записи пачками, помечая их своей меткой, и отправляет их одним пулом
+соединений aiohttp с ограничением частоты на каждый чат и на бота в целом.
+Неудачные отправки повторяются с экспоненциальной задержкой, а после
+исчерпания попыток или при постоянной ошибке запись переводится в статус
+«Не доставлено».
+"""
+import asyncio
+import logging
+import time
+import uuid
+from datetime import timedelta
+
+import aiohttp
+from django.conf import settings
+from django.utils import timezone
+
+from main.conf import app_settings
+from .models import NotificationOutbox, Result
+
+logger = logging.getLogger(__name__)
+
+# Время, на которое обработчик закрепляет за собой пачку записей
+CLAIM_LEASE = timedelta(minutes=5)
+
+OUTBOX_DEFAULTS = {
+    'BATCH_SIZE': 100,  # Записей за одну выборку
+    'MAX_ATTEMPTS': 8,  # После этого запись переводится в «Не доставлено»
+    'BACKOFF_BASE': 30,  # Секунд до первого повтора, далее удваивается
+    'BACKOFF_MAX': 6 * 60 * 60,  # Наибольшая пауза между повторами, секунд
+    'CHAT_INTERVAL': 1.0,  # Не чаще одного сообщения в секунду в чат
+    'GLOBAL_RATE': 30,  # Не более 30 сообщений в секунду на бота
+    'CONCURRENCY': 10,  # Одновременных запросов к Bot API
+    'TIMEOUT': 10,  # Таймаут запроса, секунд
+}
+
+
+def outbox_settings():
+    return app_settings('NOTIFICATION_OUTBOX', OUTBOX_DEFAULTS)
+
+
+def build_result_message(full_name, olympiad_name, stage_name, status_display, points):
+    """
+    Текст уведомления о новом результате.
+    """
+    return (
+        f"👋 *Здравствуйте, {full_name}!*\n\n"
+        f"🎓 *Ваш результат по олимпиаде «{olympiad_name}»*:\n"
+        f"✨ *Этап*: {stage_name}\n"
+        f"📝 *Статус*: {status_display}\n"
+        f"🏆 *Набранные очки*: {points}\n\n"
+        f"Спасибо за участие и желаем успехов в следующих соревнованиях! 😊"
+    )
+
+
+def enqueue_result_notifications(result_ids):
+    """
+    Ставит в очередь уведомления о результатах и отмечает результаты как обработанные.
+    Вызывается внутри транзакции записи результатов. Возвращает число записей очереди.
+    """
+    statuses = dict(Result.STATUSRES)
+    rows = Result.objects.filter(id__in=result_ids, notified=False).values_list(
+        'id', 'info_children__telegram_id', 'info_children__last_name', 'info_children__first_name',
+        'info_children__surname', 'info_olympiad__name', 'info_olympiad__stage__name',
+        'status_result', 'points'
+    )
+
+    notifications = []
+    processed = []
+    for result_id, chat_id, last_name, first_name, surname, olympiad, stage, status_result, points in rows:
+        processed.append(result_id)
+        full_name = f"{last_name} {first_name} {surname or ''}".strip()
+        if not chat_id:
+            logger.warning(f"Ученик {full_name} не имеет Telegram ID.")
+            continue
+        notifications.append(NotificationOutbox(
+            result_id=result_id,
+            chat_id=chat_id,
+            message=build_result_message(full_name, olympiad, stage, statuses.get(status_result), points),
+        ))
+
+    NotificationOutbox.objects.bulk_create(notifications, batch_size=500)
+    Result.objects.filter(id__in=processed).update(notified=True)
+    return len(notifications)
+
+
+class TelegramError(Exception):
+    """
+    Ошибка Telegram Bot API. permanent — повтор бессмыслен, retry_after — пауза от Telegram.
+    """
+
+    def __init__(self, message, permanent=False, retry_after=None):
+        super().__init__(message)
+        self.permanent = permanent
+        self.retry_after = retry_after
+
+
+class RateLimiter:
+    """
+    Ограничение частоты: не чаще одного сообщения в CHAT_INTERVAL секунд в чат
+    и не более GLOBAL_RATE сообщений в секунду на бота.
+    """
+
+    def __init__(self, chat_interval, global_rate):
+        self.chat_interval = chat_interval
+        self.global_interval = 1.0 / global_rate if global_rate else 0
+        self._chat_locks = {}
+        self._chat_last = {}
+        self._global_lock = asyncio.Lock()
+        self._global_last = 0.0
+
+    async def _wait(self, last, interval):
+        delay = last + interval - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return time.monotonic()
+
+    async def acquire(self, chat_id):
+        lock = self._chat_locks.setdefault(chat_id, asyncio.Lock())
+        async with lock:
+            self._chat_last[chat_id] = await self._wait(self._chat_last.get(chat_id, 0.0), self.chat_interval)
+        async with self._global_lock:
+            self._global_last = await self._wait(self._global_last, self.global_interval)
+
+
+class TelegramClient:
+    """
+    Асинхронный клиент Bot API с общим пулом соединений.
+    """
+
+    def __init__(self, session, token=None, api_url=None):
+        self.session = session
+        self.token = token if token is not None else settings.TELEGRAM_BOT_TOKEN
+        self.api_url = (api_url or settings.TELEGRAM_API_URL).rstrip('/')
+
+    async def send_message(self, chat_id, text, parse_mode=None):
+        payload = {'chat_id': chat_id, 'text': text}
+        if parse_mode:
+            payload['parse_mode'] = parse_mode
+        try:
+            async with self.session.post(f'{self.api_url}/bot{self.token}/sendMessage', data=payload) as response:
+                try:
+                    body = await response.json(content_type=None)
+                except ValueError:
+                    body = {}
+                if response.status == 200 and body.get('ok', True):
+                    return
+                description = body.get('description') or f'HTTP {response.status}'
+                if response.status == 429:
+                    retry_after = (body.get('parameters') or {}).get('retry_after')
+                    raise TelegramError(description, retry_after=retry_after)
+                # 400/403/404: чат не найден, бот заблокирован, ошибка разметки — повтор не поможет
+                raise TelegramError(description, permanent=400 <= response.status < 500)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise TelegramError(f'Сетевая ошибка: {e!r}')
+
+
+def claim_batch(batch_size):
+    """
+    Закрепляет за обработчиком пачку готовых к отправке записей.
+    Записи, чья аренда истекла (обработчик упал), забираются повторно.
+    """
+    now = timezone.now()
+    token = uuid.uuid4().hex
+    ready = NotificationOutbox.objects.filter(
+        status__in=[NotificationOutbox.PENDING, NotificationOutbox.SENDING],
+        next_attempt_at__lte=now,
+    )
+    ids = list(ready.order_by('next_attempt_at', 'id').values_list('id', flat=True)[:batch_size])
+    if not ids:
+        return []
+    ready.filter(id__in=ids).update(
+        status=NotificationOutbox.SENDING, claim_token=token, next_attempt_at=now + CLAIM_LEASE
+    )
+    return list(NotificationOutbox.objects.filter(claim_token=token, status=NotificationOutbox.SENDING))
+
+
+async def deliver(notifications, options, api_url=None):
+    """
+    Отправляет пачку уведомлений. Возвращает {id записи: None или TelegramError}.
+    """
+    limiter = RateLimiter(options['CHAT_INTERVAL'], options['GLOBAL_RATE'])
+    semaphore = asyncio.Semaphore(options['CONCURRENCY'])
+    timeout = aiohttp.ClientTimeout(total=options['TIMEOUT'])
+    connector = aiohttp.TCPConnector(limit=options['CONCURRENCY'])
+    outcomes = {}
+
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+        client = TelegramClient(session, api_url=api_url)
+
+        async def send(notification):
+            async with semaphore:
+                await limiter.acquire(notification.chat_id)
+                try:
+                    await client.send_message(notification.chat_id, notification.message, notification.parse_mode)
+                    outcomes[notification.id] = None
+                except TelegramError as e:
+                    outcomes[notification.id] = e
+
+        await asyncio.gather(*(send(notification) for notification in notifications))
+    return outcomes
+
+
+def record_outcomes(notifications, outcomes, options):
+    """
+    Сохраняет итоги отправки: успешные помечаются отправленными, остальные
+    откладываются с экспоненциальной задержкой или переводятся в «Не доставлено».
+    """
+    now = timezone.now()
+    sent_ids = [notification.id for notification in notifications if outcomes.get(notification.id) is None]
+    NotificationOutbox.objects.filter(id__in=sent_ids).update(
+        status=NotificationOutbox.SENT, sent_at=now, claim_token='', last_error=''
+    )
+
+    failed = []
+    for notification in notifications:
+        error = outcomes.get(notification.id)
+        if error is None:
+            continue
+        notification.attempts += 1
+        notification.last_error = str(error)
+        notification.claim_token = ''
+        if error.permanent or notification.attempts >= options['MAX_ATTEMPTS']:
+            notification.status = NotificationOutbox.DEAD
+            logger.error(f"Уведомление {notification.id} не доставлено: {error}")
+        else:
+            notification.status = NotificationOutbox.PENDING
+            delay = error.retry_after or min(
+                options['BACKOFF_BASE'] * 2 ** (notification.attempts - 1), options['BACKOFF_MAX']
+            )
+            notification.next_attempt_at = now + timedelta(seconds=delay)
+        failed.append(notification)
+    NotificationOutbox.objects.bulk_update(
+        failed, ['status', 'attempts', 'last_error', 'claim_token', 'next_attempt_at']
+    )
+    return len(sent_ids), len(failed)
+
+
+def drain_outbox(max_batches=None, api_url=None):
+    """
+    Отправляет накопившиеся уведомления пачками, пока очередь не опустеет.
+    Возвращает статистику {'sent': ..., 'failed': ...}.
+    """
+    options = outbox_settings()
+    stats = {'sent': 0, 'failed': 0}
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        notifications = claim_batch(options['BATCH_SIZE'])
+        if not notifications:
+            break
+        outcomes = asyncio.run(deliver(notifications, options, api_url=api_url))
+        sent, failed = record_outcomes(notifications, outcomes, options)
+        stats['sent'] += sent
+        stats['failed'] += failed
+        batches += 1
+    return stats
@@ -0,0 +1,26 @@
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+from .exports import CONTENT_TYPES
+
+
+class FileRenderer(BaseRenderer):
+    """
+    Рендерер для выгрузок: файл отдаётся самим представлением, а рендерер
+    нужен, чтобы DRF принимал параметр ?format=. Ошибки отдаются как JSON.
+    """
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, (bytes, str)):
+            return data
+        return JSONRenderer().render(data)
+
+
+class XLSXRenderer(FileRenderer):
+    media_type = CONTENT_TYPES['xlsx']
+    format = 'xlsx'
+
+
+class CSVRenderer(FileRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
@@ -0,0 +1,244 @@
+"""
+Массовые операции с результатами олимпиад.
+
+Импорт обрабатывает весь файл набором запросов, не зависящим от числа строк:
+ученики и олимпиады разрешаются через словари в памяти, результаты пишутся
+одним bulk_create с обновлением при конфликте, а рейтинг и медали
+начисляются отдельным пакетным проходом через журнал RatingEvent.
+Уведомления о новых результатах ставятся в очередь одной вставкой.
+"""
+import math
+
+from django.db import connection, transaction
+
+from .models import Result
+from .notifications import enqueue_result_notifications
+from main import homepage, versions
+from main.models import Olympiad
+from users.fio import fio_key, load_fio_map, match_fio
+from raiting_system.services import award_results
+
+BATCH_SIZE = 500
+
+# Допустимые значения столбца «Статус»: код или название статуса
+STATUS_LOOKUP = {}
+for _code, _label in Result.STATUSRES:
+    STATUS_LOOKUP[_code.lower()] = _code
+    STATUS_LOOKUP[_label.lower()] = _code
+
+
+def normalize_cell(value):
+    """
+    Приводит значение ячейки к строке без лишних пробелов (пустые ячейки -> '').
+    """
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ''
+    return ' '.join(str(value).split())
+
+
+def student_name(row):
+    """
+    ФИО ученика из строки файла для сообщений об ошибках.
+    """
+    return ' '.join(
+        part for part in (normalize_cell(row.get(field)) for field in ('last_name', 'first_name', 'surname')) if part
+    )
+
+
+def parse_points(value):
+    """
+    Преобразует значение столбца «Очки» в целое число или None.
+    """
+    value = normalize_cell(value).replace(',', '.')
+    if not value:
+        return None
+    points = int(float(value))
+    if points < 0:
+        raise ValueError(value)
+    return points
+
+
+class ImportReport:
+    """
+    Итог импорта: количество добавленных, обновлённых и пропущенных строк.
+    """
+    MAX_ERRORS = 100
+
+    def __init__(self):
+        self.inserted = 0
+        self.updated = 0
+        self.skipped = 0
+        self.fuzzy_matched = 0
+        self.errors = []
+
+    def skip(self, row_num, message):
+        self.skipped += 1
+        if len(self.errors) < self.MAX_ERRORS:
+            self.errors.append(f'Строка {row_num}: {message}')
+
+    def as_dict(self):
+        return {
+            'inserted': self.inserted,
+            'updated': self.updated,
+            'skipped': self.skipped,
+            'fuzzy_matched': self.fuzzy_matched,
+            'errors': self.errors,
+        }
+
+
+def load_student_map(school):
+    """
+    Загружает словарь {ключ ФИО: id ученика} для школы одним запросом
+    по индексу (school, fio_key). Для неоднозначных ФИО значение равно None.
+    """
+    return load_fio_map(school.pk if school else None)
+
+
+def load_olympiad_map(names):
+    """
+    Загружает словарь {название в нижнем регистре: (id, этап)} одним запросом.
+    При совпадении названий берётся олимпиада с меньшим id.
+
+    Регистр приводится в Python: LOWER() в SQLite не работает с кириллицей.
+    """
+    names = set(names)
+    olympiads = {}
+    rows = Olympiad.objects.order_by('-id').values_list('name', 'id', 'stage__name').iterator()
+    for name, olympiad_id, stage_name in rows:
+        name_lower = normalize_cell(name).lower()
+        if name_lower in names:
+            olympiads[name_lower] = (olympiad_id, stage_name)
+    return olympiads
+
+
+def bulk_import_results(rows, school, fuzzy=False):
+    """
+    Импортирует результаты одной транзакцией.
+
+    rows — последовательность словарей с ключами last_name, first_name, surname,
+    olympiad, points, status. fuzzy=True включает нечёткий поиск учеников,
+    не найденных по точному ключу ФИО. Возвращает ImportReport.
+    """
+    report = ImportReport()
+    rows = list(rows)
+    students = load_student_map(school)
+    olympiads = load_olympiad_map(normalize_cell(row.get('olympiad')).lower() for row in rows)
+
+    # Разрешаем строки в памяти; при повторе пары ученик-олимпиада побеждает последняя строка
+    resolved = {}
+    for row_num, row in enumerate(rows, start=1):
+        match = match_fio(
+            students, fio_key(row.get('last_name'), row.get('first_name'), row.get('surname')), fuzzy=fuzzy
+        )
+        if match.ambiguous:
+            report.skip(row_num, f'найдено несколько учеников {student_name(row)}')
+            continue
+        if not match:
+            report.skip(row_num, f'ученик {student_name(row)} не найден')
+            continue
+        child_id = match.user_id
+        report.fuzzy_matched += match.fuzzy
+
+        olympiad_name = normalize_cell(row.get('olympiad'))
+        olympiad = olympiads.get(olympiad_name.lower())
+        if not olympiad:
+            report.skip(row_num, f'олимпиада «{olympiad_name}» не найдена')
+            continue
+
+        status_result = STATUS_LOOKUP.get(normalize_cell(row.get('status')).lower())
+        if not status_result:
+            report.skip(row_num, f'неизвестный статус «{normalize_cell(row.get("status"))}»')
+            continue
+
+        try:
+            points = parse_points(row.get('points'))
+        except ValueError:
+            report.skip(row_num, f'некорректные очки «{normalize_cell(row.get("points"))}»')
+            continue
+
+        pair = (child_id, olympiad[0])
+        if pair in resolved:
+            report.skip(resolved[pair]['row_num'], 'перезаписана более поздней строкой файла')
+        resolved[pair] = {
+            'row_num': row_num,
+            'points': points,
+            'status_result': status_result,
+            'stage_name': olympiad[1],
+            'school_id': school.pk if school else None,
+        }
+
+    existing = save_resolved_results(resolved)
+    for pair in resolved:
+        if pair in existing:
+            report.updated += 1
+        else:
+            report.inserted += 1
+
+    return report
+
+
+def save_resolved_results(resolved):
+    """
+    Записывает разрешённые строки импорта одной транзакцией: пакетный upsert
+    результатов, начисления по журналу, уведомления о новых результатах,
+    сброс сводок главной страницы и смена версий данных школ.
+
+    resolved — словарь {(id ученика, id олимпиады): {'points', 'status_result',
+    'stage_name', 'school_id'}}. Возвращает множество пар, которые уже существовали.
+    """
+    if not resolved:
+        return set()
+
+    child_ids = {child_id for child_id, _ in resolved}
+    olympiad_ids = {olympiad_id for _, olympiad_id in resolved}
+
+    with transaction.atomic():
+        existing = set(
+            Result.objects.filter(
+                info_children_id__in=child_ids, info_olympiad_id__in=olympiad_ids
+            ).values_list('info_children_id', 'info_olympiad_id')
+        )
+
+        objs = [
+            Result(
+                info_children_id=child_id,
+                info_olympiad_id=olympiad_id,
+                points=item['points'],
+                status_result=item['status_result'],
+                school_id=item['school_id'],
+            )
+            for (child_id, olympiad_id), item in resolved.items()
+        ]
+        upsert_results(objs)
+
+        # Начисления по журналу: за неизменившийся статус повторно ничего не начисляется
+        result_ids = {
+            (child_id, olympiad_id): result_id
+            for result_id, child_id, olympiad_id in Result.objects.filter(
+                info_children_id__in=child_ids, info_olympiad_id__in=olympiad_ids
+            ).values_list('id', 'info_children_id', 'info_olympiad_id')
+        }
+        award_results(
+            (result_ids[pair], pair[0], pair[1], item['stage_name'], item['status_result'])
+            for pair, item in resolved.items()
+        )
+        enqueue_result_notifications([result_ids[pair] for pair in resolved if pair not in existing])
+        homepage.invalidate_users(child_ids)
+        versions.invalidate_schools({item['school_id'] for item in resolved.values()})
+
+    return existing
+
+
+def upsert_results(objs):
+    """
+    Записывает результаты пачками; существующая пара ученик-олимпиада обновляется.
+    """
+    options = {
+        'update_conflicts': True,
+        'update_fields': ['points', 'status_result', 'school'],
+        'batch_size': BATCH_SIZE,
+    }
+    # MySQL сам определяет конфликт по уникальному индексу и не принимает unique_fields
+    if connection.features.supports_update_conflicts_with_target:
+        options['unique_fields'] = ['info_children', 'info_olympiad']
+    return Result.objects.bulk_create(objs, **options)
@@ -0,0 +1,21 @@
+from celery import shared_task
+
+from .exports import export_results_to_path
+from .notifications import drain_outbox
+
+
+@shared_task
+def drain_notification_outbox():
+    """
+    Отправляет накопившиеся в очереди уведомления о результатах.
+    """
+    return drain_outbox()
+
+
+@shared_task
+def export_results_task(school_id, path, file_format='xlsx'):
+    """
+    Фоновая выгрузка результатов школы в файл. Возвращает путь и число строк.
+    """
+    rows = export_results_to_path(school_id, path, file_format)
+    return {'path': path, 'rows': rows}
@@ -0,0 +1,232 @@
+import io
+import json
+import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from openpyxl import load_workbook
+from rest_framework.test import APIClient
+from users.models import User
+from school.models import School
+from main.models import Olympiad, Subject, Stage, Category, LevelOlympiad
+from main.registry import references
+from raiting_system.leagues import league_table
+from raiting_system.models import Rating, Medal
+from result.models import Result, NotificationOutbox
+from result.exports import export_results_to_path
+from result.notifications import drain_outbox
+from result.services import bulk_import_results
+
+
+class BulkImportResultsTest(TestCase):
+    """Тесты пакетного импорта результатов."""
+
+    def setUp(self):
+        # Число запросов импорта не должно зависеть от справочников, загруженных другими тестами
+        league_table.clear()
+        references.clear()
+        self.school = School.objects.create(name='Test School')
+        self.olympiad = Olympiad.objects.create(
+            name='Математика 5',
+            category=Category.objects.create(name='Предметная'),
+            level=LevelOlympiad.objects.create(name='Всероссийская'),
+            stage=Stage.objects.create(name='Школьный'),
+            subject=Subject.objects.create(name='Математика'),
+            class_olympiad=5,
+        )
+        self.child = User.objects.create_user(
+            username='child', password='pass', is_child=True, school=self.school,
+            last_name='Иванов', first_name='Иван', surname='Иванович'
+        )
+
+    def row(self, **overrides):
+        row = {
+            'last_name': 'иванов ', 'first_name': 'Иван', 'surname': 'Иванович',
+            'olympiad': 'математика 5', 'points': 42, 'status': 'Призер',
+        }
+        row.update(overrides)
+        return row
+
+    def test_insert_update_and_skip_counts(self):
+        report = bulk_import_results([self.row(), self.row(last_name='Петров')], self.school)
+        self.assertEqual((report.inserted, report.updated, report.skipped), (1, 0, 1))
+        self.assertEqual(Rating.objects.get(user=self.child).points, 50)
+        self.assertEqual(Medal.objects.filter(user=self.child, type=Medal.BRONZE).count(), 1)
+
+        report = bulk_import_results([self.row(status='ПОБД', points=90)], self.school)
+        self.assertEqual((report.inserted, report.updated, report.skipped), (0, 1, 0))
+        result = Result.objects.get(info_children=self.child)
+        self.assertEqual((result.points, result.status_result), (90, Result.WINNER))
+        self.assertEqual(Rating.objects.get(user=self.child).points, 100)
+
+    def test_reimport_same_file_does_not_add_points(self):
+        bulk_import_results([self.row()], self.school)
+        bulk_import_results([self.row()], self.school)
+        self.assertEqual(Rating.objects.get(user=self.child).points, 50)
+        self.assertEqual(Medal.objects.filter(user=self.child).count(), 1)
+
+    def test_import_runs_constant_number_of_queries(self):
+        for i in range(20):
+            User.objects.create_user(
+                username=f'child{i}', password='pass', is_child=True, school=self.school,
+                last_name=f'Ученик{i}', first_name='Имя', surname=''
+            )
+        rows = [self.row(last_name=f'Ученик{i}', first_name='Имя', surname='') for i in range(20)]
+        with self.assertNumQueries(19):
+            report = bulk_import_results(rows, self.school)
+        self.assertEqual(report.inserted, 20)
+
+
+class TelegramStubHandler(BaseHTTPRequestHandler):
+    """Заглушка Bot API: chat_id задаёт ответ сервера."""
+    requests = []
+
+    def do_POST(self):
+        payload = parse_qs(self.rfile.read(int(self.headers['Content-Length'])).decode())
+        chat_id = payload['chat_id'][0]
+        TelegramStubHandler.requests.append((self.path, chat_id))
+        code, body = {
+            'blocked': (403, {'ok': False, 'description': 'Forbidden: bot was blocked by the user'}),
+            'flood': (429, {'ok': False, 'description': 'Too Many Requests', 'parameters': {'retry_after': 7}}),
+            'down': (502, {}),
+        }.get(chat_id, (200, {'ok': True, 'result': {}}))
+        data = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@override_settings(
+    TELEGRAM_BOT_TOKEN='token',
+    NOTIFICATION_OUTBOX={'CHAT_INTERVAL': 0, 'GLOBAL_RATE': 0, 'MAX_ATTEMPTS': 2, 'TIMEOUT': 5},
+)
+class NotificationOutboxTest(TestCase):
+    """Тесты очереди уведомлений с локальной заглушкой Telegram."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), TelegramStubHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.api_url = f'http://127.0.0.1:{cls.server.server_port}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        TelegramStubHandler.requests = []
+        self.school = School.objects.create(name='Test School')
+        self.olympiad = Olympiad.objects.create(
+            name='Химия 8',
+            category=Category.objects.create(name='Предметная'),
+            level=LevelOlympiad.objects.create(name='Всероссийская'),
+            stage=Stage.objects.create(name='Школьный'),
+            subject=Subject.objects.create(name='Химия'),
+            class_olympiad=8,
+        )
+
+    def create_result(self, telegram_id):
+        child = User.objects.create_user(
+            username=f'child_{telegram_id}', password='pass', is_child=True, school=self.school,
+            last_name='Петров', first_name='Пётр', telegram_id=telegram_id
+        )
+        return Result.objects.create(
+            info_children=child, info_olympiad=self.olympiad, points=10, school=self.school
+        )
+
+    def test_result_creation_only_enqueues(self):
+        result = self.create_result('100')
+        result.refresh_from_db()
+        self.assertTrue(result.notified)
+        notification = NotificationOutbox.objects.get(result=result)
+        self.assertEqual(notification.status, NotificationOutbox.PENDING)
+        self.assertIn('Химия 8', notification.message)
+        self.assertEqual(TelegramStubHandler.requests, [])
+
+    def test_drain_sends_retries_and_dead_letters(self):
+        for telegram_id in ('100', 'blocked', 'flood', 'down'):
+            self.create_result(telegram_id)
+
+        stats = drain_outbox(api_url=self.api_url)
+        self.assertEqual(stats, {'sent': 1, 'failed': 3})
+        self.assertIn(('/bottoken/sendMessage', '100'), TelegramStubHandler.requests)
+
+        statuses = dict(NotificationOutbox.objects.values_list('chat_id', 'status'))
+        self.assertEqual(statuses, {
+            '100': NotificationOutbox.SENT,
+            'blocked': NotificationOutbox.DEAD,
+            'flood': NotificationOutbox.PENDING,
+            'down': NotificationOutbox.PENDING,
+        })
+        flood = NotificationOutbox.objects.get(chat_id='flood')
+        self.assertAlmostEqual(
+            (flood.next_attempt_at - timezone.now()).total_seconds(), 7, delta=2
+        )
+
+        # Повтор после задержки исчерпывает попытки
+        NotificationOutbox.objects.update(next_attempt_at=timezone.now())
+        drain_outbox(api_url=self.api_url)
+        self.assertEqual(NotificationOutbox.objects.get(chat_id='down').status, NotificationOutbox.DEAD)
+        self.assertEqual(NotificationOutbox.objects.filter(chat_id='100').count(), 1)
+
+
+class ExportResultsTest(TestCase):
+    """Тесты потоковой выгрузки результатов."""
+
+    def setUp(self):
+        self.school = School.objects.create(name='Test School')
+        self.admin = User.objects.create_user(
+            username='admin', password='pass', is_admin=True, school=self.school
+        )
+        olympiad = Olympiad.objects.create(
+            name='Физика 9',
+            category=Category.objects.create(name='Предметная'),
+            level=LevelOlympiad.objects.create(name='Всероссийская'),
+            stage=Stage.objects.create(name='Школьный'),
+            subject=Subject.objects.create(name='Физика'),
+            class_olympiad=9,
+        )
+        for i in range(3):
+            child = User.objects.create_user(
+                username=f'child{i}', password='pass', is_child=True, school=self.school,
+                last_name=f'Ученик{i}', first_name='Имя'
+            )
+            Result.objects.create(
+                info_children=child, info_olympiad=olympiad, points=i, school=self.school,
+                status_result=Result.PARTICIPANT
+            )
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_csv_is_streamed(self):
+        response = self.client.get('/result/export_results/?format=csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(lines[0], 'ФИО,Класс,Название олимпиады,Очки,Статус,Дата')
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(lines[1].startswith('Ученик0 Имя,Нет данных,Физика 9,0,'))
+
+    def test_xlsx_is_default(self):
+        response = self.client.get('/result/export_results/')
+        self.assertEqual(response.status_code, 200)
+        workbook = load_workbook(io.BytesIO(b''.join(response.streaming_content)), read_only=True)
+        rows = list(workbook['Results'].values)
+        self.assertEqual(rows[0][0], 'ФИО')
+        self.assertEqual([row[3] for row in rows[1:]], [0, 1, 2])
+
+    def test_export_to_path(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'results.csv')
+            self.assertEqual(export_results_to_path(self.school.id, path, 'csv'), 3)
@@ -1,21 +1,32 @@
-import io
 import pandas as pd
-from django.http import HttpResponse, Http404
-from django.conf import settings
+from django.http import FileResponse, Http404, StreamingHttpResponse
 from rest_framework.viewsets import ModelViewSet
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework import status
-from .models import Result
+from .models import Result, NotificationOutbox
 from .serializers import ResultSerializer
+from .exports import CONTENT_TYPES, EXPORT_FORMATS, build_xlsx_tempfile, iter_csv, iter_export_rows
+from .renderers import CSVRenderer, XLSXRenderer
+from .services import ImportReport, STATUS_LOOKUP, bulk_import_results, normalize_cell, parse_points
 from main.models import Olympiad
+from users.fio import fio_key
 from users.models import User
 from classroom.models import Classroom
 from school.models import School
 from raiting_system.models import Rating, Medal
-import requests
-from asgiref.sync import async_to_sync
+
+# Столбцы файла импорта и соответствующие им поля строки
+IMPORT_COLUMNS = {
+    'Фамилия': 'last_name',
+    'Имя': 'first_name',
+    'Отчество': 'surname',
+    'Олимпиада': 'olympiad',
+    'Очки': 'points',
+    'Статус': 'status',
+}
 
 
 class ResultViewSet(ModelViewSet):
@@ -34,49 +45,54 @@ class ResultViewSet(ModelViewSet):
             return Result.objects.filter(school=self.request.user.school)
         return Result.objects.none()
 
-    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
+    @action(
+        detail=False, methods=['get'], permission_classes=[IsAuthenticated],
+        renderer_classes=[XLSXRenderer, CSVRenderer, JSONRenderer]
+    )
     def export_results(self, request):
         """
-        Экспорт результатов в Excel файл.
+        Потоковый экспорт результатов школы: ?format=xlsx (по умолчанию) или ?format=csv.
         """
-        results = self.get_queryset().select_related('info_children__classroom', 'info_olympiad')
-        data = [
-            {
-                'ФИО': result.info_children.get_full_name(),
-                'Класс': f"{result.info_children.classroom.number} {result.info_children.classroom.letter}" if result.info_children.classroom else 'Нет данных',
-                'Название олимпиады': result.info_olympiad.name,
-                'Очки': result.points,
-                'Статус': result.get_status_result_display(),
-                'Дата': result.date_added.strftime('%Y-%m-%d') if result.date_added else 'Нет данных',
-            }
-            for result in results
-        ]
-
-        df = pd.DataFrame(data)
-        buffer = io.BytesIO()
-        with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
-            df.to_excel(writer, index=False, sheet_name='Results')
-
-        buffer.seek(0)
-        response = HttpResponse(
-            buffer, content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        file_format = request.accepted_renderer.format
+        if file_format not in EXPORT_FORMATS:
+            file_format = 'xlsx'
+        queryset = self.get_queryset()
+
+        if file_format == 'csv':
+            response = StreamingHttpResponse(
+                iter_csv(iter_export_rows(queryset)), content_type=CONTENT_TYPES['csv']
+            )
+            response['Content-Disposition'] = 'attachment; filename=results.csv'
+            return response
+
+        return FileResponse(
+            build_xlsx_tempfile(queryset), as_attachment=True, filename='results.xlsx',
+            content_type=CONTENT_TYPES['xlsx']
         )
-        response['Content-Disposition'] = 'attachment; filename=results.xlsx'
-        return response
 
     @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
     def import_results(self, request):
         """
         Импорт результатов из Excel файла.
+
+        По умолчанию используется пакетный режим (mode=bulk): весь файл
+        записывается одной транзакцией. Режим mode=row сохраняет результаты
+        по одному, с сигналами и уведомлениями на каждую строку. Параметр
+        fuzzy=1 включает в пакетном режиме нечёткий поиск учеников по ФИО.
         """
         file = request.FILES.get('file')
         if not file:
             return Response({"detail": "Файл не найден."}, status=status.HTTP_400_BAD_REQUEST)
 
+        mode = request.query_params.get('mode') or request.data.get('mode') or 'bulk'
+        if mode not in ('bulk', 'row'):
+            return Response({"detail": "Неизвестный режим импорта."}, status=status.HTTP_400_BAD_REQUEST)
+
+        fuzzy = str(request.query_params.get('fuzzy') or request.data.get('fuzzy') or '').lower() in ('1', 'true')
+
         try:
             df = pd.read_excel(file)
-            required_columns = ['Фамилия', 'Имя', 'Отчество', 'Олимпиада', 'Очки', 'Статус']
-            missing_columns = [col for col in required_columns if col not in df.columns]
+            missing_columns = [col for col in IMPORT_COLUMNS if col not in df.columns]
 
             if missing_columns:
                 return Response(
@@ -84,42 +100,71 @@ class ResultViewSet(ModelViewSet):
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
+            rows = [
+                {field: record[column] for column, field in IMPORT_COLUMNS.items()}
+                for record in df.to_dict('records')
+            ]
             school = request.user.school
-            for _, row in df.iterrows():
-                last_name, first_name, surname = row['Фамилия'], row['Имя'], row['Отчество']
-                olympiad_name, points, status = row['Олимпиада'], row['Очки'], row['Статус']
-
-                child = User.objects.filter(
-                    last_name__iexact=last_name,
-                    first_name__iexact=first_name,
-                    surname__iexact=surname,
-                    school=school
-                ).first()
-                if not child:
-                    continue
-
-                olympiad = Olympiad.objects.filter(name__iexact=olympiad_name).first()
-                if not olympiad:
-                    continue
-
-                Result.objects.update_or_create(
-                    info_children=child,
-                    info_olympiad=olympiad,
-                    defaults={
-                        'points': points,
-                        'status_result': status,
-                        'school': school
-                    }
-                )
-
-            return Response({"detail": "Результаты успешно импортированы."}, status=status.HTTP_201_CREATED)
+            if mode == 'bulk':
+                report = bulk_import_results(rows, school, fuzzy=fuzzy)
+            else:
+                report = self._import_rows(rows, school)
+
+            return Response(
+                {"detail": "Результаты успешно импортированы.", **report.as_dict()},
+                status=status.HTTP_201_CREATED
+            )
         except Exception as e:
             return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+    def _import_rows(self, rows, school):
+        """
+        Построчный импорт: каждая строка сохраняется через update_or_create.
+        """
+        report = ImportReport()
+        for row_num, row in enumerate(rows, start=1):
+            child = User.objects.filter(
+                school=school, fio_key=fio_key(row['last_name'], row['first_name'], row['surname'])
+            ).first()
+            if not child:
+                report.skip(row_num, 'ученик не найден')
+                continue
+
+            olympiad = Olympiad.objects.filter(name__iexact=normalize_cell(row['olympiad'])).first()
+            if not olympiad:
+                report.skip(row_num, 'олимпиада не найдена')
+                continue
+
+            status_result = STATUS_LOOKUP.get(normalize_cell(row['status']).lower())
+            if not status_result:
+                report.skip(row_num, 'неизвестный статус')
+                continue
+
+            try:
+                points = parse_points(row['points'])
+            except ValueError:
+                report.skip(row_num, 'некорректные очки')
+                continue
+
+            _, created = Result.objects.update_or_create(
+                info_children=child,
+                info_olympiad=olympiad,
+                defaults={
+                    'points': points,
+                    'status_result': status_result,
+                    'school': school
+                }
+            )
+            if created:
+                report.inserted += 1
+            else:
+                report.updated += 1
+        return report
+
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
     def send_telegram_notification(self, request, pk=None):
         """
-        Отправка уведомления в Telegram.
+        Постановка уведомления в Telegram в очередь отправки.
         """
         result = self.get_object()
         student = result.info_children
@@ -133,21 +178,7 @@ class ResultViewSet(ModelViewSet):
             f"✨ Статус: {result.get_status_result_display()}\n"
             f"🏆 Очки: {result.points}"
         )
-
-        try:
-            async_to_sync(send_message_via_telegram)(student.telegram_id, message)
-            return Response({"detail": "Уведомление успешно отправлено."}, status=status.HTTP_200_OK)
-        except Exception as e:
-            return Response({"detail": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-
-async def send_message_via_telegram(chat_id, message):
-    """
-    Отправка сообщения в Telegram.
-    """
-    token = settings.TELEGRAM_BOT_TOKEN
-    url = f"https://api.telegram.org/bot{token}/sendMessage"
-    payload = {'chat_id': chat_id, 'text': message, 'parse_mode': 'HTML'}
-    response = requests.post(url, data=payload)
-    if not response.ok:
-        raise Exception(f"Ошибка отправки сообщения: {response.text}")
+        NotificationOutbox.objects.create(
+            result=result, chat_id=student.telegram_id, message=message, parse_mode='HTML'
+        )
+        return Response({"detail": "Уведомление поставлено в очередь отправки."}, status=status.HTTP_202_ACCEPTED)
@@ -0,0 +1,101 @@
+"""
+Нормализованный ключ ФИО для поиска учеников при импорте.
+
+Ключ хранится в User.fio_key и обновляется при сохранении пользователя;
+для записей, созданных в обход save() (bulk_create, update), его
+заполняет команда backfill_fio_keys. По составному индексу (school,
+fio_key) импорт загружает словарь {ключ: id} школы одним запросом.
+
+В ключе регистр не учитывается, «ё» равна «е», а пробелы и дефисы внутри
+части ФИО отбрасываются: «Салтыков-Щедрин», «Салтыков - Щедрин» и
+разорванное переносом «Салты- ков» дают одинаковые ключи.
+"""
+import difflib
+import re
+
+FIO_KEY_LENGTH = 255
+FUZZY_CUTOFF = 0.9
+
+SEPARATORS_RE = re.compile(r'[\s\-‐‑‒–—]+')
+
+
+def normalize_fio_part(value):
+    """
+    Часть ФИО в виде ключа: нижний регистр, «ё» -> «е», без пробелов и дефисов.
+    """
+    if value is None:
+        return ''
+    return SEPARATORS_RE.sub('', str(value).lower().replace('ё', 'е'))
+
+
+def fio_key(last_name, first_name, surname):
+    """
+    Ключ ФИО: нормализованные фамилия, имя и отчество через «|».
+    """
+    key = '|'.join(normalize_fio_part(part) for part in (last_name, first_name, surname))
+    return key[:FIO_KEY_LENGTH]
+
+
+def load_fio_map(school_id):
+    """
+    Словарь {ключ ФИО: id пользователя} школы одним запросом по индексу.
+    Для неоднозначных ключей значение равно None.
+    """
+    from .models import User
+
+    fio_map = {}
+    for user_id, key in User.objects.filter(school_id=school_id).values_list('id', 'fio_key'):
+        fio_map[key] = None if key in fio_map else user_id
+    return fio_map
+
+
+class FioMatch:
+    """
+    Итог поиска ученика: id (или None) и признаки нечёткого совпадения и неоднозначности.
+    """
+
+    def __init__(self, user_id=None, fuzzy=False, ambiguous=False, candidates=()):
+        self.user_id = user_id
+        self.fuzzy = fuzzy
+        self.ambiguous = ambiguous
+        self.candidates = list(candidates)
+
+    def __bool__(self):
+        return self.user_id is not None
+
+
+def match_fio(fio_map, key, fuzzy=False, cutoff=FUZZY_CUTOFF):
+    """
+    Ищет ключ в словаре школы. При fuzzy=True ключ без точного совпадения
+    сравнивается с ключами школы через difflib; совпадение принимается,
+    только если близкий ключ ровно один.
+    """
+    if key in fio_map:
+        user_id = fio_map[key]
+        return FioMatch(user_id, ambiguous=user_id is None, candidates=[key])
+    if not fuzzy:
+        return FioMatch()
+
+    candidates = difflib.get_close_matches(key, fio_map, n=2, cutoff=cutoff)
+    if len(candidates) != 1 or fio_map[candidates[0]] is None:
+        return FioMatch(fuzzy=True, ambiguous=bool(candidates), candidates=candidates)
+    return FioMatch(fio_map[candidates[0]], fuzzy=True, candidates=candidates)
+
+
+class FioIndex:
+    """
+    Словари ФИО нескольких школ на один запуск импорта: каждая школа
+    загружается один раз при первом обращении.
+    """
+
+    def __init__(self, fuzzy=False):
+        self.fuzzy = fuzzy
+        self._maps = {}
+
+    def for_school(self, school_id):
+        if school_id not in self._maps:
+            self._maps[school_id] = load_fio_map(school_id)
+        return self._maps[school_id]
+
+    def match(self, school_id, last_name, first_name, surname):
+        return match_fio(self.for_school(school_id), fio_key(last_name, first_name, surname), fuzzy=self.fuzzy)
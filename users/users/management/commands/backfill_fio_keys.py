@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from users.fio import fio_key
+from users.models import User
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = 'Заполняет ключи ФИО пользователей, созданных или изменённых в обход save().'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Пользователей в одном запросе.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        rows = User.objects.order_by('id').values_list('id', 'last_name', 'first_name', 'surname', 'fio_key')
+        changed = []
+        updated = 0
+        for user_id, last_name, first_name, surname, current in rows.iterator(chunk_size=batch_size):
+            key = fio_key(last_name, first_name, surname)
+            if key != current:
+                changed.append(User(id=user_id, fio_key=key))
+            if len(changed) >= batch_size:
+                User.objects.bulk_update(changed, ['fio_key'])
+                updated += len(changed)
+                changed = []
+        if changed:
+            User.objects.bulk_update(changed, ['fio_key'])
+            updated += len(changed)
+        self.stdout.write(self.style.SUCCESS(f'Обновлено ключей ФИО: {updated}.'))
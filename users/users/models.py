@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 
+from .fio import FIO_KEY_LENGTH, fio_key
+
 
 class User(AbstractUser):
     """
@@ -34,6 +36,7 @@ class User(AbstractUser):
     is_admin = models.BooleanField("Администратор", default=False)
     is_manager = models.BooleanField("Управляющий сайтом", default=False)
     is_expelled = models.BooleanField("Исключен", default=False)
+    is_graduated = models.BooleanField("Выпускник", default=False)
     classroom_guide = models.ForeignKey(
         'classroom.Classroom', related_name='classroom_teachers', blank=True,
         on_delete=models.SET_NULL, null=True, verbose_name='Классное руководство'
@@ -54,10 +57,26 @@ class User(AbstractUser):
         'school.School', on_delete=models.CASCADE, related_name='users',
         blank=True, null=True
     )
+    fio_key = models.CharField(
+        "Ключ ФИО для импорта", max_length=FIO_KEY_LENGTH, blank=True, default='', editable=False
+    )
+
+    FIO_FIELDS = ('last_name', 'first_name', 'surname')
 
     class Meta:
         verbose_name_plural = "Пользователи"
         verbose_name = "Пользователь"
+        indexes = [
+            models.Index(fields=['school', 'fio_key'], name='user_school_fio_key'),
+        ]
+
+    def save(self, *args, **kwargs):
+        """Обновляет ключ ФИО перед сохранением."""
+        self.fio_key = fio_key(self.last_name, self.first_name, self.surname)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and set(self.FIO_FIELDS) & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'fio_key'}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         """Возвращает строковое представление пользователя."""
@@ -0,0 +1,286 @@
+"""
+Пакетная загрузка списка учеников школы из Excel или CSV.
+
+Сначала проверяются все строки файла; если хотя бы одна строка с ошибкой,
+ничего не создаётся. Пароли генерируются случайно, а их хэширование (PBKDF2,
+сотни миллисекунд на пароль) выполняется в пуле процессов. Ученики, новые
+классы и связи учеников с классами записываются пакетными INSERT в одной
+транзакции. Сигналы post_save при bulk_create не вызываются, поэтому сводки
+главной страницы и версия данных школы сбрасываются явно.
+
+Пароли в открытом виде не сохраняются: они есть только в возвращаемом
+листе учётных данных.
+"""
+import os
+import re
+import secrets
+import string
+import zipfile
+from datetime import datetime
+
+import pandas as pd
+from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError, transaction
+from openpyxl import Workbook
+from openpyxl.utils.exceptions import InvalidFileException
+
+from main import homepage, versions
+from main.conf import app_settings
+from main.pools import process_pool
+from .fio import fio_key, load_fio_map
+from .models import User
+
+# Столбцы файла и соответствующие им поля строки
+ROSTER_COLUMNS = {
+    'Фамилия': 'last_name',
+    'Имя': 'first_name',
+    'Отчество': 'surname',
+    'Класс': 'classroom',
+    'Пол': 'gender',
+    'Дата рождения': 'birth_date',
+}
+
+REQUIRED_COLUMNS = ('Фамилия', 'Имя', 'Класс')
+
+CREDENTIALS_HEADERS = ['Класс', 'Фамилия', 'Имя', 'Отчество', 'Логин', 'Пароль']
+
+GENDERS = {'м': User.MALE, 'm': User.MALE, 'ж': User.FEMALE, 'f': User.FEMALE}
+
+CLASSROOM_RE = re.compile(r'^(\d{1,2})\s*-?\s*([А-ЯЁA-Z])$')
+
+PASSWORD_ALPHABET = string.ascii_letters + string.digits
+
+TRANSLIT = dict(zip(
+    'абвгдеёжзийклмнопрстуфхцчшщъыьэюя',
+    ['a', 'b', 'v', 'g', 'd', 'e', 'e', 'zh', 'z', 'i', 'y', 'k', 'l', 'm', 'n', 'o', 'p', 'r', 's', 't',
+     'u', 'f', 'kh', 'ts', 'ch', 'sh', 'shch', '', 'y', '', 'e', 'yu', 'ya'],
+))
+
+ROSTER_DEFAULTS = {
+    'HASH_WORKERS': min(4, os.cpu_count() or 1),  # Процессов, хэширующих пароли
+    'PASSWORD_LENGTH': 12,  # Длина генерируемых паролей
+}
+
+
+def roster_settings():
+    return app_settings('ROSTER_IMPORT', ROSTER_DEFAULTS)
+
+
+class RosterError(Exception):
+    """
+    Файл списка нельзя загрузить: нет нужных столбцов или есть ошибки в строках.
+    errors — список сообщений по строкам.
+    """
+
+    def __init__(self, message, errors=()):
+        super().__init__(message)
+        self.errors = list(errors)
+
+
+def read_roster(file):
+    """
+    Строки файла списком словарей с полями ROSTER_COLUMNS. CSV определяется
+    по расширению имени файла, остальное читается как Excel.
+    """
+    name = getattr(file, 'name', '') or ''
+    try:
+        if name.lower().endswith('.csv'):
+            df = pd.read_csv(file, dtype=str, keep_default_na=False)
+        else:
+            df = pd.read_excel(file, dtype=str, keep_default_na=False)
+    except (ValueError, OSError, zipfile.BadZipFile, InvalidFileException) as e:
+        raise RosterError('Не удалось прочитать файл: ожидается Excel или CSV.') from e
+    missing_columns = [column for column in REQUIRED_COLUMNS if column not in df.columns]
+    if missing_columns:
+        raise RosterError(f"Отсутствуют столбцы: {', '.join(missing_columns)}")
+    return [
+        {field: str(record.get(column, '')).strip() for column, field in ROSTER_COLUMNS.items()}
+        for record in df.to_dict('records')
+    ]
+
+
+def parse_classroom(value):
+    """
+    Номер и буква класса из записи вида «7А», «7 А» или «7-а»; None, если запись некорректна.
+    """
+    match = CLASSROOM_RE.match(value.upper().replace('Ё', 'Е'))
+    if not match:
+        return None
+    return int(match.group(1)), match.group(2)
+
+
+def parse_birth_date(value):
+    if not value:
+        return None
+    for pattern in ('%d.%m.%Y', '%Y-%m-%d', '%Y-%m-%d %H:%M:%S'):
+        try:
+            return datetime.strptime(value, pattern).date()
+        except ValueError:
+            continue
+    return None
+
+
+def validate_rows(rows, school):
+    """
+    Проверяет все строки. Возвращает список проверенных строк или бросает
+    RosterError со всеми найденными ошибками. Ученик, уже существующий в
+    школе или повторённый в файле (по ключу ФИО), считается ошибкой.
+    """
+    existing = load_fio_map(school.pk)
+    seen = {}
+    errors = []
+    valid = []
+    for line, row in enumerate(rows, start=2):  # строка 1 — заголовок
+        row_errors = []
+        if not row['last_name'] or not row['first_name']:
+            row_errors.append('не указаны фамилия или имя')
+        classroom = parse_classroom(row['classroom'])
+        if classroom is None:
+            row_errors.append(f"некорректный класс «{row['classroom']}»")
+        gender = None
+        if row['gender']:
+            gender = GENDERS.get(row['gender'][:1].lower())
+            if gender is None:
+                row_errors.append(f"некорректный пол «{row['gender']}»")
+        birth_date = parse_birth_date(row['birth_date'])
+        if row['birth_date'] and birth_date is None:
+            row_errors.append(f"некорректная дата рождения «{row['birth_date']}»")
+
+        key = fio_key(row['last_name'], row['first_name'], row['surname'])
+        if key in existing:
+            row_errors.append('ученик с таким ФИО уже есть в школе')
+        elif key in seen:
+            row_errors.append(f'повтор строки {seen[key]}')
+        seen.setdefault(key, line)
+
+        if row_errors:
+            errors.append(f"Строка {line}: {'; '.join(row_errors)}.")
+            continue
+        valid.append({
+            'last_name': row['last_name'],
+            'first_name': row['first_name'],
+            'surname': row['surname'] or None,
+            'classroom': classroom,
+            'gender': gender,
+            'birth_date': birth_date,
+        })
+    if errors:
+        raise RosterError('Файл содержит ошибки, ученики не созданы.', errors)
+    return valid
+
+
+def transliterate(value):
+    return ''.join(TRANSLIT.get(char, char) for char in value.lower() if char.isalnum())
+
+
+def generate_usernames(rows, school_id):
+    """
+    Логины вида s<id школы>.<фамилия><первая буква имени> латиницей, с
+    номером при совпадении. Занятые логины школы читаются одним запросом,
+    поэтому вызывать нужно в той же транзакции, что и создание учеников.
+    """
+    prefix = f's{school_id}.'
+    taken = set(User.objects.filter(username__startswith=prefix).values_list('username', flat=True))
+    usernames = []
+    for row in rows:
+        base = f"{prefix}{transliterate(row['last_name'])}{transliterate(row['first_name'])[:1]}"[:140]
+        username, number = base, 1
+        while username in taken:
+            number += 1
+            username = f'{base}{number}'
+        taken.add(username)
+        usernames.append(username)
+    return usernames
+
+
+def generate_password(length):
+    return ''.join(secrets.choice(PASSWORD_ALPHABET) for _ in range(length))
+
+
+def hash_passwords(passwords, max_workers=None):
+    """
+    Хэши паролей в исходном порядке. Хэширование идёт в пуле процессов
+    (main.pools), если паролей больше одного.
+    """
+    max_workers = max_workers or roster_settings()['HASH_WORKERS']
+    if max_workers <= 1 or len(passwords) <= 1:
+        return [make_password(password) for password in passwords]
+    workers = min(max_workers, len(passwords))
+    with process_pool(workers) as executor:
+        return list(executor.map(make_password, passwords, chunksize=max(1, len(passwords) // (workers * 4))))
+
+
+def import_roster(rows, school, max_workers=None):
+    """
+    Создаёт учеников школы по проверенным строкам файла. Недостающие классы
+    создаются. Возвращает строки листа учётных данных в порядке файла.
+    """
+    from classroom.models import Classroom
+
+    rows = validate_rows(rows, school)
+    if not rows:
+        return []
+    passwords = [generate_password(roster_settings()['PASSWORD_LENGTH']) for _ in rows]
+    hashes = hash_passwords(passwords, max_workers)
+
+    try:
+        with transaction.atomic():
+            usernames = generate_usernames(rows, school.pk)
+            classrooms = {
+                (classroom.number, classroom.letter): classroom
+                for classroom in Classroom.objects.filter(school=school, is_graduated=False)
+            }
+            missing = sorted({row['classroom'] for row in rows} - set(classrooms))
+            if missing:
+                Classroom.objects.bulk_create([
+                    Classroom(number=number, letter=letter, school=school) for number, letter in missing
+                ])
+                # bulk_create возвращает id не на всех СУБД, поэтому классы перечитываются
+                classrooms = {
+                    (classroom.number, classroom.letter): classroom
+                    for classroom in Classroom.objects.filter(school=school, is_graduated=False)
+                }
+
+            users = [
+                User(
+                    username=username, password=password_hash, is_child=True, school=school,
+                    classroom=classrooms[row['classroom']], last_name=row['last_name'],
+                    first_name=row['first_name'], surname=row['surname'], gender=row['gender'],
+                    birth_date=row['birth_date'],
+                    fio_key=fio_key(row['last_name'], row['first_name'], row['surname']),
+                )
+                for row, username, password_hash in zip(rows, usernames, hashes)
+            ]
+            User.objects.bulk_create(users)
+            user_ids = dict(User.objects.filter(username__in=usernames).values_list('username', 'id'))
+
+            through = Classroom.child.through
+            through.objects.bulk_create([
+                through(classroom_id=user.classroom.pk, user_id=user_ids[user.username]) for user in users
+            ])
+
+            classroom_ids = {classroom.pk for classroom in classrooms.values()}
+            homepage.invalidate_classrooms(classroom_ids)
+            homepage.invalidate_school(school.pk)
+            versions.invalidate_schools([school.pk])
+    except IntegrityError as e:
+        # Параллельная загрузка успела занять те же логины или создать те же классы
+        raise RosterError('Список учеников школы изменился во время загрузки, повторите загрузку.') from e
+
+    return [
+        [f"{row['classroom'][0]}{row['classroom'][1]}", row['last_name'], row['first_name'], row['surname'] or '',
+         username, password]
+        for row, username, password in zip(rows, usernames, passwords)
+    ]
+
+
+def write_credentials(rows, file):
+    """
+    Лист учётных данных созданных учеников в xlsx (write-only книга).
+    """
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Учётные данные')
+    sheet.append(CREDENTIALS_HEADERS)
+    for row in rows:
+        sheet.append(row)
+    workbook.save(file)
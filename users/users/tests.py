@@ -1,8 +1,17 @@
 from rest_framework.test import APIClient
 from rest_framework import status
-from django.test import TestCase
+from io import BytesIO, StringIO
+
+from django.core.management import call_command
+from django.contrib.auth.hashers import check_password
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from unittest import mock
+from openpyxl import load_workbook
 from django.urls import reverse
+from users.fio import fio_key, load_fio_map, match_fio
 from users.models import User
+from users.roster import hash_passwords
 from school.models import School
 from classroom.models import Classroom
 
@@ -177,3 +186,123 @@ class UserProfileAPITestCase(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.user.refresh_from_db()
         self.assertEqual(self.user.email, 'newemail@example.com')
+
+
+class FioKeyTestCase(TestCase):
+    """Тесты ключа ФИО для поиска учеников при импорте."""
+
+    def setUp(self):
+        self.school = School.objects.create(name='Test School')
+        self.user = User.objects.create_user(
+            username='child', password='pass', school=self.school,
+            last_name='Салтыков-Щедрин', first_name='Пётр', surname='Иванович'
+        )
+
+    def test_key_ignores_case_yo_spaces_and_hyphens(self):
+        self.assertEqual(self.user.fio_key, 'салтыковщедрин|петр|иванович')
+        self.assertEqual(fio_key(' САЛТЫКОВ - щедрин', 'Петр', 'Ивано- вич'), self.user.fio_key)
+        self.assertEqual(fio_key('Иванов', 'Иван', None), 'иванов|иван|')
+
+    def test_key_follows_update_fields(self):
+        self.user.last_name = 'Петров'
+        self.user.save(update_fields=['last_name'])
+        self.assertEqual(User.objects.get(pk=self.user.pk).fio_key, 'петров|петр|иванович')
+
+    def test_backfill_command(self):
+        User.objects.filter(pk=self.user.pk).update(fio_key='')
+        out = StringIO()
+        call_command('backfill_fio_keys', stdout=out)
+        self.assertIn('Обновлено ключей ФИО: 1', out.getvalue())
+        self.assertEqual(load_fio_map(self.school.pk), {'салтыковщедрин|петр|иванович': self.user.pk})
+
+    def test_fuzzy_match_and_ambiguity(self):
+        fio_map = load_fio_map(self.school.pk)
+        near_miss = fio_key('Салтыков-Щедрин', 'Пётр', 'Иваночив')
+        self.assertFalse(match_fio(fio_map, near_miss))
+
+        match = match_fio(fio_map, near_miss, fuzzy=True)
+        self.assertEqual(match.user_id, self.user.pk)
+        self.assertTrue(match.fuzzy)
+
+        User.objects.create_user(
+            username='twin', password='pass', school=self.school,
+            last_name='Салтыков-Щедрин', first_name='Пётр', surname='Иванович'
+        )
+        match = match_fio(load_fio_map(self.school.pk), self.user.fio_key)
+        self.assertIsNone(match.user_id)
+        self.assertTrue(match.ambiguous)
+
+
+@override_settings(AUDIT_LOG={'ASYNC': False})
+class RosterImportTestCase(TestCase):
+    """Тесты пакетной загрузки учеников из файла."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.school = School.objects.create(name='Test School')
+        self.admin = User.objects.create_user(
+            username='admin', password='adminpassword', is_admin=True, school=self.school
+        )
+        self.classroom = Classroom.objects.create(number=7, letter='А', school=self.school)
+        self.client.force_authenticate(self.admin)
+        self.url = '/users/users/import_children/'
+
+    def upload(self, lines):
+        content = '\n'.join(['Фамилия,Имя,Отчество,Класс,Пол,Дата рождения', *lines]).encode('utf-8')
+        return self.client.post(self.url, {'file': SimpleUploadedFile('roster.csv', content)})
+
+    def test_students_are_created_with_credentials_sheet(self):
+        response = self.upload([
+            'Иванов,Иван,Иванович,7А,М,01.09.2012',
+            'Петрова,Анна,,7 а,Ж,',
+            'Иванов,Илья,,8Б,м,2011-05-03',
+        ])
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        rows = list(load_workbook(BytesIO(response.content)).active.iter_rows(values_only=True))
+        self.assertEqual(rows[0], ('Класс', 'Фамилия', 'Имя', 'Отчество', 'Логин', 'Пароль'))
+        self.assertEqual([row[4] for row in rows[1:]], [
+            f's{self.school.pk}.ivanovi', f's{self.school.pk}.petrovaa', f's{self.school.pk}.ivanovi2'
+        ])
+
+        ivanov = User.objects.get(username=rows[1][4])
+        self.assertTrue(ivanov.is_child)
+        self.assertTrue(check_password(rows[1][5], ivanov.password))
+        self.assertEqual(ivanov.fio_key, fio_key('Иванов', 'Иван', 'Иванович'))
+        self.assertEqual((ivanov.classroom, ivanov.gender, str(ivanov.birth_date)), (self.classroom, 'M', '2012-09-01'))
+        # Класс 8Б создан, ученики привязаны и через M2M
+        new_classroom = Classroom.objects.get(school=self.school, number=8, letter='Б')
+        self.assertEqual(list(new_classroom.child.values_list('username', flat=True)), [rows[3][4]])
+        self.assertEqual(self.classroom.child.count(), 2)
+
+    def test_invalid_file_creates_nothing(self):
+        User.objects.create_user(
+            username='old', password='pass', is_child=True, school=self.school, last_name='Сидоров', first_name='Олег'
+        )
+        response = self.upload([
+            'Иванов,Иван,,7А,М,',
+            'Сидоров,Олег,,7А,М,',
+            'Иванов,Иван,,7А,М,',
+            ',Пётр,,12,X,31.02.2012',
+        ])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(response.data['errors']), 3)
+        self.assertIn('Строка 5', response.data['errors'][2])
+        self.assertEqual(User.objects.filter(is_child=True).count(), 1)
+
+    def test_corrupt_file_is_rejected(self):
+        response = self.client.post(self.url, {'file': SimpleUploadedFile('roster.xlsx', b'not an excel file')})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['errors'], [])
+
+    def test_taken_username_is_rejected(self):
+        # Логин занят между чтением занятых логинов и созданием учеников
+        User.objects.create_user(username='taken', password='pass', school=self.school)
+        with mock.patch('users.roster.generate_usernames', return_value=['taken']):
+            response = self.upload(['Иванов,Иван,,7А,М,'])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(User.objects.filter(is_child=True).exists())
+
+    def test_passwords_are_hashed_in_pool(self):
+        passwords = [f'password{i}' for i in range(6)]
+        hashes = hash_passwords(passwords, max_workers=2)
+        self.assertTrue(all(check_password(password, encoded) for password, encoded in zip(passwords, hashes)))
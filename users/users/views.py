@@ -3,9 +3,11 @@ from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework import status
+from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
 from .serializers import UserSerializer, CreateUserSerializer, ProfileSerializer
 from .models import User
+from .roster import RosterError, import_roster, read_roster, write_credentials
 from main.permissions import IsManagerUser, IsAdminUser
 from result.models import Result
 from raiting_system.models import Medal, Rating
@@ -58,6 +60,28 @@ class UserViewSet(ModelViewSet):
         child = serializer.save(is_child=True, school=request.user.school)
         return Response(UserSerializer(child).data, status=status.HTTP_201_CREATED)
 
+    @action(detail=False, methods=['post'], permission_classes=[IsAdminUser])
+    def import_children(self, request):
+        """
+        Пакетное создание учеников из Excel или CSV (столбцы Фамилия, Имя,
+        Отчество, Класс, Пол, Дата рождения). Возвращает xlsx с логинами и паролями.
+        """
+        file = request.FILES.get('file')
+        if not file:
+            return Response({"detail": "Файл не найден."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            credentials = import_roster(read_roster(file), request.user.school)
+        except RosterError as e:
+            return Response({"detail": str(e), "errors": e.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        response = HttpResponse(
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            status=status.HTTP_201_CREATED,
+        )
+        response['Content-Disposition'] = 'attachment; filename="credentials.xlsx"'
+        write_credentials(credentials, response)
+        return response
+
     @action(detail=False, methods=['post'], permission_classes=[IsAdminUser])
     def create_admin(self, request):
         """Создание администратора."""